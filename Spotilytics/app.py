@@ -1,30 +1,52 @@
 import streamlit as st
-from utils.auth import init_spotify_client
-from utils.search import update_search, get_artist_top_tracks, get_complete_discography
-from utils.ui import render_artist_profile, render_welcome_message, render_artist_not_found, create_tracks_dataframe, create_discography_dataframe, render_artist_basic_info
-from utils.charts import plot_top_tracks, plot_release_timeline, plot_album_track_stats
-from utils.comparison import render_artist_comparison 
+from utils.search import update_search, get_artist, peek_complete_discography
+from utils.async_search import load_artist_view, load_comparison
+from utils.ui import render_artist_profile, render_welcome_message, render_artist_not_found, render_artist_basic_info
+from utils.models import Discography
+from utils.store import artist_store
+from utils.history import get_history
+from utils.debug import debug_enabled, render_debug_panel
+from utils.metrics import start_rerun, finish_rerun, export_to_file
 
-# Authentication with the Spotify API using environment variables
-sp = init_spotify_client()
+# spotipy, pandas and plotly are imported on the code paths that use them,
+# so that the welcome page of a fresh process renders without loading them
+
+# Timings and API calls of this run, shown in the debug panel
+rerun = start_rerun()
+
+def spotify_client():
+    # Process-wide Spotify client, authenticated once with the environment variables
+    from utils.auth import get_spotify_client
+    return get_spotify_client()
+
+def artist_by_id(artist_id):
+    # Sessions keep artist ids; the records are shared by all sessions in the artist store
+    artist = artist_store.get(artist_id)
+    if artist is None:
+        artist = artist_store.add(get_artist(spotify_client(), artist_id))
+    return artist
 
 # Page configuration
 st.set_page_config(page_title="Spotilytics", page_icon="🎶", layout="wide")
 st.title("Spotilytics")
 
 # Initialize session state variables
-if 'artist_results' not in st.session_state:
-    st.session_state.artist_results = []
-if 'selected_artist' not in st.session_state:
-    st.session_state.selected_artist = None 
+if 'artist_result_ids' not in st.session_state:
+    st.session_state.artist_result_ids = []
+if 'selected_artist_id' not in st.session_state:
+    st.session_state.selected_artist_id = None 
 if 'search_term' not in st.session_state:
     st.session_state.search_term = ""
 if 'last_search' not in st.session_state:
     st.session_state.last_search = ""
 if 'compare_mode' not in st.session_state:
     st.session_state.compare_mode = False
-if 'artist_to_compare' not in st.session_state:
-    st.session_state.artist_to_compare = None
+if 'artist_ids_to_compare' not in st.session_state:
+    st.session_state.artist_ids_to_compare = []
+if 'graph_artist_id' not in st.session_state:
+    st.session_state.graph_artist_id = None
+if 'features_artist_id' not in st.session_state:
+    st.session_state.features_artist_id = None
 
 # Sidebar for search
 with st.sidebar:
@@ -42,19 +64,22 @@ with st.sidebar:
     # Update search when input changes
     if search_term != st.session_state.search_term:
         st.session_state.search_term = search_term
-        update_search(sp, st.session_state, search_term)
+        update_search(spotify_client(), st.session_state, search_term)
+    
+    if debug_enabled():
+        render_debug_panel()
     
     # Show artists if we have results
-    if st.session_state.artist_results:
+    if st.session_state.artist_result_ids:
         # Different behavior based on mode
         if st.session_state.compare_mode:
             st.write("**Select an artist to compare:**")
         else:
             st.write("**Matching artists:**")
         
-        for i, artist in enumerate(st.session_state.artist_results):
-            artist_name = artist['name'][:20] + "..." if len(artist['name']) > 20 else artist['name']
-            genres_text = ', '.join(artist['genres'][:2]) if artist['genres'] else 'No genres'
+        for i, artist in enumerate(map(artist_by_id, st.session_state.artist_result_ids)):
+            artist_name = artist.name[:20] + "..." if len(artist.name) > 20 else artist.name
+            genres_text = ', '.join(artist.genres[:2]) if artist.genres else 'No genres'
             genres_text = genres_text[:25] + "..." if len(genres_text) > 25 else genres_text
 
             if st.button(
@@ -63,110 +88,146 @@ with st.sidebar:
                 use_container_width=True
             ):
                 if st.session_state.compare_mode:
-                    # In compare mode, set as second artist and show comparison
-                    st.session_state.selected_artist = artist
+                    # In compare mode, add the artist to the comparison
+                    from utils.comparison import MAX_COMPARE_ARTISTS
+                    compared_ids = st.session_state.artist_ids_to_compare
+                    if artist.id not in compared_ids and len(compared_ids) < MAX_COMPARE_ARTISTS:
+                        st.session_state.artist_ids_to_compare = compared_ids + [artist.id]
                     st.rerun()
                 else:
                     # Normal mode, just select the artist
-                    st.session_state.selected_artist = artist
+                    st.session_state.selected_artist_id = artist.id
                     st.rerun()
 
 # Display content based on current mode
 if st.session_state.compare_mode:
     # Comparison mode
-    if st.session_state.artist_to_compare and st.session_state.selected_artist:
-        # Both artists selected, show comparison
-        artist1 = st.session_state.artist_to_compare
-        artist2 = st.session_state.selected_artist
-        
-        # Get top tracks for both artists
-        artist1_top_tracks = get_artist_top_tracks(sp, artist1['id'])
-        artist2_top_tracks = get_artist_top_tracks(sp, artist2['id'])
-        
-        # Create DataFrames for top tracks
-        artist1_tracks_df = create_tracks_dataframe(artist1_top_tracks)
-        artist2_tracks_df = create_tracks_dataframe(artist2_top_tracks)
-        
-        # Calculate album statistics for each artist
-        artist1_albums_stats = artist1_tracks_df.groupby('Album').agg({'Track': 'count', 'Popularity': 'mean'}).reset_index()
-        artist2_albums_stats = artist2_tracks_df.groupby('Album').agg({'Track': 'count', 'Popularity': 'mean'}).reset_index()
-        
-        # Prepare metrics for radar chart
-        max_followers = max(artist1['followers']['total'], artist2['followers']['total'])
-        artist1_metrics = {
-            'Popularity': artist1['popularity'],
-            'Followers': (artist1['followers']['total'] / max_followers) * 100,
-            'Genres': len(artist1['genres']) * 10 if artist1['genres'] else 0
-        }
-        artist2_metrics = {
-            'Popularity': artist2['popularity'],
-            'Followers': (artist2['followers']['total'] / max_followers) * 100,
-            'Genres': len(artist2['genres']) * 10 if artist2['genres'] else 0
-        }
+    artists = [artist_by_id(artist_id) for artist_id in st.session_state.artist_ids_to_compare]
+    if len(artists) >= 2:
+        from utils.aggregates import get_top_track_tables, get_discography_tables
+        from utils.comparison import MAX_COMPARE_ARTISTS, comparison_version, get_comparison_data, render_artist_comparison
+
+        # Top tracks and discographies of every artist, fetched at the same time
+        top_tracks, discographies = load_comparison(spotify_client(), [artist.id for artist in artists])
+        top_track_tables = [get_top_track_tables(artist.id, tracks) for artist, tracks in zip(artists, top_tracks)]
+        discography_tables = [get_discography_tables(discography) for discography in discographies]
         
         # Render comparison
         render_artist_comparison(
-            artist1, 
-            artist2, 
-            artist1_tracks_df, 
-            artist2_tracks_df, 
-            artist1_albums_stats, 
-            artist2_albums_stats,
-            artist1_metrics,
-            artist2_metrics
+            artists,
+            *get_comparison_data(artists, top_track_tables, discography_tables),
+            cache_key=comparison_version(artists, top_track_tables, discography_tables)
         )
+
+        if get_history() is not None:
+            from utils.trends import render_comparison_history
+            render_comparison_history(get_history(), artists)
+        
+        if len(artists) < MAX_COMPARE_ARTISTS:
+            st.info(f"Select another artist from the sidebar to add it to the comparison (up to {MAX_COMPARE_ARTISTS}).")
         
         if st.button("← Back to single artist view"):
             st.session_state.compare_mode = False
-            st.session_state.selected_artist = st.session_state.artist_to_compare
-            st.session_state.artist_to_compare = None
+            st.session_state.selected_artist_id = artists[0].id
+            st.session_state.artist_ids_to_compare = []
             st.rerun()
     else:
         # Waiting for second artist selection
-        if st.session_state.artist_to_compare:
+        if artists:
             st.info("Please select a second artist to compare from the sidebar.")
-            render_artist_basic_info(st.session_state.artist_to_compare)
+            render_artist_basic_info(artists[0])
             
             if st.button("Cancel comparison"):
                 st.session_state.compare_mode = False
-                st.session_state.artist_to_compare = None
+                st.session_state.artist_ids_to_compare = []
                 st.rerun()
         else:
             st.warning("Comparison mode activated but no artist selected. Please search for an artist.")
             
-elif st.session_state.selected_artist:
+elif st.session_state.selected_artist_id:
     # Normal single artist view
-    artist = st.session_state.selected_artist
-    top_tracks = get_artist_top_tracks(sp, artist['id'])
-    complete_discography = get_complete_discography(sp, artist['id'])
+    from utils.aggregates import get_top_track_tables, get_discography_tables, build_discography_tables, merge_tracks_per_year, get_artist_export
+    from utils.charts import plot_top_tracks, plot_release_timeline, plot_album_track_stats
+
+    artist = artist_by_id(st.session_state.selected_artist_id)
+    sp = spotify_client()
+    # The discography, when it has to be fetched, streams in while top tracks are requested
+    top_tracks, complete_discography, discography_batches = load_artist_view(sp, artist.id)
+    top_track_tables = get_top_track_tables(artist.id, top_tracks)
     
-    # Render artist profile and get dataframes
-    df_tracks_complete = render_artist_profile(artist, top_tracks)
-    df_discography = create_discography_dataframe(complete_discography)
+    # Render artist profile and top tracks right away
+    render_artist_profile(artist, top_track_tables.tracks)
     
     # Display charts and analytics
     st.divider()
     st.subheader("Track Analytics")
     
-    plot_top_tracks(df_tracks_complete)
-    plot_album_track_stats(df_tracks_complete)
-    plot_release_timeline(df_discography)
+    top_tracks_key = (artist.id, top_track_tables.version)
+    plot_top_tracks(top_track_tables.tracks, cache_key=top_tracks_key)
+    plot_album_track_stats(top_track_tables.album_stats, cache_key=top_tracks_key)
+
+    timeline = st.empty()
+    if complete_discography is not None:
+        discography_tables = get_discography_tables(complete_discography)
+        plot_release_timeline(discography_tables.tracks_per_year, container=timeline, cache_key=(artist.id, discography_tables.version))
+    else:
+        # The career timeline fills in as album batches of the discography arrive
+        timeline.info("Fetching complete discography...")
+        complete_discography = Discography(artist.id)
+        tracks_per_year = None
+        for batch_number, batch in enumerate(discography_batches):
+            complete_discography.extend(batch)
+            batch_per_year = build_discography_tables(batch).tracks_per_year
+            tracks_per_year = batch_per_year if tracks_per_year is None else merge_tracks_per_year(tracks_per_year, batch_per_year)
+            plot_release_timeline(tracks_per_year, container=timeline, key=f"release_timeline_{batch_number}")
+        
+        # Reruns read back the stored copy, so the tables are keyed by its version rather than by the
+        # one assembled here, whose fetched_at differs. The assembled one stands in if nothing was stored
+        stored = peek_complete_discography(sp, artist.id)
+        if stored is not None:
+            complete_discography = stored
+        discography_tables = get_discography_tables(complete_discography)
+        if tracks_per_year is None:
+            plot_release_timeline(discography_tables.tracks_per_year, container=timeline, cache_key=(artist.id, discography_tables.version))
+
+    # Tempo, energy and the other audio features of every track, 100 per request
+    from utils.audio_features import render_audio_features
+    render_audio_features(sp, complete_discography, discography_tables)
+
+    # Followers and popularity recorded each time Spotify returned them
+    if get_history() is not None:
+        from utils.trends import render_artist_history
+        render_artist_history(get_history(), artist, top_tracks)
+
+    from utils.graph import render_related_artists
+    render_related_artists(sp, artist)
+
+    # Top tracks, discography and their aggregates as Parquet files
+    st.download_button(
+        "⬇️ Download data (Parquet)",
+        get_artist_export(top_track_tables, discography_tables),
+        file_name=f"spotilytics_{artist.id}.zip",
+        mime="application/zip"
+    )
 
     # Add buttons to go back to search results or to compare
     col1, col2 = st.columns(2)
     with col1:
         if st.button("← Back to search results"):
-            st.session_state.selected_artist = None
+            st.session_state.selected_artist_id = None
             st.rerun()
     with col2:
         if st.button("🔀 Compare with another artist"):
-            st.session_state.artist_to_compare = artist
+            st.session_state.artist_ids_to_compare = [artist.id]
             st.session_state.compare_mode = True
-            st.session_state.selected_artist = None
+            st.session_state.selected_artist_id = None
             st.rerun()
 
-elif st.session_state.search_term and not st.session_state.selected_artist and not st.session_state.artist_results:
+elif st.session_state.search_term and not st.session_state.selected_artist_id and not st.session_state.artist_result_ids:
     render_artist_not_found()
 
 else:
-    render_welcome_message()
\ No newline at end of file
+    render_welcome_message()
+
+st.session_state.last_rerun = finish_rerun(rerun)
+export_to_file()
@@ -0,0 +1,117 @@
+import gc
+import os
+import tracemalloc
+import time
+from streamlit.testing.v1 import AppTest
+from .common import reset_caches, pickled_size, ms, mb
+
+# app.py driven through AppTest: what a visitor waits for at each step, and what it costs
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+TIMEOUT = 300
+
+class FlowError(RuntimeError):
+    pass
+
+def step(server, at, action):
+    # Runs one interaction, returns (seconds, API requests)
+    server.reset_counts()
+    started = time.perf_counter()
+    action()
+    seconds = time.perf_counter() - started
+    if at.exception:
+        raise FlowError(at.exception[0].message)
+    return seconds, server.total_requests()
+
+def sidebar_button(at, label):
+    for button in at.sidebar.button:
+        if button.label.startswith(label):
+            return button
+    raise FlowError(f"no sidebar button for {label!r}")
+
+def main_button(at, text):
+    for button in at.button:
+        if text in button.label:
+            return button
+    raise FlowError(f"no button containing {text!r}")
+
+def select_artist(at, name):
+    at.sidebar.text_input[0].input(name).run()
+    sidebar_button(at, name).click().run()
+
+def session_size(at):
+    return pickled_size({key: value for key, value in at.session_state.filtered_state.items()})
+
+def run_artist_flow(server, name):
+    at = AppTest.from_file(APP_PATH, default_timeout=TIMEOUT)
+    timings = {}
+    timings["open"] = step(server, at, at.run)
+    timings["search"] = step(server, at, lambda: at.sidebar.text_input[0].input(name).run())
+    timings["select"] = step(server, at, lambda: sidebar_button(at, name).click().run())
+    timings["rerun"] = step(server, at, at.run)
+    return at, timings
+
+def warm_up(server):
+    # Imports and first-use setup of the app and plotly would otherwise land on the first measured flow
+    catalog = server.catalog
+    run_artist_flow(server, catalog.artists[catalog.bench_artists["small"][1]]["name"])
+
+def run(server):
+    catalog = server.catalog
+    warm_up(server)
+    rows = []
+    for size, artist_ids in catalog.bench_artists.items():
+        # The last artist of each size, so the data layer benchmark has not warmed it
+        name = catalog.artists[artist_ids[-1]]["name"]
+        reset_caches()
+        at, timings = run_artist_flow(server, name)
+
+        # Second visitor: a new session, with the process caches warm
+        _, warm_timings = run_artist_flow(server, name)
+
+        # Memory is traced in a separate cold run, tracing slows everything down
+        reset_caches()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run_artist_flow(server, name)
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        rows.append({
+            "size": size,
+            "open ms": ms(timings["open"][0]),
+            "search ms": ms(timings["search"][0]),
+            "select ms": ms(timings["select"][0]),
+            "select requests": timings["select"][1],
+            "rerun ms": ms(timings["rerun"][0]),
+            "rerun requests": timings["rerun"][1],
+            "2nd session select ms": ms(warm_timings["select"][0]),
+            "2nd session requests": sum(requests for _, requests in warm_timings.values()),
+            "retained MB": mb(retained),
+            "session state KB": round(session_size(at) / 1024, 1)
+        })
+    return rows
+
+def run_comparison(server):
+    # One artist of each size side by side, added one after the other like a visitor would
+    catalog = server.catalog
+    names = [catalog.artists[artist_ids[0]]["name"] for artist_ids in catalog.bench_artists.values()]
+    reset_caches()
+
+    at = AppTest.from_file(APP_PATH, default_timeout=TIMEOUT).run()
+    select_artist(at, names[0])
+    seconds, requests = step(server, at, lambda: main_button(at, "Compare").click().run())
+    rows = [{"step": "compare", "artists": 1, "ms": seconds, "requests": requests}]
+    for count, name in enumerate(names[1:], start=2):
+        at.sidebar.text_input[0].input(name).run()
+        seconds, requests = step(server, at, lambda: sidebar_button(at, name).click().run())
+        rows.append({"step": f"add {name}", "artists": count, "ms": seconds, "requests": requests})
+    seconds, requests = step(server, at, at.run)
+    rows.append({"step": "rerun", "artists": len(names), "ms": seconds, "requests": requests})
+
+    for row in rows:
+        row["ms"] = ms(row["ms"])
+    return rows
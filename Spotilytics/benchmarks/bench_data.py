@@ -0,0 +1,53 @@
+import math
+from utils.search import load_artist_top_tracks, load_complete_discography, update_complete_discography
+from .common import measure, reset_caches, ms, mb
+
+# Data layer without Streamlit: cold, warm and incremental loads of each discography size
+
+def per_album_requests(listing, page_size=50):
+    # What the old loader needed: the listing pages, then every album's track pages one by one
+    return math.ceil(len(listing) / page_size) + sum(max(1, math.ceil(album["total_tracks"] / page_size)) for album in listing)
+
+def run(server, sp):
+    rows = []
+    for size, artist_ids in server.catalog.bench_artists.items():
+        artist_id, refreshed_id = artist_ids[0], artist_ids[1]
+        reset_caches()
+
+        server.reset_counts()
+        _, top_seconds, _ = measure(load_artist_top_tracks, sp, artist_id)
+        top_requests = server.total_requests()
+
+        server.reset_counts()
+        discography, cold_seconds, cold_peak = measure(load_complete_discography, sp, artist_id)
+        cold_requests = server.total_requests()
+
+        server.reset_counts()
+        _, warm_seconds, _ = measure(load_complete_discography, sp, artist_id)
+        warm_requests = server.total_requests()
+
+        # Incremental refresh of an expired discography after one new single
+        previous = load_complete_discography(sp, refreshed_id)
+        server.catalog.add_release(refreshed_id)
+        server.reset_counts()
+        refreshed, refresh_seconds, _ = measure(update_complete_discography, previous, sp, refreshed_id)
+        refresh_requests = server.total_requests()
+
+        listing = server.catalog.albums_by_artist[artist_id]
+        rows.append({
+            "size": size,
+            "releases": len(discography.albums),
+            "tracks": len(discography.tracks),
+            "top tracks ms": ms(top_seconds),
+            "top tracks requests": top_requests,
+            "cold ms": ms(cold_seconds),
+            "cold requests": cold_requests,
+            "cold peak MB": mb(cold_peak),
+            "per-album requests": per_album_requests(listing),
+            "warm ms": ms(warm_seconds),
+            "warm requests": warm_requests,
+            "refresh ms": ms(refresh_seconds),
+            "refresh requests": refresh_requests,
+            "refresh new releases": len(refreshed.albums) - len(previous.albums)
+        })
+    return rows
@@ -0,0 +1,97 @@
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from utils.search import load_complete_discography
+from utils.aggregates import tables_cache, get_discography_tables, build_audio_feature_tables, AUDIO_FEATURE_RANGES, AUDIO_FEATURE_BINS
+from utils.audio_features import load_audio_features, get_audio_feature_tables
+from utils.scheduler import spotify_scheduler, TokenBucket
+from .common import reset_caches, timeit, ms
+
+# Audio features of whole discographies against the fake API: batched, cached per track, vectorized
+
+def full_bucket():
+    # Every measurement starts like a fresh process, not paced by the previous one
+    bucket = spotify_scheduler.bucket
+    spotify_scheduler.bucket = TokenBucket(bucket.rate, bucket.capacity)
+
+def row_by_row_tables(discography_tables, track_ids, features):
+    # The straightforward version: a dict per track, then one pd.cut per feature
+    rows = []
+    seen = set()
+    for (_, track), track_id, item in zip(discography_tables.tracks.iterrows(), track_ids, features):
+        if item is None or track_id in seen:
+            continue
+        seen.add(track_id)
+        rows.append({"Release Year": track["Release Year"], **dict(zip(AUDIO_FEATURE_RANGES, item.values()))})
+    df = pd.DataFrame(rows)
+    distributions = {
+        feature: pd.cut(df[feature].clip(low, high), np.linspace(low, high, AUDIO_FEATURE_BINS + 1), include_lowest=True).value_counts(sort=False)
+        for feature, (low, high) in AUDIO_FEATURE_RANGES.items()
+    }
+    return df, distributions, df.groupby("Release Year").mean()
+
+def run(server, sp, sizes=("small", "median", "huge")):
+    # spotipy warns on every call to the deprecated endpoint
+    warnings.simplefilter("ignore", DeprecationWarning)
+    rows = []
+    for size in sizes:
+        artist_id = server.catalog.bench_artists[size][0]
+        reset_caches()
+        discography = load_complete_discography(sp, artist_id)
+        discography_tables = get_discography_tables(discography)
+        track_ids = [track.id for track in discography.tracks]
+
+        full_bucket()
+        server.reset_counts()
+        started = time.perf_counter()
+        tables = get_audio_feature_tables(sp, discography, discography_tables)
+        cold = time.perf_counter() - started
+        requests = server.total_requests()
+
+        # Per-track entries from the persistent cache, tables rebuilt
+        tables_cache.clear()
+        server.reset_counts()
+        started = time.perf_counter()
+        get_audio_feature_tables(sp, discography, discography_tables)
+        warm = time.perf_counter() - started
+
+        features = load_audio_features(sp, track_ids)
+        rows.append({
+            "size": size,
+            "tracks": len(track_ids),
+            "distinct": tables.track_count,
+            "requests": requests,
+            "cold ms": ms(cold),
+            "warm requests": server.total_requests(),
+            "warm ms": ms(warm),
+            "tables ms": ms(timeit(lambda: build_audio_feature_tables(discography_tables, track_ids, features))),
+            "row by row ms": ms(timeit(lambda: row_by_row_tables(discography_tables, track_ids, features), repeat=3))
+        })
+
+    # One new release: only its tracks are fetched
+    artist_id = server.catalog.bench_artists["median"][0]
+    reset_caches()
+    discography = load_complete_discography(sp, artist_id)
+    get_audio_feature_tables(sp, discography, get_discography_tables(discography))
+    server.catalog.add_release(artist_id, group="album", tracks=12)
+    discography = load_complete_discography.refresh(sp, artist_id)
+    full_bucket()
+    server.reset_counts()
+    started = time.perf_counter()
+    get_audio_feature_tables(sp, discography, get_discography_tables(discography))
+    rows.append({"size": "median + 1 album", "tracks": len(discography.tracks), "requests": server.total_requests(),
+                 "cold ms": ms(time.perf_counter() - started)})
+
+    # Batches of 100 against one request per track, cache bypassed
+    artist_id = server.catalog.bench_artists["small"][0]
+    track_ids = list(dict.fromkeys(track.id for track in load_complete_discography(sp, artist_id).tracks))
+    batching = []
+    for batch_size in (1, 100):
+        full_bucket()
+        server.reset_counts()
+        started = time.perf_counter()
+        load_audio_features.__wrapped__(sp, track_ids, batch_size=batch_size)
+        batching.append({"batch size": batch_size, "tracks": len(track_ids), "requests": server.total_requests(),
+                         "ms": ms(time.perf_counter() - started)})
+    return rows, batching
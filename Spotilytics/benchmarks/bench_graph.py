@@ -0,0 +1,40 @@
+import time
+from utils.graph import crawl_related_artists
+from utils.scheduler import spotify_scheduler, TokenBucket
+from .common import reset_caches, timeit, pickled_size, ms
+
+# Related-artist crawl against the fake API, then in-memory queries on the CSR index
+
+def run(server, sp, workers=(1, 4, 8), max_hops=2):
+    seed_id = server.catalog.bench_artists["median"][0]
+    rows = []
+    graph = None
+    for max_workers in workers:
+        reset_caches()
+        server.reset_counts()
+        # A full bucket for every crawl, the previous one would otherwise pace this one
+        bucket = spotify_scheduler.bucket
+        spotify_scheduler.bucket = TokenBucket(bucket.rate, bucket.capacity)
+        started = time.perf_counter()
+        graph = crawl_related_artists(sp, seed_id, max_hops=max_hops, max_workers=max_workers)
+        rows.append({
+            "workers": max_workers,
+            "artists": len(graph),
+            "links": graph.edge_count,
+            "requests": server.total_requests(),
+            "crawl ms": ms(time.perf_counter() - started)
+        })
+
+    # The same links as a dict of id lists, what a naive cache would keep
+    adjacency = {artist.id: [graph.artists[neighbor].id for neighbor in graph.links(position).tolist()]
+                 for position, artist in enumerate(graph.artists)}
+    farthest = max(graph.distances(seed_id).items(), key=lambda item: item[1])[0]
+    queries = [{
+        "CSR bytes": graph.offsets.nbytes + graph.neighbors.nbytes,
+        "pickled CSR + ids KB": round(pickled_size((graph.offsets, graph.neighbors, list(graph.index))) / 1024, 1),
+        "pickled id lists KB": round(pickled_size(adjacency) / 1024, 1),
+        "2-hop popular µs": round(timeit(lambda: graph.most_popular_within(seed_id), number=20) * 1e6, 1),
+        "genres µs": round(timeit(lambda: graph.genres_within(seed_id), number=20) * 1e6, 1),
+        "shortest path µs": round(timeit(lambda: graph.shortest_path(seed_id, graph.artists[farthest].id), number=20) * 1e6, 1)
+    }]
+    return rows, queries
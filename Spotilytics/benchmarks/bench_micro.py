@@ -0,0 +1,232 @@
+import bisect
+import os
+import pathlib
+import pickle
+import random
+import tempfile
+import urllib.parse
+import urllib.request
+import zlib
+import pandas as pd
+from utils.autocomplete import ArtistIndex, SearchPolicy
+from utils.models import Artist, Discography
+from utils.dataframes import create_discography_dataframe
+from utils.aggregates import compute_tracks_per_year, build_discography_tables, load_discography_tables, DISCOGRAPHY_SNAPSHOT_TABLES
+from utils.snapshots import save_snapshot, export_parquet_zip, snapshot_path
+from utils.history import HistoryStore, artist_entity
+from utils.images import ThumbnailCache, pick_image, pillow_available
+from .common import timeit, ms
+from .fake_spotify import FakeCatalog
+
+# In-process benchmarks on synthetic data, no server involved
+
+def raw_tracks(catalog, artist_id):
+    # The cache unit before slim records: every track dict with a copy of its album attached
+    tracks = []
+    for album in catalog.albums_by_artist[artist_id]:
+        for track in catalog.tracks_by_album[album["id"]]:
+            track = dict(track)
+            track["album_info"] = {key: album[key] for key in ("name", "release_date", "id", "images")}
+            tracks.append(track)
+    return tracks
+
+def record_discography(catalog, artist_id):
+    full_albums = [
+        dict(album, tracks={"items": catalog.tracks_by_album[album["id"]]})
+        for album in catalog.albums_by_artist[artist_id]
+    ]
+    return Discography.from_full_albums(artist_id, full_albums)
+
+def row_loop_dataframe(tracks):
+    # Dataframe construction before vectorization, with the timeline's extra date parsing
+    df = pd.DataFrame([
+        {"Track": track["name"], "Album": track["album_info"]["name"], "Released Date": track["album_info"]["release_date"]}
+        for track in tracks
+    ])
+    df.index = df.index + 1
+    dates = pd.to_datetime(df["Released Date"].copy(), errors="coerce")
+    return df, dates.dt.year.value_counts()
+
+def big_catalog(releases):
+    catalog = FakeCatalog(artists_per_size=0, filler_artists=0)
+    return catalog, catalog.add_artist("Benchmark Giant", releases, 20)
+
+def payload(releases=400):
+    catalog, artist_id = big_catalog(releases)
+    rows = []
+    for label, value in (("raw JSON + album_info", raw_tracks(catalog, artist_id)), ("slim records", record_discography(catalog, artist_id))):
+        pickled = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        blob = zlib.compress(pickled, 6)
+        rows.append({
+            "cache unit": label,
+            "tracks": len(value),
+            "pickled KB": round(len(pickled) / 1024, 1),
+            "stored KB": round(len(blob) / 1024, 1),
+            "load ms": ms(timeit(lambda: pickle.loads(zlib.decompress(blob)))),
+        })
+    return rows
+
+def dataframes(releases=1000):
+    catalog, artist_id = big_catalog(releases)
+    tracks = raw_tracks(catalog, artist_id)
+    discography = record_discography(catalog, artist_id)
+    return [
+        {"builder": "row loop + to_datetime", "tracks": len(tracks), "ms": ms(timeit(lambda: row_loop_dataframe(tracks)))},
+        {"builder": "columnar", "tracks": len(discography), "ms": ms(timeit(lambda: compute_tracks_per_year(create_discography_dataframe(discography))))}
+    ]
+
+def autocomplete(names=60, seed=0):
+    # Replays every prefix a visitor types for a sample of artist names
+    catalog = FakeCatalog(artists_per_size=1, filler_artists=2000, seed=seed)
+    index = ArtistIndex()
+    policy = SearchPolicy()
+    typed = [
+        artist["name"][:length]
+        for artist in random.Random(seed).sample(list(catalog.artists.values()), names)
+        for length in range(1, len(artist["name"]) + 1)
+    ]
+
+    remote = 0
+    for query in typed:
+        results = index.lookup(query, policy.limit)
+        if policy.needs_remote(query, results):
+            remote += 1
+            remote_results = [Artist.from_json(artist) for artist in catalog.search(query)[:policy.limit]]
+            index.add(remote_results)
+            policy.remote_done(query, remote_results)
+
+    distinct = len(set(typed))
+    lookup_seconds = timeit(lambda: [index.lookup(query, policy.limit) for query in typed]) / len(typed)
+    return [{
+        "typed queries": len(typed),
+        "distinct queries": distinct,
+        "remote searches": remote,
+        "local hit rate": f"{(1 - remote / distinct) * 100:.0f}%",
+        "lookup µs": round(lookup_seconds * 1e6, 1),
+        "indexed artists": len(index)
+    }]
+
+def snapshots(sizes=(400, 1000)):
+    # Rebuilding the discography tables against reloading their memory-mapped snapshot
+    rows = []
+    environment = dict(os.environ)
+    with tempfile.TemporaryDirectory(prefix="spotilytics-snapshots-") as directory:
+        os.environ["SPOTILYTICS_SNAPSHOT_DIR"] = directory
+        os.environ.pop("SPOTILYTICS_SNAPSHOTS", None)
+        try:
+            for releases in sizes:
+                catalog, artist_id = big_catalog(releases)
+                discography = record_discography(catalog, artist_id)
+                tables = build_discography_tables(discography)
+                save_snapshot(artist_id, "discography", tables.version, {"tracks": tables.tracks, "tracks_per_year": tables.tracks_per_year})
+                rows.append({
+                    "tracks": len(discography),
+                    "build ms": ms(timeit(lambda: build_discography_tables(discography))),
+                    "snapshot load ms": ms(timeit(lambda: load_discography_tables(discography))),
+                    "snapshot KB": round(sum(os.path.getsize(snapshot_path(artist_id, "discography", name)) for name in DISCOGRAPHY_SNAPSHOT_TABLES) / 1024, 1),
+                    "parquet zip KB": round(len(export_parquet_zip({"discography": tables.tracks, "tracks_per_year": tables.tracks_per_year})) / 1024, 1)
+                })
+        finally:
+            os.environ.clear()
+            os.environ.update(environment)
+    return rows
+
+def all_samples(history, entity, metric):
+    # Every raw sample, summed up in Python: what a chart would cost without downsampling
+    rows = history._connect().execute(
+        "SELECT t, delta FROM samples WHERE series_id = (SELECT id FROM series WHERE entity = ? AND metric = ?) ORDER BY t",
+        (entity, metric)
+    ).fetchall()
+    value, points = 0, []
+    for t, delta in rows:
+        value += delta
+        points.append((t, value))
+    return points
+
+def history(artists=5, years=3, interval=2 * 3600, seed=0):
+    # Artists fetched every `interval` seconds for `years`, followers growing and popularity drifting
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory(prefix="spotilytics-history-") as directory:
+        store = HistoryStore(os.path.join(directory, "history.sqlite"))
+        start = 1_600_000_000
+        observations = int(years * 365 * 86400 / interval)
+        followers = {artist: rng.randint(10_000, 5_000_000) for artist in range(artists)}
+        popularity = {artist: rng.randint(30, 90) for artist in range(artists)}
+
+        def record_all():
+            for step in range(observations):
+                for artist in range(artists):
+                    followers[artist] += max(0, int(rng.gauss(followers[artist] * 2e-5, followers[artist] * 1e-5)))
+                    if rng.random() < 0.02:
+                        popularity[artist] = min(100, max(0, popularity[artist] + rng.choice((-1, 1))))
+                store.record([
+                    sample
+                    for artist in range(artists)
+                    for sample in ((artist_entity(artist), "followers", followers[artist]), (artist_entity(artist), "popularity", popularity[artist]))
+                ], t=start + step * interval)
+
+        record_seconds = timeit(record_all, repeat=1)
+        store._connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        samples = store.stats()["samples"]
+        size = os.path.getsize(store.path)
+
+        entity = artist_entity(0)
+        raw = all_samples(store, entity, "followers")
+        last_week = start + observations * interval - 7 * 86400
+        rows = []
+        for label, since in (("3 years", None), ("last week", last_week)):
+            downsampled = store.series(entity, "followers", start=since)
+            # Every point is the value the series really had at that time
+            times = [t for t, _ in raw]
+            assert all(value == raw[bisect.bisect_right(times, t) - 1][1] for t, value in downsampled)
+            rows.append({
+                "range": label,
+                "stored samples": samples,
+                "bytes per sample": round(size / samples, 1),
+                "record µs per fetch": round(record_seconds / observations * 1e6, 1),
+                "raw points": len([t for t in times if since is None or t >= since]),
+                "raw query ms": ms(timeit(lambda: all_samples(store, entity, "followers"))),
+                "chart points": len(downsampled),
+                "downsampled ms": ms(timeit(lambda: store.series(entity, "followers", start=since)))
+            })
+        return rows
+
+def image_fixtures(directory, sizes=(640, 320, 160), seed=0):
+    # Spotify-like renditions of one photo-ish image, as file:// URLs
+    from PIL import Image
+    photo = Image.effect_noise((sizes[0], sizes[0]), 64).convert("RGB")
+    photo = Image.blend(photo, Image.radial_gradient("L").resize(photo.size).convert("RGB"), 0.6)
+    images = []
+    for size in sizes:
+        path = os.path.join(directory, f"artist-{seed}-{size}.jpg")
+        photo.resize((size, size)).save(path, "JPEG", quality=90)
+        images.append((pathlib.Path(path).as_uri(), size, size))
+    return tuple(images)
+
+def file_size(url):
+    return os.path.getsize(urllib.request.url2pathname(urllib.parse.urlparse(url).path))
+
+def images(cards=4, box=200):
+    # Image bytes for a comparison of `cards` artists shown in 200px boxes
+    if not pillow_available():
+        return [{"image": "Pillow is not installed", "KB per page": "-", "ms per image": "-"}]
+    with tempfile.TemporaryDirectory(prefix="spotilytics-images-") as directory:
+        renditions = [image_fixtures(directory, seed=seed) for seed in range(cards)]
+        thumbnails = ThumbnailCache(os.path.join(directory, "thumbnails"))
+
+        def thumbnail_page():
+            return [thumbnails.get(pick_image(images, box), box) for images in renditions]
+
+        def cold_page():
+            thumbnails.clear()
+            return thumbnail_page()
+
+        cold = timeit(cold_page, repeat=3) / cards
+        warm = timeit(thumbnail_page) / cards
+        thumbnail_kb = round(sum(os.path.getsize(path) for path in thumbnail_page()) / 1024, 1)
+        return [
+            {"image": "largest rendition", "KB per page": round(sum(file_size(images[0][0]) for images in renditions) / 1024, 1), "ms per image": "-"},
+            {"image": "smallest adequate", "KB per page": round(sum(file_size(pick_image(images, box)) for images in renditions) / 1024, 1), "ms per image": "-"},
+            {"image": "thumbnail, cold", "KB per page": thumbnail_kb, "ms per image": ms(cold)},
+            {"image": "thumbnail, cached", "KB per page": thumbnail_kb, "ms per image": ms(warm)}
+        ]
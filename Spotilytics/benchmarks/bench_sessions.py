@@ -0,0 +1,65 @@
+import gc
+import pickle
+import random
+import tracemalloc
+from utils.models import Artist
+from utils.store import ArtistStore
+from .common import mb
+from .fake_spotify import FakeCatalog
+
+# Memory held by many concurrent sessions browsing the same popular artists
+
+def cached_copy(value):
+    # st.cache_data hands every caller its own unpickled copy of the cached value
+    return pickle.loads(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+def browse(catalog, rng, popular, results=10, compared=3):
+    # One session: a search, a selected artist and a few more artists to compare
+    found = [Artist.from_json(catalog.artists[artist_id]) for artist_id in rng.sample(popular, results)]
+    return found, found[0], found[:compared]
+
+def session_with_records(catalog, rng, popular):
+    found, selected, compared = browse(catalog, rng, popular)
+    found = cached_copy(found)
+    return {"artist_results": found, "selected_artist": found[0], "artists_to_compare": cached_copy(compared)}
+
+def session_with_ids(store, catalog, rng, popular):
+    found, selected, compared = browse(catalog, rng, popular)
+    found = store.add_many(cached_copy(found))
+    return {
+        "artist_result_ids": [artist.id for artist in found],
+        "selected_artist_id": selected.id,
+        "artist_ids_to_compare": [artist.id for artist in store.add_many(cached_copy(compared))]
+    }
+
+def retained(build):
+    # (value, bytes still allocated once build returns)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        value = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return value, size
+
+def run(sessions=(100, 1000, 5000), popular_artists=200, seed=0):
+    catalog = FakeCatalog(artists_per_size=0, filler_artists=popular_artists, seed=seed)
+    popular = list(catalog.artists)
+    rows = []
+    for count in sessions:
+        rng = random.Random(seed)
+        _, records = retained(lambda: [session_with_records(catalog, rng, popular) for _ in range(count)])
+        rng = random.Random(seed)
+        store = ArtistStore()
+        _, ids = retained(lambda: (store, [session_with_ids(store, catalog, rng, popular) for _ in range(count)]))
+        rows.append({
+            "sessions": count,
+            "records MB": mb(records),
+            "ids + store MB": mb(ids),
+            "records KB/session": round(records / count / 1024, 2),
+            "ids KB/session": round(ids / count / 1024, 2),
+            "stored artists": len(store)
+        })
+    return rows
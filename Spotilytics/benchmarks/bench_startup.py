@@ -0,0 +1,86 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from .bench_app import APP_PATH
+from .common import ms
+
+# Cold start of app.py in fresh interpreters under `python -X importtime`
+
+MARKER = "--- spotilytics startup ---"
+HEAVY_PACKAGES = ("pandas", "numpy", "pyarrow", "plotly", "spotipy", "requests")
+
+# Every utils module imported up front, like app.py did before imports were deferred
+EAGER_IMPORTS = "import utils.auth, utils.search, utils.ui, utils.aggregates, utils.charts, utils.comparison, utils.debug"
+
+SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+sys.stderr.write({marker!r} + "\\n")
+started = time.perf_counter()
+{prelude}
+at = AppTest.from_file({app!r}, default_timeout=300).run()
+first_paint = time.perf_counter() - started
+{steps}
+total = time.perf_counter() - started
+sys.stderr.write({marker!r} + "\\n")
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+print(json.dumps({{"first_paint": first_paint, "total": total}}))
+"""
+
+SELECT_STEPS = """
+at.sidebar.text_input[0].input({name!r}).run()
+next(button for button in at.sidebar.button if button.label.startswith({name!r})).click().run()
+"""
+
+def parse_importtime(stderr):
+    # Modules first imported between the markers: total self time and the heavy packages among them
+    section = stderr.split(MARKER)[1] if MARKER in stderr else ""
+    self_us = 0
+    packages = set()
+    for line in section.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        self_us += int(fields[0])
+        module = fields[2].strip()
+        if module.split(".")[0] in HEAVY_PACKAGES:
+            packages.add(module.split(".")[0])
+    return self_us / 1e6, sorted(packages)
+
+def run_once(prelude="", steps=""):
+    root = os.path.dirname(APP_PATH)
+    script = SCRIPT.format(root=root, marker=MARKER, prelude=prelude, app=APP_PATH, steps=steps)
+    # A cold process also means cold caches
+    env = dict(os.environ, SPOTILYTICS_CACHE_BACKEND="memory")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script], capture_output=True, text=True, cwd=root, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    import_seconds, packages = parse_importtime(result.stderr)
+    return timings, import_seconds, packages
+
+def run(server, repeat=3):
+    name = server.catalog.artists[server.catalog.bench_artists["small"][0]]["name"]
+    scenarios = (
+        ("welcome page", "", ""),
+        ("welcome page, eager imports", EAGER_IMPORTS, ""),
+        ("artist page", "", SELECT_STEPS.format(name=name)),
+    )
+
+    rows = []
+    for label, prelude, steps in scenarios:
+        runs = [run_once(prelude, steps) for _ in range(repeat)]
+        rows.append({
+            "scenario": label,
+            "first paint ms": ms(statistics.median(timings["first_paint"] for timings, _, _ in runs)),
+            "total ms": ms(statistics.median(timings["total"] for timings, _, _ in runs)),
+            "import ms": ms(statistics.median(import_seconds for _, import_seconds, _ in runs)),
+            "heavy packages": ", ".join(runs[0][2]) or "-"
+        })
+    return rows
@@ -0,0 +1,89 @@
+import gc
+import json
+import os
+import pickle
+import statistics
+import sys
+import time
+import tracemalloc
+
+def configure_environment(server, cache_path=None):
+    # Must run before utils is imported, utils.auth reads these at import time
+    os.environ["SPOTILYTICS_API_PREFIX"] = server.api_prefix
+    os.environ["SPOTILYTICS_TOKEN_URL"] = server.token_url
+    os.environ.setdefault("spotipyId", "benchmark")
+    os.environ.setdefault("spotipySecret", "benchmark")
+    if cache_path:
+        os.environ["SPOTILYTICS_CACHE_BACKEND"] = "sqlite"
+        os.environ["SPOTILYTICS_CACHE_PATH"] = cache_path
+        os.environ["SPOTILYTICS_SNAPSHOT_DIR"] = os.path.join(os.path.dirname(cache_path), "snapshots")
+        os.environ["SPOTILYTICS_HISTORY_PATH"] = os.path.join(os.path.dirname(cache_path), "history.sqlite")
+    else:
+        os.environ["SPOTILYTICS_CACHE_BACKEND"] = "memory"
+        os.environ["SPOTILYTICS_SNAPSHOTS"] = "0"
+        os.environ["SPOTILYTICS_HISTORY"] = "0"
+
+def reset_caches():
+    # Every cache layer of the process, so the next measurement starts cold
+    import streamlit as st
+    from utils.cache import get_backend
+    from utils.aggregates import tables_cache
+    from utils.charts import figure_cache
+    from utils.store import artist_store
+    from utils.search import discography_cache
+    from utils.snapshots import prune_snapshots
+
+    get_backend().clear()
+    st.cache_data.clear()
+    tables_cache.clear()
+    figure_cache.clear()
+    artist_store.clear()
+    discography_cache.clear()
+    prune_snapshots(max_bytes=0)
+
+def measure(func, *args, **kwargs):
+    # (result, seconds, peak bytes allocated during the call)
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+def timeit(func, repeat=5, number=1):
+    # Median seconds per call
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        runs.append((time.perf_counter() - started) / number)
+    return statistics.median(runs)
+
+def pickled_size(value):
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+def ms(seconds):
+    return round(seconds * 1000, 1)
+
+def mb(size):
+    return round(size / 2**20, 2)
+
+def print_table(title, rows):
+    print(f"\n{title}", file=sys.stderr)
+    if not rows:
+        print("  (no rows)", file=sys.stderr)
+        return
+    columns = list(rows[0])
+    widths = {column: max(len(str(column)), *(len(str(row.get(column, ""))) for row in rows)) for column in columns}
+    print("  " + "  ".join(str(column).ljust(widths[column]) for column in columns), file=sys.stderr)
+    for row in rows:
+        print("  " + "  ".join(str(row.get(column, "")).ljust(widths[column]) for column in columns), file=sys.stderr)
+
+def write_json(path, results):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
@@ -0,0 +1,412 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+# Local stand-in for the parts of the Spotify Web API the app uses, with a synthetic catalog.
+# Run it on its own to point the app at it:
+#   python -m benchmarks.fake_spotify --port 8765 --latency 0.05
+#   SPOTILYTICS_API_PREFIX=http://127.0.0.1:8765/v1 SPOTILYTICS_TOKEN_URL=http://127.0.0.1:8765/api/token streamlit run app.py
+
+BASE62 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+# (releases, tracks per release) of each benchmark artist
+DISCOGRAPHY_SIZES = {
+    "small": (8, 10),
+    "median": (60, 12),
+    "huge": (400, 14)
+}
+# Every this many releases one is longer than the 50 tracks embedded by "Get Several Albums"
+LONG_RELEASE_EVERY = 25
+LONG_RELEASE_TRACKS = 120
+
+SYLLABLES = ("ka", "lo", "mi", "ra", "zen", "tor", "bel", "nu", "vi", "sha", "dro", "ex", "on", "ly", "qu")
+GENRES = ("pop", "rock", "indie", "jazz", "hip hop", "electronic", "folk", "metal", "soul", "samba")
+
+def make_id(*parts):
+    # Deterministic 22-character base62 id, shaped like Spotify's
+    number = int.from_bytes(hashlib.sha1(":".join(map(str, parts)).encode()).digest(), "big")
+    chars = []
+    for _ in range(22):
+        number, digit = divmod(number, 62)
+        chars.append(BASE62[digit])
+    return "".join(chars)
+
+def images(kind, key):
+    return [
+        {"url": f"https://i.scdn.co/image/{kind}-{key}-{size}", "width": size, "height": size}
+        for size in (640, 300, 64)
+    ]
+
+class FakeCatalog:
+    # Benchmark artists named "Bench <size> <n>" plus filler artists with made-up names for search
+    def __init__(self, artists_per_size=3, filler_artists=300, seed=0):
+        self.random = random.Random(seed)
+        self.artists = {}
+        self.albums = {}
+        self.albums_by_artist = {}
+        self.tracks_by_album = {}
+        self.bench_artists = {size: [] for size in DISCOGRAPHY_SIZES}
+
+        for size, (releases, tracks) in DISCOGRAPHY_SIZES.items():
+            for n in range(1, artists_per_size + 1):
+                artist_id = self.add_artist(f"Bench {size.capitalize()} {n}", releases, tracks)
+                self.bench_artists[size].append(artist_id)
+
+        for n in range(filler_artists):
+            name = " ".join(
+                "".join(self.random.choice(SYLLABLES) for _ in range(self.random.randint(2, 3))).capitalize()
+                for _ in range(self.random.randint(1, 2))
+            )
+            self.add_artist(name, self.random.randint(1, 12), self.random.randint(1, 14), key=n)
+
+    def add_artist(self, name, releases, tracks, key=None):
+        artist_id = make_id("artist", name, key)
+        self.artists[artist_id] = {
+            "id": artist_id,
+            "name": name,
+            "type": "artist",
+            "genres": self.random.sample(GENRES, self.random.randint(0, 3)),
+            "followers": {"href": None, "total": self.random.randint(100, 5_000_000)},
+            "popularity": self.random.randint(5, 95),
+            "images": images("artist", artist_id),
+            "external_urls": {"spotify": f"https://open.spotify.com/artist/{artist_id}"}
+        }
+
+        listing = []
+        for i in range(releases):
+            group = "single" if i % 2 else ("compilation" if i % 10 == 4 else "album")
+            album_id = make_id("album", artist_id, i)
+            year = 2024 - (releases - i) * 30 // max(releases, 1)
+            precision = ("day", "month", "year")[i % 7 % 3]
+            release_date = {"day": f"{year}-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "month": f"{year}-{i % 12 + 1:02d}", "year": str(year)}[precision]
+            track_count = LONG_RELEASE_TRACKS if i % LONG_RELEASE_EVERY == LONG_RELEASE_EVERY - 1 else (1 if group == "single" else tracks)
+            album = {
+                "id": album_id,
+                "name": f"{name} Release {i + 1}",
+                "album_type": group,
+                "album_group": group,
+                "release_date": release_date,
+                "release_date_precision": precision,
+                "total_tracks": track_count,
+                "images": images("album", album_id),
+                "artists": [{"id": artist_id, "name": name}]
+            }
+            self.albums[album_id] = album
+            album_tracks = [
+                {
+                    "id": make_id("track", album_id, t),
+                    "name": f"{name} Song {i + 1}.{t + 1}",
+                    "track_number": t + 1,
+                    "duration_ms": 120000 + (t * 7919) % 240000,
+                    "artists": [{"id": artist_id, "name": name}]
+                }
+                for t in range(track_count)
+            ]
+            if group == "compilation":
+                # Compilations mostly repeat earlier tracks, same ids, like a greatest hits
+                earlier = [track for _, previous in listing for track in self.tracks_by_album[previous["id"]]]
+                album_tracks[:len(earlier)] = [dict(track, track_number=t + 1) for t, track in enumerate(earlier[:track_count])]
+            self.tracks_by_album[album_id] = album_tracks
+            listing.append((i, album))
+
+        # Spotify lists albums, then singles, then compilations, each newest first
+        order = {"album": 0, "single": 1, "compilation": 2}
+        listing.sort(key=lambda entry: (order[entry[1]["album_group"]], -entry[0]))
+        self.albums_by_artist[artist_id] = [album for _, album in listing]
+        return artist_id
+
+    def add_release(self, artist_id, group="single", tracks=1):
+        # A new release at the top of its group, for incremental refresh benchmarks
+        listing = self.albums_by_artist[artist_id]
+        i = len(listing)
+        album_id = make_id("album", artist_id, i)
+        album = dict(listing[0], id=album_id, name=f"New Release {i + 1}", album_type=group, album_group=group,
+                     release_date="2025-01-01", release_date_precision="day", total_tracks=tracks)
+        self.albums[album_id] = album
+        self.tracks_by_album[album_id] = [
+            {"id": make_id("track", album_id, t), "name": f"New Song {t + 1}", "track_number": t + 1,
+             "duration_ms": 180000, "artists": album["artists"]}
+            for t in range(tracks)
+        ]
+        position = next((n for n, other in enumerate(listing) if other["album_group"] == group), len(listing))
+        listing.insert(position, album)
+        return album_id
+
+    def remove_release(self, artist_id, album_id):
+        # Taken down from the artist's listing, the album itself still resolves like on Spotify
+        self.albums_by_artist[artist_id] = [album for album in self.albums_by_artist[artist_id] if album["id"] != album_id]
+
+    def search(self, query):
+        query = query.casefold().removeprefix("artist:").strip()
+        matches = [artist for artist in self.artists.values() if query in artist["name"].casefold()]
+        return sorted(matches, key=lambda artist: (not artist["name"].casefold().startswith(query), -artist["popularity"]))
+
+    def top_tracks(self, artist_id):
+        listing = self.albums_by_artist[artist_id]
+        tracks = []
+        seen = set()
+        for album in listing:
+            if len(tracks) == 10:
+                break
+            if self.tracks_by_album[album["id"]][0]["id"] in seen:
+                continue  # A compilation repeating a track already listed
+            n = len(tracks)
+            track = dict(self.tracks_by_album[album["id"]][0])
+            seen.add(track["id"])
+            track["popularity"] = 90 - n * 5
+            track["album"] = {key: album[key] for key in ("id", "name", "album_type", "release_date", "release_date_precision", "images")}
+            tracks.append(track)
+        return tracks
+
+    def audio_features(self, track_id):
+        # Stable per track, roughly shaped like Spotify's; one track in 50 was never analyzed
+        rng = random.Random(track_id)
+        if rng.random() < 0.02:
+            return None
+        return {
+            "id": track_id,
+            "type": "audio_features",
+            "danceability": round(rng.betavariate(5, 3), 3),
+            "energy": round(rng.betavariate(4, 3), 3),
+            "valence": round(rng.random(), 3),
+            "acousticness": round(rng.betavariate(1, 4), 4),
+            "instrumentalness": round(rng.betavariate(1, 9), 4),
+            "speechiness": round(rng.betavariate(1, 12), 4),
+            "liveness": round(rng.betavariate(2, 9), 4),
+            "tempo": round(rng.gauss(120, 25), 3),
+            "loudness": round(-rng.gammavariate(2, 3.5), 3),
+            "key": rng.randrange(12),
+            "mode": rng.randrange(2),
+            "time_signature": 4
+        }
+
+    def related(self, artist_id, count=20):
+        # Stable per artist: mostly artists sharing a genre, then a few random ones
+        rng = random.Random(artist_id)
+        genres = set(self.artists[artist_id]["genres"])
+        others = [other for other in self.artists if other != artist_id]
+        similar = [other for other in others if genres & set(self.artists[other]["genres"])]
+        picked = rng.sample(similar, min(len(similar), count * 3 // 4))
+        picked += rng.sample([other for other in others if other not in set(picked)], count - len(picked))
+        return [self.artists[other] for other in picked]
+
+class FakeSpotifyServer:
+    def __init__(self, catalog=None, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1, seed=0, related_artists=True, audio_features=True,
+                 rate_limit_schedule=(), error_schedule=()):
+        self.catalog = catalog or FakeCatalog()
+        # False answers related-artists with a 404 and audio-features with a 403,
+        # like Spotify does for apps created after November 2024
+        self.related_artists = related_artists
+        self.audio_features = audio_features
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        # Numbers of the API requests answered with a 429, counting from 1 after reset_counts,
+        # so tests get the same failures on every run
+        self.rate_limit_schedule = set(rate_limit_schedule)
+        # Same for 500s
+        self.error_schedule = set(error_schedule)
+        self.random = random.Random(seed)
+        self.requests = Counter()  # endpoint -> requests served, injected errors included
+        self.errors = Counter()  # status -> injected errors
+        self._received = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_prefix(self):
+        return f"{self.url}/v1"
+
+    @property
+    def token_url(self):
+        return f"{self.url}/api/token"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-spotify", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def total_requests(self):
+        with self._lock:
+            return sum(count for endpoint, count in self.requests.items() if endpoint != "token")
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests.clear()
+            self.errors.clear()
+            self._received = 0
+
+    def _receive(self):
+        # Number of this API request, in order of arrival
+        with self._lock:
+            self._received += 1
+            return self._received
+
+    def _count(self, endpoint, error=None):
+        with self._lock:
+            self.requests[endpoint] += 1
+            if error:
+                self.errors[error] += 1
+
+    def _page(self, path, params, items, limit_max=50):
+        limit = min(int(params.get("limit", 20)), limit_max)
+        offset = int(params.get("offset", 0))
+        page_params = {key: value for key, value in params.items() if key not in ("limit", "offset")}
+
+        def link(at):
+            return f"{self.api_prefix}{path}?{urlencode({**page_params, 'offset': at, 'limit': limit})}"
+
+        return {
+            "href": link(offset),
+            "items": items[offset:offset + limit],
+            "limit": limit,
+            "offset": offset,
+            "total": len(items),
+            "next": link(offset + limit) if offset + limit < len(items) else None,
+            "previous": link(max(offset - limit, 0)) if offset else None
+        }
+
+    def full_album(self, album_id):
+        # Like Spotify, full albums have no album_group, only the artist listing does
+        album = dict(self.catalog.albums[album_id])
+        del album["album_group"]
+        album["tracks"] = self._page(f"/albums/{album_id}/tracks", {"limit": 50}, self.catalog.tracks_by_album[album_id])
+        return album
+
+    def route(self, method, path, params):
+        # (endpoint name, status, body)
+        catalog = self.catalog
+        parts = [part for part in path.split("/") if part]
+        if method == "POST" and parts == ["api", "token"]:
+            return "token", 200, {"access_token": "fake-token", "token_type": "Bearer", "expires_in": 3600}
+        if method != "GET" or parts[:1] != ["v1"]:
+            return "unknown", 404, {"error": {"status": 404, "message": "Not found"}}
+
+        parts = parts[1:]
+        if parts == ["search"]:
+            return "search", 200, {"artists": self._page("/search", params, catalog.search(params.get("q", "")))}
+        if len(parts) >= 2 and parts[0] == "artists" and parts[1] in catalog.artists:
+            artist_id = parts[1]
+            if len(parts) == 2:
+                return "artist", 200, catalog.artists[artist_id]
+            if parts[2:] == ["top-tracks"]:
+                return "artist_top_tracks", 200, {"tracks": catalog.top_tracks(artist_id)}
+            if parts[2:] == ["related-artists"]:
+                if not self.related_artists:
+                    return "related_artists", 404, {"error": {"status": 404, "message": "Not found"}}
+                return "related_artists", 200, {"artists": catalog.related(artist_id)}
+            if parts[2:] == ["albums"]:
+                groups = set(params.get("include_groups", "album,single,compilation,appears_on").split(","))
+                listing = [album for album in catalog.albums_by_artist[artist_id] if album["album_group"] in groups]
+                return "artist_albums", 200, self._page(f"/artists/{artist_id}/albums", params, listing)
+        if parts == ["albums"]:
+            ids = [album_id for album_id in params.get("ids", "").split(",") if album_id]
+            if len(ids) > 20:
+                return "albums", 400, {"error": {"status": 400, "message": "Too many ids requested"}}
+            return "albums", 200, {"albums": [self.full_album(album_id) if album_id in catalog.albums else None for album_id in ids]}
+        if parts == ["audio-features"]:
+            ids = [track_id for track_id in params.get("ids", "").split(",") if track_id]
+            if not self.audio_features:
+                return "audio_features", 403, {"error": {"status": 403, "message": "Forbidden"}}
+            if len(ids) > 100:
+                return "audio_features", 400, {"error": {"status": 400, "message": "Too many ids requested"}}
+            return "audio_features", 200, {"audio_features": [catalog.audio_features(track_id) for track_id in ids]}
+        if len(parts) == 3 and parts[0] == "albums" and parts[2] == "tracks" and parts[1] in catalog.albums:
+            return "album_tracks", 200, self._page(path.removeprefix("/v1"), params, catalog.tracks_by_album[parts[1]])
+        return "unknown", 404, {"error": {"status": 404, "message": "Not found"}}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def handle_request(self, method):
+                url = urlsplit(self.path)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                if method == "POST":
+                    self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+                endpoint, status, body = server.route(method, url.path, params)
+                headers = {}
+                if endpoint != "token":
+                    number = server._receive()
+                    if server.latency or server.jitter:
+                        time.sleep(server.latency + server.random.uniform(0, server.jitter))
+                    roll = server.random.random()
+                    if number in server.rate_limit_schedule or roll < server.rate_limit_rate:
+                        status, body = 429, {"error": {"status": 429, "message": "API rate limit exceeded"}}
+                        headers["Retry-After"] = str(server.retry_after)
+                    elif number in server.error_schedule or roll < server.rate_limit_rate + server.error_rate:
+                        status, body = 500, {"error": {"status": 500, "message": "Injected server error"}}
+                server._count(endpoint, status if status >= 400 else None)
+
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Spotify Web API with a synthetic catalog.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of responses replaced by a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of responses replaced by a 429")
+    args = parser.parse_args()
+
+    server = FakeSpotifyServer(host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+                               error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)
+    for size, artist_ids in server.catalog.bench_artists.items():
+        names = ", ".join(server.catalog.artists[artist_id]["name"] for artist_id in artist_ids)
+        print(f"{size}: {names}")
+    print(f"Serving on {server.api_prefix} (token: {server.token_url})")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
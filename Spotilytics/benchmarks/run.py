@@ -0,0 +1,97 @@
+import argparse
+import os
+import sys
+import tempfile
+from .common import configure_environment, print_table, write_json
+from .fake_spotify import FakeSpotifyServer
+
+# Benchmark suite against a local fake Spotify API, run from the Spotilytics folder:
+#   python -m benchmarks.run
+#   python -m benchmarks.run --suites data,app --latency 0.03 --json results.json
+
+SUITES = ("startup", "data", "app", "micro", "sessions", "graph", "features")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Spotilytics benchmarks against a local fake Spotify API.")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"comma-separated, any of {', '.join(SUITES)}")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every API response (default 0.02)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="extra random latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of API responses replaced by a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of API responses replaced by a 429")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="requests per second allowed by the client scheduler (default: the app's own limit)")
+    parser.add_argument("--memory-cache", action="store_true", help="memory cache backend instead of a temporary SQLite file")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    suites = [suite.strip() for suite in args.suites.split(",") if suite.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        print(f"Unknown suites: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+
+    server = FakeSpotifyServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                               rate_limit_rate=args.rate_limit_rate).start()
+    cache_dir = tempfile.TemporaryDirectory(prefix="spotilytics-bench-")
+    configure_environment(server, None if args.memory_cache else os.path.join(cache_dir.name, "responses.sqlite"))
+
+    # Imported only now, utils reads the environment set above
+    import streamlit.logger
+    streamlit.logger.set_log_level("error")
+    from utils.auth import init_spotify_client
+    from utils.scheduler import spotify_scheduler, TokenBucket
+    from . import bench_startup, bench_data, bench_app, bench_micro, bench_sessions, bench_graph, bench_features
+
+    if args.rate:
+        spotify_scheduler.bucket = TokenBucket(rate=args.rate, capacity=max(1, int(args.rate * 2)))
+
+    results = {"settings": vars(args)}
+    try:
+        if "startup" in suites:
+            results["startup"] = bench_startup.run(server)
+            print_table("Cold start in a fresh interpreter (-X importtime)", results["startup"])
+        if "data" in suites:
+            results["data"] = bench_data.run(server, init_spotify_client())
+            print_table("Data layer, per discography size", results["data"])
+        if "app" in suites:
+            results["app"] = bench_app.run(server)
+            print_table("App flow (AppTest), per discography size", results["app"])
+            results["comparison"] = bench_app.run_comparison(server)
+            print_table("Comparison of one artist per size", results["comparison"])
+        if "micro" in suites:
+            results["payload"] = bench_micro.payload()
+            print_table("Cached discography payload (400 releases)", results["payload"])
+            results["dataframes"] = bench_micro.dataframes()
+            print_table("Discography DataFrame + tracks per year", results["dataframes"])
+            results["autocomplete"] = bench_micro.autocomplete()
+            print_table("Autocomplete replay of typed queries", results["autocomplete"])
+            results["snapshots"] = bench_micro.snapshots()
+            print_table("Discography tables, rebuilt vs memory-mapped snapshot", results["snapshots"])
+            results["history"] = bench_micro.history()
+            print_table("Followers history, 5 artists fetched every 2 hours for 3 years", results["history"])
+            results["images"] = bench_micro.images()
+            print_table("Artist images of a 4-artist comparison (200px boxes)", results["images"])
+        if "graph" in suites:
+            results["graph_crawl"], results["graph_queries"] = bench_graph.run(server, init_spotify_client())
+            print_table("Related-artist crawl, 2 hops from one artist", results["graph_crawl"])
+            print_table("Queries on the crawled graph", results["graph_queries"])
+        if "features" in suites:
+            results["audio_features"], results["audio_feature_batches"] = bench_features.run(server, init_spotify_client())
+            print_table("Audio features of the whole discography, per size", results["audio_features"])
+            print_table("Audio features of one discography, one request per track vs batches of 100", results["audio_feature_batches"])
+        if "sessions" in suites:
+            results["sessions"] = bench_sessions.run()
+            print_table("Session state of concurrent sessions, artist records vs ids", results["sessions"])
+        results["injected_errors"] = {str(status): count for status, count in server.errors.items()}
+    finally:
+        server.stop()
+        cache_dir.cleanup()
+
+    if args.json:
+        write_json(args.json, results)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
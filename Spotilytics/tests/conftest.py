@@ -0,0 +1,77 @@
+import os
+import sys
+import threading
+import pytest
+
+# The app's modules import the way app.py sees them, from the Spotilytics directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_spotify import FakeSpotifyServer
+from benchmarks.common import configure_environment
+
+# Started before utils is imported, utils.auth reads the API address at import time.
+# No cache directory: the tests run on the memory backend, without snapshots or history
+server = FakeSpotifyServer().start()
+configure_environment(server)
+
+from utils.auth import init_spotify_client
+from utils.cache import get_backend
+from utils.scheduler import RequestScheduler, TokenBucket, CircuitBreaker
+
+class FakeClock:
+    # Time only moves when someone sleeps; sleep() is what the scheduler calls between attempts
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+        self._lock = threading.Lock()
+
+    def time(self):
+        with self._lock:
+            return self.now
+
+    def advance(self, seconds):
+        # Like a real sleep, always at least a little: the token bucket can ask for waits too small
+        # to change a float clock
+        with self._lock:
+            self.now += max(seconds, 1e-6)
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.sleeps.append(seconds)
+        self.advance(seconds)
+
+@pytest.fixture(scope="session")
+def fake_spotify():
+    yield server
+    server.stop()
+
+@pytest.fixture(autouse=True)
+def fresh_state(fake_spotify):
+    # Every test starts with no injected failures, no request counted and an empty cache
+    fake_spotify.rate_limit_schedule = set()
+    fake_spotify.error_schedule = set()
+    fake_spotify.retry_after = 1
+    fake_spotify.audio_features = True
+    fake_spotify.reset_counts()
+    get_backend().clear()
+    yield
+    get_backend().clear()
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def scheduler(clock):
+    # Same settings as the app's, on the fake clock: retries and pauses take no time
+    return RequestScheduler(
+        bucket=TokenBucket(rate=10, capacity=20, clock=clock.time, sleep=clock.advance),
+        breaker=CircuitBreaker(clock=clock.time),
+        sleep=clock.sleep
+    )
+
+@pytest.fixture
+def spotify(scheduler):
+    client = init_spotify_client()
+    client.scheduler = scheduler
+    return client
@@ -0,0 +1,95 @@
+import math
+import pandas as pd
+import pytest
+import spotipy
+from utils.aggregates import AUDIO_FEATURE_RANGES, compute_audio_feature_summary, compute_audio_feature_distributions
+from utils.audio_features import AUDIO_FEATURES_BATCH_SIZE, load_audio_features
+from utils.models import AudioFeatures
+from utils.scheduler import is_unavailable
+
+# spotipy warns on every call to the deprecated endpoint
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning")
+
+@pytest.fixture
+def track_ids(fake_spotify):
+    # 250 distinct tracks of the huge artist
+    catalog = fake_spotify.catalog
+    albums = catalog.albums_by_artist[catalog.bench_artists["huge"][0]]
+    ids = dict.fromkeys(track["id"] for album in albums for track in catalog.tracks_by_album[album["id"]])
+    return list(ids)[:250]
+
+def test_fetched_in_batches_then_cached(fake_spotify, spotify, track_ids):
+    features = load_audio_features(spotify, track_ids)
+    assert len(features) == len(track_ids)
+    assert fake_spotify.requests["audio_features"] == -(-len(track_ids) // AUDIO_FEATURES_BATCH_SIZE) == 3
+
+    fake_spotify.reset_counts()
+    cached = load_audio_features(spotify, track_ids)
+    assert fake_spotify.total_requests() == 0
+    assert [item and item.values() for item in cached] == [item and item.values() for item in features]
+
+def test_rate_limited_batch_is_retried(fake_spotify, spotify, scheduler, track_ids):
+    fake_spotify.rate_limit_schedule = {2}
+    features = load_audio_features(spotify, track_ids)
+    assert fake_spotify.requests["audio_features"] == 4
+    assert fake_spotify.errors[429] == 1
+    assert scheduler.stats["retries"] == 1
+    assert sum(item is not None for item in features) == sum(
+        fake_spotify.catalog.audio_features(track_id) is not None for track_id in track_ids
+    )
+
+def test_only_missing_tracks_are_fetched(fake_spotify, spotify, track_ids):
+    load_audio_features(spotify, track_ids[:150])
+    assert fake_spotify.requests["audio_features"] == 2
+
+    fake_spotify.reset_counts()
+    load_audio_features(spotify, track_ids)
+    assert fake_spotify.requests["audio_features"] == 1
+
+def test_duplicates_are_fetched_once(fake_spotify, spotify, track_ids):
+    # Compilations repeat tracks of earlier releases
+    ids = track_ids[:60] * 2
+    features = load_audio_features(spotify, ids)
+    assert fake_spotify.requests["audio_features"] == 1
+    assert features[:60] == features[60:]
+
+def test_tracks_without_features_are_none_and_cached(fake_spotify, spotify, track_ids):
+    missing = [i for i, track_id in enumerate(track_ids) if fake_spotify.catalog.audio_features(track_id) is None]
+    assert missing, "the catalog should have unanalyzed tracks"
+
+    features = load_audio_features(spotify, track_ids)
+    assert [i for i, item in enumerate(features) if item is None] == missing
+
+    fake_spotify.reset_counts()
+    load_audio_features(spotify, track_ids)
+    assert fake_spotify.total_requests() == 0
+
+def test_forbidden_endpoint_is_reported_unavailable(fake_spotify, spotify, scheduler, track_ids):
+    fake_spotify.audio_features = False
+
+    with pytest.raises(spotipy.SpotifyException) as error:
+        load_audio_features(spotify, track_ids[:10])
+    assert is_unavailable(error.value)
+    # Not retried
+    assert fake_spotify.requests["audio_features"] == 1
+    assert scheduler.stats["retries"] == 0
+
+def test_missing_measures_are_left_out_of_the_aggregates():
+    complete = {field: 0.5 for field in AudioFeatures.__slots__}
+    complete["tempo"] = 120.0
+    complete["loudness"] = -6.0
+    partial = dict(complete, energy=None)
+    del partial["valence"]
+    features = [AudioFeatures.from_json(complete), AudioFeatures.from_json(partial)]
+    assert math.isnan(features[1].energy) and math.isnan(features[1].valence)
+
+    features_df = pd.DataFrame([item.values() for item in features], columns=list(AUDIO_FEATURE_RANGES))
+    summary = compute_audio_feature_summary(features_df).set_index("Feature")
+    assert summary.loc["Energy", "Mean"] == summary.loc["Energy", "Median"] == 0.5
+    assert math.isnan(summary.loc["Energy", "Std"])
+    assert summary.loc["Danceability", "Std"] == 0.0
+
+    distributions = compute_audio_feature_distributions(features_df)
+    tracks = distributions.groupby("Feature", observed=True)["Tracks"].sum()
+    assert tracks["Energy"] == tracks["Valence"] == 1
+    assert tracks["Danceability"] == 2
@@ -0,0 +1,25 @@
+import os
+from utils.cache import SQLiteBackend
+
+def test_full_cache_evicts_in_batches(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite"), max_bytes=200_000, compress_level=0)
+    conn = backend._connect()
+    for i in range(1000):
+        backend.set(f"old:{i}", os.urandom(300), 100)
+
+    # Once full, each eviction leaves room for many writes instead of re-summing on every set
+    statements = []
+    conn.set_trace_callback(statements.append)
+    for i in range(1000):
+        backend.set(f"new:{i}", os.urandom(300), 100)
+    conn.set_trace_callback(None)
+    sums = [statement for statement in statements if "SUM(size)" in statement]
+    assert len(sums) <= 1000 // 50
+
+    total = conn.execute("SELECT SUM(size) FROM entries").fetchone()[0]
+    assert total <= backend.max_bytes
+    assert backend._size == total
+
+    # Least recently used entries go first
+    assert backend.get_entry("old:0") is None
+    assert backend.get_entry("new:999") is not None
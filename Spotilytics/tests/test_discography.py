@@ -0,0 +1,96 @@
+import pytest
+from utils.models import Discography
+from utils.search import (
+    ALBUMS_BATCH_SIZE, fetch_complete_discography, fetch_new_album_ids, iter_discography_batches,
+    update_complete_discography
+)
+
+def fetch(spotify, artist_id, max_workers):
+    discography = Discography(artist_id)
+    for batch in iter_discography_batches(spotify, artist_id, max_workers=max_workers):
+        discography.extend(batch)
+    return discography
+
+def expected_requests(catalog, artist_id):
+    # Listing pages, album batches, then the track pages beyond the 50 embedded in each album
+    listing = catalog.albums_by_artist[artist_id]
+    extra_pages = sum(-(-len(catalog.tracks_by_album[album["id"]]) // 50) - 1 for album in listing)
+    return -(-len(listing) // 50) + -(-len(listing) // ALBUMS_BATCH_SIZE) + extra_pages
+
+@pytest.fixture
+def artist_id(fake_spotify):
+    return fake_spotify.catalog.bench_artists["median"][0]
+
+@pytest.fixture
+def catalog(fake_spotify, artist_id):
+    # The catalog is shared by the whole session, releases added or removed here are undone afterwards
+    listing = list(fake_spotify.catalog.albums_by_artist[artist_id])
+    yield fake_spotify.catalog
+    fake_spotify.catalog.albums_by_artist[artist_id] = listing
+
+def known_groups(discography):
+    return {album_id: album.album_type for album_id, album in discography.albums.items()}
+
+def test_concurrent_fetch_matches_sequential(fake_spotify, spotify, artist_id):
+    sequential = fetch(spotify, artist_id, max_workers=1)
+    assert fake_spotify.total_requests() == expected_requests(fake_spotify.catalog, artist_id)
+
+    fake_spotify.reset_counts()
+    concurrent = fetch(spotify, artist_id, max_workers=8)
+    assert fake_spotify.total_requests() == expected_requests(fake_spotify.catalog, artist_id)
+
+    # Albums in listing order and tracks in album order, whichever batch finished first
+    listing = [album["id"] for album in fake_spotify.catalog.albums_by_artist[artist_id]]
+    assert list(concurrent.albums) == list(sequential.albums) == listing
+    assert [track.id for track in concurrent.tracks] == [track.id for track in sequential.tracks]
+    assert len(concurrent.tracks) == sum(len(fake_spotify.catalog.tracks_by_album[album_id]) for album_id in listing)
+
+def test_concurrent_fetch_retries_rate_limited_batches(fake_spotify, spotify, scheduler, artist_id):
+    expected = [track.id for track in fetch(spotify, artist_id, max_workers=1).tracks]
+
+    fake_spotify.reset_counts()
+    fake_spotify.rate_limit_schedule = {2, 4, 6}
+    discography = fetch(spotify, artist_id, max_workers=8)
+    assert [track.id for track in discography.tracks] == expected
+    assert fake_spotify.errors[429] == 3
+    assert fake_spotify.total_requests() == expected_requests(fake_spotify.catalog, artist_id) + 3
+    assert scheduler.stats["rate_limited"] == 3
+
+def test_update_is_a_no_op_when_nothing_changed(spotify, catalog, artist_id):
+    previous = fetch_complete_discography(spotify, artist_id)
+    assert len(catalog.albums_by_artist[artist_id]) > 50
+    assert fetch_new_album_ids(spotify, artist_id, known_groups(previous)) == ({}, set())
+    assert update_complete_discography(previous, spotify, artist_id) is previous
+
+def test_update_fetches_only_added_releases(fake_spotify, spotify, catalog, artist_id):
+    previous = fetch_complete_discography(spotify, artist_id)
+    single_id = catalog.add_release(artist_id, group="single")
+    compilation_id = catalog.add_release(artist_id, group="compilation", tracks=3)
+    assert fetch_new_album_ids(spotify, artist_id, known_groups(previous)) == (
+        {single_id: "single", compilation_id: "compilation"}, set()
+    )
+
+    fake_spotify.reset_counts()
+    updated = update_complete_discography(previous, spotify, artist_id)
+    assert set(updated.albums) == set(previous.albums) | {single_id, compilation_id}
+    assert fake_spotify.requests["albums"] == 1
+
+@pytest.mark.parametrize("changes", ["removed", "added and removed"])
+def test_update_drops_removed_releases(spotify, catalog, artist_id, changes):
+    previous = fetch_complete_discography(spotify, artist_id)
+    listing = catalog.albums_by_artist[artist_id]
+    # Both past the first page of the listing, which then looks unchanged with the same total
+    removed_id = [album["id"] for album in listing if album["album_group"] == "single"][-1]
+    assert [album["id"] for album in listing].index(removed_id) >= 50
+    if changes == "added and removed":
+        catalog.add_release(artist_id, group="compilation", tracks=3)
+    catalog.remove_release(artist_id, removed_id)
+
+    assert fetch_new_album_ids(spotify, artist_id, known_groups(previous)) is None
+    updated = update_complete_discography(previous, spotify, artist_id)
+    expected = [album["id"] for album in catalog.albums_by_artist[artist_id]]
+    assert removed_id not in updated.albums
+    assert sorted(updated.albums) == sorted(expected)
+    assert sorted(track.id for track in updated.tracks) == sorted(
+        track.id for track in fetch_complete_discography(spotify, artist_id).tracks
+    )
@@ -0,0 +1,31 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.history import HistoryStore
+
+def test_concurrent_recorders_keep_deltas_consistent(tmp_path):
+    history = HistoryStore(str(tmp_path / "history.sqlite"))
+    writers = 4
+    barrier = threading.Barrier(writers)
+
+    def record(writer):
+        # Overlapping entities within the same seconds, like the threads of a related-artists crawl
+        barrier.wait()
+        observed = []
+        for step in range(200):
+            value = writer * 1000 + step
+            history.record([("artist:shared", "followers", value)], t=1000 + step // 10)
+            observed.append(value)
+        return observed
+
+    with ThreadPoolExecutor(max_workers=writers) as executor:
+        observed = {value for values in executor.map(record, range(writers)) for value in values}
+
+    conn = history._connect()
+    last_value = conn.execute("SELECT last_value FROM series WHERE entity = 'artist:shared'").fetchone()[0]
+    total = conn.execute("SELECT SUM(delta) FROM samples").fetchone()[0]
+    assert total == last_value
+
+    # Every point of the reconstructed history is a value that was actually observed
+    points = history.series("artist:shared", "followers")
+    assert points and {value for _, value in points} <= observed
+    assert points[-1][1] == last_value
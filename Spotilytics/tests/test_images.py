@@ -0,0 +1,70 @@
+import os
+import pytest
+from utils import images
+from utils.images import ThumbnailCache, fetch_image, image_source, make_thumbnail, pick_image
+
+Image = pytest.importorskip("PIL.Image")
+
+@pytest.fixture
+def image_urls(tmp_path):
+    # Stand-ins for Spotify's CDN, read through file:// like any other URL
+    urls = {}
+    for name, color in (("red", (200, 30, 30)), ("green", (30, 200, 30)), ("blue", (30, 30, 200))):
+        path = tmp_path / f"{name}.png"
+        Image.new("RGB", (640, 480), color).save(path)
+        urls[name] = path.as_uri()
+    return urls
+
+def test_pick_image_takes_the_smallest_rendition_that_fills_the_box():
+    renditions = [("large", 640, 640), ("medium", 300, 300), ("small", 64, 64)]
+    assert pick_image(renditions, 64) == "small"
+    assert pick_image(renditions, 65) == "medium"
+    assert pick_image(renditions, 1000) == "large"
+    assert pick_image([("wide", 640, 200), ("square", 300, 300)], 250) == "square"
+    assert pick_image([("unsized", None, None), ("tiny", 32, 32)], 64) == "tiny"
+    assert pick_image([("unsized", None, None)], 64) == "unsized"
+    assert pick_image([], 64) is None
+
+def test_thumbnails_are_fetched_resized_and_reused(tmp_path, image_urls):
+    thumbnails = ThumbnailCache(str(tmp_path / "thumbnails"))
+    path = thumbnails.get(image_urls["red"], 64)
+    with Image.open(path) as thumbnail:
+        assert (thumbnail.format, thumbnail.size) == ("JPEG", (64, 64))
+
+    assert thumbnails.get(image_urls["red"], 64) == path
+    assert thumbnails.get(image_urls["red"], 128) != path
+    assert thumbnails.stats()["hits"] == 1 and thumbnails.stats()["misses"] == 2
+
+def test_least_recently_used_thumbnails_are_removed_past_max_bytes(tmp_path, image_urls):
+    sizes = {name: len(make_thumbnail(fetch_image(url), 64)) for name, url in image_urls.items()}
+    # Room for any two of the three
+    thumbnails = ThumbnailCache(str(tmp_path / "thumbnails"), max_bytes=sum(sizes.values()) - 1)
+    red = thumbnails.get(image_urls["red"], 64)
+    green = thumbnails.get(image_urls["green"], 64)
+    thumbnails.get(image_urls["red"], 64)
+    blue = thumbnails.get(image_urls["blue"], 64)
+
+    assert os.path.exists(red) and os.path.exists(blue) and not os.path.exists(green)
+    assert thumbnails.stats()["bytes"] == sizes["red"] + sizes["blue"] <= thumbnails.max_bytes
+
+    # The order survives a restart through the files' mtimes
+    os.utime(red, (1, 1))
+    restarted = ThumbnailCache(thumbnails.directory, max_bytes=thumbnails.max_bytes)
+    restarted.get(image_urls["green"], 64)
+    assert not os.path.exists(red) and os.path.exists(blue)
+
+def test_images_that_cannot_be_fetched_fall_back_to_the_url(tmp_path, image_urls, monkeypatch):
+    fetched = []
+    def fetch(url):
+        fetched.append(url)
+        return fetch_image(url)
+
+    thumbnails = ThumbnailCache(str(tmp_path / "thumbnails"), fetch=fetch)
+    monkeypatch.setattr(images, "_thumbnails", thumbnails)
+    missing = (tmp_path / "missing.png").as_uri()
+    assert image_source([(missing, 640, 640)], 64) == missing
+    assert image_source([(missing, 640, 640)], 64) == missing
+    # Failures are remembered instead of being retried on every rerun
+    assert fetched == [missing] and thumbnails.stats()["failures"] == 1
+
+    assert image_source([(image_urls["blue"], 640, 480)], 64) == thumbnails.path_for(image_urls["blue"], 64)
@@ -0,0 +1,38 @@
+# Imported for the collectors they register
+import utils.aggregates, utils.charts, utils.images, utils.search
+from utils.cache import LRUCache
+from utils.metrics import Registry, lru_collector, registry
+
+def families(text):
+    # {metric family: (declared type, sample names)}, failing on a family declared twice or split in blocks
+    found = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, current, kind = line.split()
+            assert current not in found, f"{current} declared twice"
+            found[current] = (kind, [])
+        else:
+            name = line.split("{")[0].split(" ")[0]
+            assert name.startswith(current), f"{name} outside the {current} block"
+            found[current][1].append(name)
+    return found
+
+def test_collectors_of_the_same_family_export_one_block():
+    metrics = Registry()
+    metrics.inc("spotilytics_api_calls_total", endpoint="albums")
+    metrics.observe("spotilytics_duration_seconds", 0.2, stage="fetch", name="albums")
+    for name in ("tables", "figures"):
+        metrics.add_collector(lru_collector(name, LRUCache()))
+    metrics.inc("spotilytics_api_calls_total", endpoint="search")
+
+    exported = families(metrics.export())
+    assert exported["spotilytics_api_calls_total"] == ("counter", ["spotilytics_api_calls_total"] * 2)
+    assert exported["spotilytics_duration_seconds"][0] == "histogram"
+    for field in ("hits", "misses", "size"):
+        assert exported[f"spotilytics_lru_{field}"] == ("gauge", [f"spotilytics_lru_{field}"] * 2)
+
+def test_app_metrics_export_cleanly():
+    # Every collector the app registers, gauges never named like counters
+    for name, (kind, _) in families(registry.export()).items():
+        assert kind == "counter" or not name.endswith("_total"), name
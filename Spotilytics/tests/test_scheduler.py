@@ -0,0 +1,82 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import spotipy
+from utils.scheduler import CircuitOpenError
+
+@pytest.fixture
+def artist_id(fake_spotify):
+    return fake_spotify.catalog.bench_artists["small"][0]
+
+def test_rate_limited_requests_are_retried_after_retry_after(fake_spotify, spotify, scheduler, clock, artist_id):
+    fake_spotify.rate_limit_schedule = {1, 2}
+
+    assert spotify.artist(artist_id)["id"] == artist_id
+    assert fake_spotify.requests["artist"] == 3
+    assert fake_spotify.errors[429] == 2
+    assert scheduler.stats == {"calls": 3, "retries": 2, "rate_limited": 2, "rejected": 0}
+    assert clock.sleeps == [1.0, 1.0]
+    assert scheduler.breaker.state == "closed"
+
+def test_concurrent_rate_limits_only_pause(fake_spotify, spotify, scheduler, clock, artist_id):
+    # One rate-limit window hitting every in-flight request: all of them go through after the pause
+    callers = 8
+    fake_spotify.rate_limit_schedule = set(range(1, callers + 1))
+    barrier = threading.Barrier(callers)
+
+    def call():
+        barrier.wait()
+        return spotify.artist(artist_id)["id"]
+
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        results = list(executor.map(lambda _: call(), range(callers)))
+    assert results == [artist_id] * callers
+    assert fake_spotify.errors[429] == callers
+    assert scheduler.stats["rejected"] == 0
+    assert scheduler.breaker.state == "closed"
+
+def test_exhausted_rate_limit_retries_leave_the_breaker_closed(fake_spotify, spotify, scheduler, artist_id):
+    fake_spotify.rate_limit_schedule = set(range(1, scheduler.max_retries + 2))
+
+    with pytest.raises(spotipy.SpotifyException) as error:
+        spotify.artist(artist_id)
+    assert error.value.http_status == 429
+    assert scheduler.breaker.state == "closed"
+    assert spotify.artist(artist_id)["id"] == artist_id
+
+def test_exhausted_retries_open_the_breaker_until_reset_timeout(fake_spotify, spotify, scheduler, clock, artist_id):
+    fake_spotify.error_schedule = set(range(1, scheduler.max_retries + 2))
+
+    with pytest.raises(spotipy.SpotifyException) as error:
+        spotify.artist(artist_id)
+    assert error.value.http_status == 500
+    assert fake_spotify.requests["artist"] == scheduler.max_retries + 1
+    assert scheduler.stats["retries"] == scheduler.max_retries
+    assert scheduler.breaker.state == "open"
+
+    # Rejected without reaching the server while open
+    with pytest.raises(CircuitOpenError):
+        spotify.artist(artist_id)
+    assert fake_spotify.total_requests() == scheduler.max_retries + 1
+    assert scheduler.stats["rejected"] == 1
+
+    # One probe after reset_timeout, which closes it again
+    clock.advance(scheduler.breaker.reset_timeout)
+    assert scheduler.breaker.state == "half-open"
+    assert spotify.artist(artist_id)["id"] == artist_id
+    assert scheduler.breaker.state == "closed"
+
+def test_retry_after_beyond_backoff_max_fails_fast(fake_spotify, spotify, scheduler, clock, artist_id):
+    fake_spotify.rate_limit_schedule = {1}
+    fake_spotify.retry_after = 60
+
+    with pytest.raises(spotipy.SpotifyException):
+        spotify.artist(artist_id)
+    assert fake_spotify.requests["artist"] == 1
+    assert clock.sleeps == []
+
+    # The breaker stays open for the whole Retry-After, not just reset_timeout
+    with pytest.raises(CircuitOpenError) as error:
+        spotify.artist(artist_id)
+    assert error.value.retry_in == pytest.approx(60)
+    assert fake_spotify.total_requests() == 1
@@ -0,0 +1,42 @@
+import pytest
+from types import SimpleNamespace
+from utils.autocomplete import SearchPolicy, artist_index
+from utils.metrics import registry
+from utils.models import Artist
+from utils.search import load_artist, load_related_artists, seed_artist_index, update_search
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_loaded_artists_are_indexed(fake_spotify, spotify):
+    artist_id = fake_spotify.catalog.bench_artists["small"][1]
+    artist = load_artist(spotify, artist_id)
+    assert artist_index.get(artist_id) is artist
+
+    related = load_related_artists(spotify, artist_id)
+    assert all(artist_index.get(other.id) is other for other in related)
+
+def test_index_is_seeded_from_the_persistent_cache(fake_spotify, spotify):
+    # As stored by warm_cache.py, from another process
+    artist = Artist.from_json(dict(fake_spotify.catalog.artists[fake_spotify.catalog.bench_artists["median"][2]], name="Zyxwv Seeded"))
+    load_artist.store(artist, spotify, artist.id)
+    assert artist_index.prefix("zyxwv") == []
+
+    seed_artist_index.clear()
+    seed_artist_index()
+    assert [found.id for found in artist_index.prefix("zyxwv")] == [artist.id]
+
+def test_one_letter_queries_search_spotify(fake_spotify, spotify):
+    assert SearchPolicy().needs_remote("j", [])
+    fake_spotify.catalog.add_artist("J", 1, 1)
+    assert artist_index.lookup("j") == []
+
+    remote_searches = artist_index.stats["remote_searches"]
+    session_state = SimpleNamespace(last_search="", artist_result_ids=[], selected_artist_id=None)
+    update_search(spotify, session_state, "J")
+    assert fake_spotify.requests["search"] == 1
+    assert [artist_index.get(artist_id).name for artist_id in session_state.artist_result_ids] == ["J"]
+
+    # The index answers from then on, and its hit rate is exported
+    update_search(spotify, SimpleNamespace(last_search="", artist_result_ids=[], selected_artist_id=None), "J")
+    assert fake_spotify.requests["search"] == 1
+    assert artist_index.stats["remote_searches"] == remote_searches + 1
+    assert "spotilytics_artist_index_lookups{result=\"remote_search\"}" in registry.export()
@@ -0,0 +1,198 @@
+import warnings
+import numpy as np
+import pandas as pd
+from .cache import LRUCache
+from .dataframes import create_tracks_dataframe, create_discography_dataframe, create_audio_features_dataframe
+from .metrics import registry, lru_collector, timed
+from .snapshots import load_snapshot, save_snapshot, export_parquet_zip
+
+# Derived tables are computed once per artist and data version, then reused by every rerun
+tables_cache = LRUCache(maxsize=512)
+registry.add_collector(lru_collector("tables", tables_cache))
+
+DISCOGRAPHY_SNAPSHOT_TABLES = ("tracks", "tracks_per_year")
+
+# Column -> (low, high) of the histogram, in the order of AudioFeatures.values().
+# Values outside the range fall in the first or last bin
+AUDIO_FEATURE_RANGES = {
+    "Danceability": (0.0, 1.0),
+    "Energy": (0.0, 1.0),
+    "Valence": (0.0, 1.0),
+    "Acousticness": (0.0, 1.0),
+    "Instrumentalness": (0.0, 1.0),
+    "Speechiness": (0.0, 1.0),
+    "Liveness": (0.0, 1.0),
+    "Tempo": (40.0, 220.0),
+    "Loudness": (-40.0, 0.0)
+}
+AUDIO_FEATURE_BINS = 20
+# Features on a 0-1 scale, averaged per release year on a shared axis
+UNIT_AUDIO_FEATURES = [column for column, (low, high) in AUDIO_FEATURE_RANGES.items() if (low, high) == (0.0, 1.0)]
+
+class TopTrackTables:
+    __slots__ = ('artist_id', 'version', 'tracks', 'album_stats')
+
+    def __init__(self, artist_id, version, tracks, album_stats):
+        self.artist_id = artist_id
+        self.version = version
+        self.tracks = tracks
+        self.album_stats = album_stats
+
+class DiscographyTables:
+    __slots__ = ('artist_id', 'version', 'tracks', 'tracks_per_year', 'release_count', 'track_count')
+
+    def __init__(self, artist_id, version, tracks, tracks_per_year, release_count, track_count):
+        self.artist_id = artist_id
+        self.version = version
+        self.tracks = tracks
+        self.tracks_per_year = tracks_per_year
+        self.release_count = release_count
+        self.track_count = track_count
+
+class AudioFeatureTables:
+    __slots__ = ('artist_id', 'version', 'tracks', 'summary', 'distributions', 'features_per_year', 'track_count')
+
+    def __init__(self, artist_id, version, tracks, summary, distributions, features_per_year, track_count):
+        self.artist_id = artist_id
+        self.version = version
+        self.tracks = tracks  # one row per distinct track Spotify has audio features for
+        self.summary = summary
+        self.distributions = distributions
+        self.features_per_year = features_per_year
+        self.track_count = track_count  # distinct tracks in the discography
+
+def top_tracks_version(top_tracks):
+    # Cheap fingerprint in plain Python, so a cache hit costs no pandas work
+    return tuple((track.id, track.popularity) for track in top_tracks)
+
+def discography_version(discography):
+    return (discography.fetched_at, len(discography.albums), len(discography.tracks))
+
+def compute_album_stats(tracks_df):
+    if tracks_df.empty:
+        return pd.DataFrame(columns=["Album", "Track", "Popularity"])
+    return tracks_df.groupby("Album", observed=True).agg(
+        Track=("Track", "count"),
+        Popularity=("Popularity", "mean")
+    ).reset_index()
+
+def compute_tracks_per_year(discography_df):
+    if discography_df.empty:
+        return pd.DataFrame(columns=["Year", "Track"])
+    return discography_df["Release Year"].dropna().value_counts().sort_index().rename_axis("Year").reset_index(name="Track")
+
+def merge_tracks_per_year(*tables):
+    # Running totals for a discography that arrives in batches
+    return pd.concat(tables, ignore_index=True).groupby("Year", as_index=False)["Track"].sum()
+
+def compute_audio_feature_summary(features_df):
+    # Column-wise numpy reductions over one array, DataFrame.agg would go feature by feature.
+    # Missing measures are NaN and left out, a feature no track has stays NaN
+    columns = list(AUDIO_FEATURE_RANGES)
+    values = features_df[columns].to_numpy(dtype=np.float64)
+    if not len(values):
+        return pd.DataFrame({"Feature": columns, "Mean": np.nan, "Median": np.nan, "Std": np.nan})
+    with warnings.catch_warnings():
+        # Empty slices and a single value per feature are expected, their result is NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return pd.DataFrame({
+            "Feature": columns,
+            "Mean": np.nanmean(values, axis=0),
+            "Median": np.nanmedian(values, axis=0),
+            "Std": np.nanstd(values, axis=0, ddof=1)
+        })
+
+def compute_audio_feature_distributions(features_df):
+    # Every histogram in one pass: values become bin numbers, offset per feature, counted by a single bincount
+    columns = list(AUDIO_FEATURE_RANGES)
+    lows, highs = np.array(list(AUDIO_FEATURE_RANGES.values())).T
+    widths = (highs - lows) / AUDIO_FEATURE_BINS
+    values = features_df[columns].to_numpy(dtype=np.float64)
+    measured = ~np.isnan(values)
+    bins = np.clip(np.floor((np.where(measured, values, lows) - lows) / widths), 0, AUDIO_FEATURE_BINS - 1).astype(np.intp)
+    counts = np.bincount(
+        (bins + np.arange(len(columns)) * AUDIO_FEATURE_BINS)[measured], minlength=len(columns) * AUDIO_FEATURE_BINS
+    )
+    starts = lows[:, None] + widths[:, None] * np.arange(AUDIO_FEATURE_BINS)
+    return pd.DataFrame({
+        "Feature": pd.Categorical(np.repeat(columns, AUDIO_FEATURE_BINS), categories=columns),
+        "Start": starts.ravel(),
+        "End": (starts + widths[:, None]).ravel(),
+        "Tracks": counts
+    })
+
+def compute_audio_features_per_year(features_df):
+    if features_df.empty:
+        return pd.DataFrame(columns=["Year", *UNIT_AUDIO_FEATURES])
+    return features_df.groupby("Release Year")[UNIT_AUDIO_FEATURES].mean().rename_axis("Year").reset_index()
+
+@timed("tables")
+def build_top_track_tables(artist_id, top_tracks):
+    tracks_df = create_tracks_dataframe(top_tracks)
+    return TopTrackTables(
+        artist_id,
+        top_tracks_version(top_tracks),
+        tracks_df,
+        compute_album_stats(tracks_df)
+    )
+
+@timed("tables")
+def build_discography_tables(discography):
+    discography_df = create_discography_dataframe(discography)
+    return DiscographyTables(
+        discography.artist_id,
+        discography_version(discography),
+        discography_df,
+        compute_tracks_per_year(discography_df),
+        len(discography.albums),
+        len(discography.tracks)
+    )
+
+@timed("tables")
+def build_audio_feature_tables(discography_tables, track_ids, features):
+    # track_ids: every track of the discography in order, features: one AudioFeatures or None per id
+    features_df = create_audio_features_dataframe(discography_tables.tracks, track_ids, features, list(AUDIO_FEATURE_RANGES))
+    return AudioFeatureTables(
+        discography_tables.artist_id,
+        discography_tables.version,
+        features_df,
+        compute_audio_feature_summary(features_df),
+        compute_audio_feature_distributions(features_df),
+        compute_audio_features_per_year(features_df),
+        len(set(track_ids))
+    )
+
+def load_discography_tables(discography):
+    # A snapshot left by another worker process or an earlier run saves rebuilding the DataFrames
+    version = discography_version(discography)
+    tables = load_snapshot(discography.artist_id, "discography", version, DISCOGRAPHY_SNAPSHOT_TABLES)
+    if tables is not None:
+        return DiscographyTables(
+            discography.artist_id,
+            version,
+            tables["tracks"],
+            tables["tracks_per_year"],
+            len(discography.albums),
+            len(discography.tracks)
+        )
+    built = build_discography_tables(discography)
+    save_snapshot(discography.artist_id, "discography", version, {"tracks": built.tracks, "tracks_per_year": built.tracks_per_year})
+    return built
+
+def get_top_track_tables(artist_id, top_tracks):
+    key = ("top_tracks", artist_id, top_tracks_version(top_tracks))
+    return tables_cache.get_or_create(key, lambda: build_top_track_tables(artist_id, top_tracks))
+
+def get_discography_tables(discography):
+    key = ("discography", discography.artist_id, discography_version(discography))
+    return tables_cache.get_or_create(key, lambda: load_discography_tables(discography))
+
+def get_artist_export(top_track_tables, discography_tables):
+    # Zip of Parquet files behind the download button, built once per data version
+    key = ("export", discography_tables.artist_id, top_track_tables.version, discography_tables.version)
+    return tables_cache.get_or_create(key, lambda: export_parquet_zip({
+        "top_tracks": top_track_tables.tracks,
+        "top_track_albums": top_track_tables.album_stats,
+        "discography": discography_tables.tracks,
+        "tracks_per_year": discography_tables.tracks_per_year
+    }))
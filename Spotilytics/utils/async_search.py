@@ -0,0 +1,87 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from .search import get_artist_top_tracks, get_complete_discography, peek_complete_discography, stream_complete_discography
+
+# spotipy is synchronous, so the coroutines below hand the blocking calls to this pool
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="spotilytics-data")
+
+# Marks the end of a stream_in_background
+_DONE = object()
+
+def with_script_run_ctx(func):
+    ctx = get_script_run_ctx()
+
+    def call(*args, **kwargs):
+        # Lets st.cache_data spinners and warnings find the session that asked for the data
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return func(*args, **kwargs)
+
+    return call
+
+async def run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, lambda: with_script_run_ctx(func)(*args, **kwargs))
+
+def stream_in_background(func, *args, **kwargs):
+    # Starts iterating the generator func on the pool right away; the returned generator yields
+    # its items as they come and raises its error. The stream runs to the end even if nobody reads it
+    items = queue.Queue()
+
+    def produce():
+        try:
+            for item in func(*args, **kwargs):
+                items.put((item, None))
+        except BaseException as e:
+            items.put((_DONE, e))
+        else:
+            items.put((_DONE, None))
+
+    def consume():
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+
+    _executor.submit(with_script_run_ctx(produce))
+    return consume()
+
+async def load_artist_view_async(sp_client, artist_id):
+    top_tracks, discography = await asyncio.gather(
+        run_blocking(get_artist_top_tracks, sp_client, artist_id),
+        run_blocking(get_complete_discography, sp_client, artist_id)
+    )
+    return top_tracks, discography
+
+async def load_comparison_async(sp_client, artist_ids):
+    # Every artist's top tracks and discography, all requested at once
+    views = await asyncio.gather(*(load_artist_view_async(sp_client, artist_id) for artist_id in artist_ids))
+    top_tracks = [view[0] for view in views]
+    discographies = [view[1] for view in views]
+    return top_tracks, discographies
+
+def run_sync(coro):
+    # Streamlit scripts have no running event loop, but stay safe if one exists
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+def load_artist_view(sp_client, artist_id):
+    # (top tracks, discography, None) when the discography is cached, otherwise
+    # (top tracks, None, batches): its stream starts before top tracks are requested
+    discography = peek_complete_discography(sp_client, artist_id)
+    batches = None if discography is not None else stream_in_background(stream_complete_discography, sp_client, artist_id)
+    return get_artist_top_tracks(sp_client, artist_id), discography, batches
+
+def load_comparison(sp_client, artist_ids):
+    return run_sync(load_comparison_async(sp_client, artist_ids))
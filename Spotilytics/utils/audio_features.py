@@ -0,0 +1,89 @@
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from .cache import persistent_batch_cache
+from .singleflight import single_flight
+from .scheduler import EndpointAvailability, is_unavailable
+from .models import AudioFeatures
+from .aggregates import tables_cache, build_audio_feature_tables
+from .charts import plot_audio_feature_distributions, plot_audio_features_per_year
+from .search import MAX_CONCURRENT_REQUESTS
+
+# Tempo, energy, danceability and the other audio features over a whole discography
+
+# Maximum number of ids accepted by Spotify's "Get Several Tracks' Audio Features" endpoint
+AUDIO_FEATURES_BATCH_SIZE = 100
+# The features of a recording never change
+AUDIO_FEATURES_TTL = 30 * 86400
+UNAVAILABLE_MESSAGE = "Audio features are not available: Spotify no longer serves them to apps created after November 2024."
+
+audio_features_access = EndpointAvailability()
+
+def fetch_audio_features_batch(sp_client, track_ids):
+    # Spotify answers null for tracks it has not analyzed
+    return [AudioFeatures.from_json(features) if features else None for features in sp_client.audio_features(track_ids)]
+
+@persistent_batch_cache("audio_features", ttl=AUDIO_FEATURES_TTL)
+def load_audio_features(_sp_client, track_ids, batch_size=AUDIO_FEATURES_BATCH_SIZE, max_workers=MAX_CONCURRENT_REQUESTS):
+    # Cached per track, so only the ids never fetched before get here, whatever discography they came from
+    batches = [track_ids[i:i + batch_size] for i in range(0, len(track_ids), batch_size)]
+    if max_workers <= 1 or len(batches) <= 1:
+        results = [fetch_audio_features_batch(_sp_client, batch) for batch in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            results = list(executor.map(lambda batch: fetch_audio_features_batch(_sp_client, batch), batches))
+    return [features for batch in results for features in batch]
+
+@single_flight("audio_feature_tables")
+def load_audio_feature_tables(_sp_client, artist_id, version, _discography, _discography_tables):
+    track_ids = [track.id for track in _discography.tracks]
+    return build_audio_feature_tables(_discography_tables, track_ids, load_audio_features(_sp_client, track_ids))
+
+def get_audio_feature_tables(sp_client, discography, discography_tables):
+    # Built once per discography version, like the other tables
+    key = ("audio_features", discography.artist_id, discography_tables.version)
+    return tables_cache.get_or_create(key, lambda: load_audio_feature_tables(
+        sp_client, discography.artist_id, discography_tables.version, discography, discography_tables
+    ))
+
+def render_audio_features(sp_client, discography, discography_tables):
+    st.subheader("Audio Features")
+    if not audio_features_access.available():
+        st.info(UNAVAILABLE_MESSAGE)
+        return
+
+    # Fetched on demand, a large discography costs a few dozen API calls
+    if st.session_state.features_artist_id != discography.artist_id:
+        if st.button("🎛️ Analyze audio features"):
+            st.session_state.features_artist_id = discography.artist_id
+            st.rerun()
+        return
+
+    try:
+        with st.spinner("Fetching audio features..."):
+            tables = get_audio_feature_tables(sp_client, discography, discography_tables)
+    except Exception as e:
+        if not is_unavailable(e):
+            raise
+        audio_features_access.mark_unavailable()
+        st.info(UNAVAILABLE_MESSAGE)
+        return
+
+    if tables.tracks.empty:
+        st.info("Spotify has no audio features for the tracks of this discography.")
+        return
+
+    st.caption(f"{len(tables.tracks)} of {tables.track_count} distinct tracks analyzed by Spotify")
+    cache_key = (tables.artist_id, tables.version)
+    distributions_tab, per_year_tab, summary_tab = st.tabs(["Distributions", "Per release year", "Summary"])
+    plot_audio_feature_distributions(tables.distributions, container=distributions_tab, cache_key=cache_key)
+    plot_audio_features_per_year(tables.features_per_year, container=per_year_tab, cache_key=cache_key)
+    summary_tab.dataframe(
+        tables.summary,
+        hide_index=True,
+        use_container_width=True,
+        column_config={column: st.column_config.NumberColumn(format="%.3f") for column in ("Mean", "Median", "Std")}
+    )
+
+    if st.button("Hide audio features"):
+        st.session_state.features_artist_id = None
+        st.rerun()
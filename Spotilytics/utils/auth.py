@@ -1,14 +1,93 @@
 import os
+import threading
+import time
 from dotenv import load_dotenv
+import requests
+from requests.adapters import HTTPAdapter
 import spotipy
+from spotipy.cache_handler import MemoryCacheHandler
 from spotipy.oauth2 import SpotifyClientCredentials
+import streamlit as st
+from .scheduler import spotify_scheduler
+from .metrics import record_api_call
+
+# Kept connections to the API, enough for every session fanning out at once
+HTTP_POOL_SIZE = int(os.getenv("SPOTILYTICS_HTTP_POOL_SIZE", "32"))
+# Tokens are renewed this many seconds before Spotify expires them
+TOKEN_REFRESH_MARGIN = 300
+# Other API and token endpoints, e.g. the fake Spotify server of the benchmarks
+API_PREFIX = os.getenv("SPOTILYTICS_API_PREFIX")
+TOKEN_URL = os.getenv("SPOTILYTICS_TOKEN_URL")
+
+class SharedClientCredentials(SpotifyClientCredentials):
+    # One token per process, renewed by a single thread shortly before it expires
+    def __init__(self, *args, refresh_margin=TOKEN_REFRESH_MARGIN, **kwargs):
+        super().__init__(*args, cache_handler=MemoryCacheHandler(), **kwargs)
+        self.refresh_margin = refresh_margin
+        self._token_info = None
+        self._token_lock = threading.Lock()
+
+    def get_access_token(self, as_dict=True, check_cache=True):
+        with self._token_lock:
+            token_info = self._token_info
+            if not check_cache or token_info is None or token_info["expires_at"] - time.time() < self.refresh_margin:
+                token_info = self._add_custom_values_to_token_info(self._request_access_token())
+                self._token_info = token_info
+
+        return token_info if as_dict else token_info["access_token"]
+
+class ScheduledSpotify(spotipy.Spotify):
+    # Every API request goes through the shared scheduler (rate limit, retries, circuit breaker)
+    def __init__(self, *args, scheduler=spotify_scheduler, **kwargs):
+        self.scheduler = scheduler
+        super().__init__(*args, **kwargs)
+
+    def _internal_call(self, method, url, payload, params):
+        return self.scheduler.call(self._timed_call, method, url, payload, params)
+
+    def _timed_call(self, method, url, payload, params):
+        # One observation per attempt, retries included
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return super()._internal_call(method, url, payload, params)
+        except spotipy.SpotifyException as e:
+            status = str(e.http_status)
+            raise
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            record_api_call(method, url, time.perf_counter() - started, status)
+
+def build_http_session(pool_size=HTTP_POOL_SIZE):
+    # No urllib3 retries, so 429s and their Retry-After reach the scheduler
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 def init_spotify_client():
     load_dotenv()
     client_id = os.getenv("spotipyId")
     client_secret = os.getenv("spotipySecret")
-    
-    return spotipy.Spotify(auth_manager=SpotifyClientCredentials(
+
+    session = build_http_session()
+    auth_manager = SharedClientCredentials(
         client_id=client_id,
-        client_secret=client_secret
-    ))
\ No newline at end of file
+        client_secret=client_secret,
+        requests_session=session
+    )
+    if TOKEN_URL:
+        auth_manager.OAUTH_TOKEN_URL = TOKEN_URL
+
+    client = ScheduledSpotify(auth_manager=auth_manager, requests_session=session)
+    if API_PREFIX:
+        client.prefix = API_PREFIX.rstrip("/") + "/"
+    return client
+
+@st.cache_resource(show_spinner=False)
+def get_spotify_client():
+    # Shared by every session and rerun of the process
+    return init_spotify_client()
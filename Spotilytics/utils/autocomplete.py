@@ -0,0 +1,146 @@
+import bisect
+import difflib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from .metrics import registry
+
+def normalize(text):
+    # Case- and accent-insensitive form used for every key and query
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+class ArtistIndex:
+    # Sorted-array prefix index over every artist the process has already fetched
+    def __init__(self, max_artists=50000):
+        self.max_artists = max_artists
+        self._keys = []  # sorted (normalized key, artist id)
+        self._artists = OrderedDict()  # id -> artist, oldest first
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "local_hits": 0, "remote_searches": 0}
+
+    def __len__(self):
+        return len(self._artists)
+
+    @staticmethod
+    def _artist_keys(artist):
+        # The full name and every word suffix, so "beat" finds "The Beatles"
+        words = normalize(artist.name).split(" ")
+        return {" ".join(words[i:]) for i in range(len(words))} - {""}
+
+    def add(self, artists):
+        with self._lock:
+            for artist in artists:
+                previous = self._artists.pop(artist.id, None)
+                if previous is None or previous.name != artist.name:
+                    if previous is not None:
+                        self._remove_keys(previous)
+                    for key in self._artist_keys(artist):
+                        bisect.insort(self._keys, (key, artist.id))
+                self._artists[artist.id] = artist
+
+            if len(self._artists) > self.max_artists:
+                # Forget the oldest tenth in one pass rather than one key at a time
+                for _ in range(len(self._artists) - self.max_artists * 9 // 10):
+                    self._artists.popitem(last=False)
+                self._keys = [entry for entry in self._keys if entry[1] in self._artists]
+
+    def _remove_keys(self, artist):
+        for key in self._artist_keys(artist):
+            i = bisect.bisect_left(self._keys, (key, artist.id))
+            if i < len(self._keys) and self._keys[i] == (key, artist.id):
+                del self._keys[i]
+
+    def get(self, artist_id):
+        return self._artists.get(artist_id)
+
+    def prefix(self, query, limit=10):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+
+        with self._lock:
+            matches = {}
+            i = bisect.bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+                artist_id = self._keys[i][1]
+                matches[artist_id] = self._artists[artist_id]
+                i += 1
+
+        # Exact names first, then the most popular
+        return sorted(
+            matches.values(),
+            key=lambda artist: (normalize(artist.name) != prefix, -artist.popularity)
+        )[:limit]
+
+    def fuzzy(self, query, limit=10, cutoff=0.75):
+        # Close matches among keys sharing the first character, to absorb typos after it
+        target = normalize(query)
+        if not target:
+            return []
+
+        with self._lock:
+            start = bisect.bisect_left(self._keys, (target[0],))
+            end = bisect.bisect_left(self._keys, (chr(ord(target[0]) + 1),))
+            candidates = {}
+            for key, artist_id in self._keys[start:end]:
+                candidates.setdefault(key[:len(target) + 2], artist_id)
+            close = difflib.get_close_matches(target, list(candidates), n=limit, cutoff=cutoff)
+            return [self._artists[candidates[key]] for key in close]
+
+    def lookup(self, query, limit=10):
+        # Fuzzy matching is far slower than a prefix scan, so it is only a fallback for typos
+        return self.prefix(query, limit) or self.fuzzy(query, limit)
+
+    def record(self, local_hit):
+        with self._lock:
+            self.stats["lookups"] += 1
+            self.stats["local_hits" if local_hit else "remote_searches"] += 1
+
+    def hit_rate(self):
+        lookups = self.stats["lookups"]
+        return self.stats["local_hits"] / lookups if lookups else 0.0
+
+class SearchPolicy:
+    # Decides when the local index is good enough and the remote search can be skipped
+    def __init__(self, min_local_results=5, limit=10, complete_ttl=3600, max_prefixes=10000):
+        self.min_local_results = min_local_results
+        self.limit = limit
+        self.complete_ttl = complete_ttl
+        self.max_prefixes = max_prefixes
+        self._complete_prefixes = {}  # normalized query -> time of the remote search
+        self._lock = threading.Lock()
+
+    def needs_remote(self, query, local_results):
+        normalized = normalize(query)
+        # Short queries go remote too, a one-letter artist is only found there on a cold index
+        if len(local_results) >= self.min_local_results:
+            return False
+
+        # A shorter query that returned less than a full page already listed every match
+        now = time.time()
+        with self._lock:
+            return not any(
+                now - self._complete_prefixes.get(normalized[:length], 0) < self.complete_ttl
+                for length in range(1, len(normalized) + 1)
+            )
+
+    def remote_done(self, query, remote_results):
+        if len(remote_results) >= self.limit:
+            return
+
+        with self._lock:
+            if len(self._complete_prefixes) >= self.max_prefixes:
+                self._complete_prefixes.clear()
+            self._complete_prefixes[normalize(query)] = time.time()
+
+# Shared by every session of the process
+artist_index = ArtistIndex()
+search_policy = SearchPolicy()
+registry.add_collector(lambda: [
+    ("spotilytics_artist_index_size", {}, len(artist_index)),
+    ("spotilytics_artist_index_lookups", {"result": "local_hit"}, artist_index.stats["local_hits"]),
+    ("spotilytics_artist_index_lookups", {"result": "remote_search"}, artist_index.stats["remote_searches"])
+])
@@ -0,0 +1,482 @@
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import registry
+
+# Bump when the shape of cached payloads changes so old entries are ignored
+CACHE_VERSION = 4
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ".spotilytics_cache",
+    "responses.sqlite"
+)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Returned by backends on a miss, so that None can be cached like any other value
+MISSING = object()
+
+def make_key(endpoint, arguments):
+    digest = hashlib.sha1(repr((CACHE_VERSION, arguments)).encode("utf-8")).hexdigest()
+    return f"{endpoint}:{digest}"
+
+def cache_arguments(func, args, kwargs):
+    # Same convention as st.cache_data: parameters starting with "_" are not part of the key
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return tuple((name, value) for name, value in bound.arguments.items() if not name.startswith("_"))
+
+class CacheBackend:
+    def get_entry(self, key):
+        # Returns (value, expires_at) even for expired entries, or None on a miss
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def get_expiry(self, key):
+        # expires_at of the entry without loading its value, or None on a miss
+        entry = self.get_entry(key)
+        return None if entry is None else entry[1]
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        if entry is None or entry[1] < time.time():
+            return MISSING
+        return entry[0]
+
+    def values(self, endpoint):
+        # Every value stored for endpoint, expired ones included
+        raise NotImplementedError
+
+    def get_entries(self, keys):
+        # key -> (value, expires_at) for the keys present, expired ones included
+        entries = {}
+        for key in keys:
+            entry = self.get_entry(key)
+            if entry is not None:
+                entries[key] = entry
+        return entries
+
+    def set_many(self, items, ttl):
+        for key, value in items.items():
+            self.set(key, value, ttl)
+
+class MemoryBackend(CacheBackend):
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def values(self, endpoint):
+        prefix = endpoint + ":"
+        with self._lock:
+            return [value for key, (value, _) in self._entries.items() if key.startswith(prefix)]
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteBackend(CacheBackend):
+    # Safe to share between threads and between processes on the same host
+
+    # Keys per "IN (...)" query, below the host parameter limit of older SQLite builds
+    QUERY_BATCH_SIZE = 500
+    # Reads only write the access time back when it is older than this, in seconds
+    ACCESS_UPDATE_INTERVAL = 60
+    # The store size is tracked from the bytes written and summed again every this many writes,
+    # which also picks up what other processes wrote
+    SIZE_CHECK_WRITES = 256
+    # Share of max_bytes an eviction brings the store down to
+    EVICT_LOW_WATER = 0.9
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, compress_level=6):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self._local = threading.local()
+        self._size = None
+        self._writes = 0
+        self._size_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _dumps(self, value):
+        return zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), self.compress_level)
+
+    def _loads(self, blob):
+        return pickle.loads(zlib.decompress(blob))
+
+    def _touch(self, conn, rows):
+        # rows: (key, accessed_at); a write transaction only for the entries not touched recently
+        now = time.time()
+        stale = [(now, key) for key, accessed_at in rows if now - accessed_at > self.ACCESS_UPDATE_INTERVAL]
+        if stale:
+            with conn:
+                conn.executemany("UPDATE entries SET accessed_at = ? WHERE key = ?", stale)
+
+    def get_entry(self, key):
+        conn = self._connect()
+        row = conn.execute("SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        self._touch(conn, [(key, row[2])])
+        return self._loads(row[0]), row[1]
+
+    def get_expiry(self, key):
+        conn = self._connect()
+        row = conn.execute("SELECT expires_at, accessed_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        # The value is in use even when the caller keeps it in memory
+        self._touch(conn, [(key, row[1])])
+        return row[0]
+
+    def set(self, key, value, ttl):
+        blob = self._dumps(value)
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now + ttl, now)
+            )
+            self._evict(conn, len(blob))
+
+    def values(self, endpoint):
+        # Keys are "<endpoint>:<digest>" and ";" sorts right after ":", so this is a range scan of the primary key
+        rows = self._connect().execute(
+            "SELECT value FROM entries WHERE key >= ? AND key < ?", (endpoint + ":", endpoint + ";")
+        ).fetchall()
+        values = []
+        for (blob,) in rows:
+            try:
+                values.append(self._loads(blob))
+            except Exception:
+                # Written by another version of the app, its classes may no longer match
+                continue
+        return values
+
+    def get_entries(self, keys):
+        # One query per QUERY_BATCH_SIZE keys and at most one transaction for the access times
+        keys = list(keys)
+        conn = self._connect()
+        rows = []
+        for i in range(0, len(keys), self.QUERY_BATCH_SIZE):
+            batch = keys[i:i + self.QUERY_BATCH_SIZE]
+            rows += conn.execute(
+                f"SELECT key, value, expires_at, accessed_at FROM entries WHERE key IN ({', '.join('?' * len(batch))})", batch
+            ).fetchall()
+        self._touch(conn, [(row[0], row[3]) for row in rows])
+        return {key: (self._loads(blob), expires_at) for key, blob, expires_at, _ in rows}
+
+    def set_many(self, items, ttl):
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            blob = self._dumps(value)
+            rows.append((key, blob, len(blob), now + ttl, now))
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._evict(conn, sum(row[2] for row in rows))
+
+    def _evict(self, conn, written):
+        # Drop least recently used entries once the store goes over max_bytes. Replaced entries are
+        # counted twice in the running size, so it can only overestimate and trigger an exact sum
+        with self._size_lock:
+            if self._size is not None and self._writes < self.SIZE_CHECK_WRITES:
+                self._size += written
+                self._writes += 1
+                if self._size <= self.max_bytes:
+                    return
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total > self.max_bytes:
+            # Down to the low-water mark, so the writes that follow have room before the next eviction.
+            # Rows are read lazily in access order and only as far as needed
+            excess = total - int(self.max_bytes * self.EVICT_LOW_WATER)
+            evicted = []
+            cursor = conn.execute("SELECT key, size FROM entries ORDER BY accessed_at")
+            for key, size in cursor:
+                if excess <= 0:
+                    break
+                evicted.append((key,))
+                excess -= size
+                total -= size
+            cursor.close()
+            conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+
+        with self._size_lock:
+            self._size = total
+            self._writes = 0
+
+    def delete(self, key):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM entries")
+        with self._size_lock:
+            self._size = None
+
+class LRUCache:
+    # Bounded in-process cache for objects that must not be copied on every hit
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_create(self, key, factory):
+        value = self.get(key)
+        if value is MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def create_backend_from_env():
+    kind = os.getenv("SPOTILYTICS_CACHE_BACKEND", "sqlite").lower()
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        max_mb = os.getenv("SPOTILYTICS_CACHE_MAX_MB")
+        return SQLiteBackend(
+            path=os.getenv("SPOTILYTICS_CACHE_PATH", DEFAULT_CACHE_PATH),
+            max_bytes=int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_MAX_BYTES
+        )
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend_from_env()
+    return _backend
+
+def set_backend(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+# Background refreshes for stale-while-revalidate entries
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+def _refresh(backend, key, ttl, func, args, kwargs):
+    try:
+        backend.set(key, func(*args, **kwargs), ttl)
+    except Exception:
+        # Keep serving the stale value, the next read will try again
+        pass
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+def schedule_refresh(backend, key, ttl, func, args, kwargs):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    _refresh_executor.submit(_refresh, backend, key, ttl, func, args, kwargs)
+
+def persistent_cache(endpoint, ttl, stale_ttl=0, update=None):
+    # With stale_ttl, expired entries younger than ttl + stale_ttl are returned right away
+    # while a background refresh runs, and also when the API call itself fails.
+    # update(previous, *args, **kwargs), when given, computes the new value from an expired one
+    def decorator(func):
+        def recompute(entry):
+            if entry is not None and update is not None:
+                return functools.partial(update, entry[0])
+            return func
+
+        def lookup(backend, key, args, kwargs):
+            # Fresh value, or a stale one while a refresh is scheduled, or MISSING
+            entry = backend.get_entry(key)
+            if entry is None:
+                return MISSING, None
+
+            now = time.time()
+            if entry[1] >= now:
+                return entry[0], entry
+            if now - entry[1] < stale_ttl:
+                schedule_refresh(backend, key, ttl, recompute(entry), args, kwargs)
+                return entry[0], entry
+            return MISSING, entry
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            backend = get_backend()
+            key = make_key(endpoint, cache_arguments(func, args, kwargs))
+
+            value, entry = lookup(backend, key, args, kwargs)
+            registry.inc("spotilytics_cache_lookups_total", layer="persistent", endpoint=endpoint)
+            if value is not MISSING:
+                if entry[1] < time.time():
+                    registry.inc("spotilytics_cache_stale_total", layer="persistent", endpoint=endpoint)
+                return value
+            registry.inc("spotilytics_cache_misses_total", layer="persistent", endpoint=endpoint)
+
+            try:
+                value = recompute(entry)(*args, **kwargs)
+            except Exception:
+                if entry is not None and stale_ttl:
+                    return entry[0]
+                raise
+            backend.set(key, value, ttl)
+            return value
+
+        def peek(*args, **kwargs):
+            # Same lookup as a call, without ever calling func on a miss
+            key = make_key(endpoint, cache_arguments(func, args, kwargs))
+            return lookup(get_backend(), key, args, kwargs)[0]
+
+        def store(value, *args, **kwargs):
+            # For callers that computed the value themselves, e.g. incrementally
+            key = make_key(endpoint, cache_arguments(func, args, kwargs))
+            get_backend().set(key, value, ttl)
+
+        def version(*args, **kwargs):
+            # Changes every time the entry is stored, None when there is none; cheaper than peek
+            return get_backend().get_expiry(make_key(endpoint, cache_arguments(func, args, kwargs)))
+
+        def refresh(*args, **kwargs):
+            # Always calls func, synchronously, and stores what it returns
+            value = func(*args, **kwargs)
+            store(value, *args, **kwargs)
+            return value
+
+        def warm(*args, **kwargs):
+            # Makes sure a fresh entry exists; returns (value, whether func was called)
+            entry = get_backend().get_entry(make_key(endpoint, cache_arguments(func, args, kwargs)))
+            if entry is not None and entry[1] >= time.time():
+                return entry[0], False
+            value = recompute(entry)(*args, **kwargs)
+            store(value, *args, **kwargs)
+            return value, True
+
+        wrapper.peek = peek
+        wrapper.store = store
+        wrapper.version = version
+        wrapper.refresh = refresh
+        wrapper.warm = warm
+        return wrapper
+    return decorator
+
+def persistent_batch_cache(endpoint, ttl):
+    # For func(_sp_client, ids, ...) returning one value per id. Every id has its own entry,
+    # shared by all callers whatever list it came in, and func only gets the ids missing from the cache
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(_sp_client, ids, **kwargs):
+            backend = get_backend()
+            keys = {item_id: make_key(endpoint, item_id) for item_id in ids}
+            entries = backend.get_entries(keys.values())
+            now = time.time()
+            values = {item_id: entries[key][0] for item_id, key in keys.items() if key in entries and entries[key][1] >= now}
+            missing = [item_id for item_id in keys if item_id not in values]
+
+            registry.inc("spotilytics_cache_lookups_total", len(keys), layer="persistent", endpoint=endpoint)
+            if missing:
+                registry.inc("spotilytics_cache_misses_total", len(missing), layer="persistent", endpoint=endpoint)
+                fetched = dict(zip(missing, func(_sp_client, missing, **kwargs)))
+                backend.set_many({keys[item_id]: value for item_id, value in fetched.items()}, ttl)
+                values.update(fetched)
+            return [values[item_id] for item_id in ids]
+
+        return wrapper
+    return decorator
@@ -2,12 +2,34 @@ import plotly.express as px
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+from .cache import LRUCache
+from .metrics import registry, lru_collector, timed, timer
 
-def plot_top_tracks(df: pd.DataFrame):
+# Built figures shared by every session, keyed by chart type, artist ids and data version
+figure_cache = LRUCache(maxsize=256)
+registry.add_collector(lru_collector("figures", figure_cache))
+
+def get_figure(chart, cache_key, build):
+    # Without a cache_key the figure is always rebuilt
+    if cache_key is None:
+        return build()
+    return figure_cache.get_or_create((chart, cache_key), build)
+
+def show_figure(chart, fig, container=st, key=None):
+    # Serialization and delivery of the figure, timed apart from building it
+    with timer("render", chart):
+        container.plotly_chart(fig, use_container_width=True, key=key)
+
+def plot_top_tracks(df: pd.DataFrame, cache_key=None):
     if df.empty:
         st.warning("No track data available to display.")
         return
     
+    fig = get_figure("top_tracks", cache_key, lambda: build_top_tracks_figure(df))
+    show_figure("top_tracks", fig)
+
+@timed("figure")
+def build_top_tracks_figure(df):
     df_sorted = df.sort_values("Popularity", ascending=True)
     
     fig = px.bar(
@@ -35,69 +57,54 @@ def plot_top_tracks(df: pd.DataFrame):
         showlegend=False
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
 
-def plot_release_timeline(df: pd.DataFrame):
-    if df.empty or "Released Date" not in df.columns:
-        st.warning("No release date data available to display.")
+def plot_release_timeline(yearly_data: pd.DataFrame, container=st, key=None, cache_key=None):
+    # yearly_data has one row per release year with its number of tracks
+    # container can be an st.empty() placeholder that is redrawn as more data arrives
+    if yearly_data.empty:
+        container.warning("No release date data available to display.")
         return
     
-    # Create a copy for plotting
-    plot_df = df.copy()
-    
-    # Data conversion and cleaning
     try:
-        plot_df["Released Date"] = pd.to_datetime(plot_df["Released Date"], errors="coerce")
-        plot_df = plot_df.dropna(subset=["Released Date"])
-        
-        if plot_df.empty:
-            st.warning("No valid release dates found.")
-            return
-            
-        # Yearly aggregation
-        plot_df["Year"] = plot_df["Released Date"].dt.year
-        yearly_data = plot_df.groupby("Year").agg({
-            "Track": "count"
-        }).reset_index()
-        
-
-        fig = px.bar(
-            yearly_data,
-            x="Year",
-            y="Track",
-            title="Career Timeline",
-            labels={"Track": "Number of Tracks", "Year": "Year"},
-            color="Track",
-            color_continuous_scale=px.colors.sequential.Viridis
-        )
-        
-        fig.update_layout(
-            xaxis_title="Year",
-            yaxis_title="Number of Tracks",
-            height=400
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        fig = get_figure("release_timeline", cache_key, lambda: build_release_timeline_figure(yearly_data))
+        show_figure("release_timeline", fig, container, key)
         
     except Exception as e:
-        st.error(f"Error creating timeline chart: {str(e)}")
+        container.error(f"Error creating timeline chart: {str(e)}")
 
-def plot_album_track_stats(df: pd.DataFrame):
-    if df.empty:
+@timed("figure")
+def build_release_timeline_figure(yearly_data):
+    fig = px.bar(
+        yearly_data,
+        x="Year",
+        y="Track",
+        title="Career Timeline",
+        labels={"Track": "Number of Tracks", "Year": "Year"},
+        color="Track",
+        color_continuous_scale=px.colors.sequential.Viridis
+    )
+    
+    fig.update_layout(
+        xaxis_title="Year",
+        yaxis_title="Number of Tracks",
+        height=400
+    )
+    
+    return fig
+
+def plot_album_track_stats(album_stats: pd.DataFrame, cache_key=None):
+    # album_stats has one row per album with its track count and average popularity
+    if album_stats.empty:
         st.warning("No track data available to display.")
         return
-        
-    if "Album" not in df.columns:
-        st.warning("Album data not available.")
-        return
-        
-    # Album aggregation
-    album_stats = df.groupby("Album").agg({
-        "Track": "count",
-        "Popularity": "mean"
-    }).reset_index()
     
+    fig = get_figure("album_track_stats", cache_key, lambda: build_album_track_stats_figure(album_stats))
+    show_figure("album_track_stats", fig)
+
+@timed("figure")
+def build_album_track_stats_figure(album_stats):
     # Bubble chart
     fig = px.scatter(
         album_stats,
@@ -119,7 +126,7 @@ def plot_album_track_stats(df: pd.DataFrame):
         hovertemplate='<b>%{hovertext}</b><br>Tracks: %{y}<br>Avg Popularity: %{x}<extra></extra>'
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
 # =============================================================================
 # COMPARISON FUNCTIONS
@@ -129,78 +136,87 @@ COMPARISON_COLORS = {
     'artist1': "#b41f1f",  
     'artist2': "#0e9fff",  
     'artist3': '#2ca02c',
-    'artist4': "#fbff00"
+    'artist4': "#fbff00",
+    'artist5': "#9467bd",
+    'artist6': "#ff7f0e",
+    'artist7': "#e377c2",
+    'artist8': "#17becf"
 }
 
-def plot_top_tracks_comparison(artist1_tracks, artist2_tracks, artist1_name, artist2_name):
-    top_artist1 = artist1_tracks.nlargest(5, 'Popularity')
-    top_artist2 = artist2_tracks.nlargest(5, 'Popularity')
-    
-    top_artist1['Artist'] = artist1_name
-    top_artist2['Artist'] = artist2_name
-    
-    combined = pd.concat([top_artist1, top_artist2])
+def comparison_color_map(artist_names):
+    return {name: COMPARISON_COLORS[f'artist{i + 1}'] for i, name in enumerate(artist_names)}
+
+def hex_to_rgba(color, alpha):
+    color = color.lstrip('#')
+    red, green, blue = (int(color[i:i + 2], 16) for i in (0, 2, 4))
+    return f'rgba({red}, {green}, {blue}, {alpha})'
+
+def comparison_title(prefix, artist_names):
+    return f"{prefix}: {' vs '.join(artist_names)}"
+
+def plot_top_tracks_comparison(tracks_df, artist_names, cache_key=None):
+    fig = get_figure("top_tracks_comparison", cache_key, lambda: build_top_tracks_comparison_figure(tracks_df, artist_names))
+    show_figure("top_tracks_comparison", fig)
+
+@timed("figure")
+def build_top_tracks_comparison_figure(tracks_df, artist_names):
+    # tracks_df holds the top tracks of every artist, with an 'Artist' column
+    top_tracks = tracks_df.sort_values('Popularity', ascending=False).groupby('Artist', sort=False).head(5)
     
-    fig = px.bar(combined, 
+    fig = px.bar(top_tracks, 
                  x='Popularity', 
                  y='Track', 
                  color='Artist',
-                 color_discrete_map={
-                     artist1_name: COMPARISON_COLORS['artist1'],
-                     artist2_name: COMPARISON_COLORS['artist2']
-                 },
+                 color_discrete_map=comparison_color_map(artist_names),
+                 category_orders={'Artist': artist_names},
                  barmode='group',
-                 title=f"Top Tracks Comparison: {artist1_name} vs {artist2_name}",
+                 title=comparison_title("Top Tracks Comparison", artist_names),
                  labels={'Popularity': 'Popularity Score', 'Track': ''})
     
-    fig.update_layout(height=400)
-    st.plotly_chart(fig, use_container_width=True)
+    fig.update_layout(height=max(400, 120 * len(artist_names)))
+    return fig
 
-def plot_album_stats_comparison(artist1_albums, artist2_albums, artist1_name, artist2_name):
-    artist1_albums['Artist'] = artist1_name
-    artist2_albums['Artist'] = artist2_name
-    
-    combined = pd.concat([artist1_albums, artist2_albums])
+def plot_album_stats_comparison(album_stats, artist_names, cache_key=None):
+    fig = get_figure("album_stats_comparison", cache_key, lambda: build_album_stats_comparison_figure(album_stats, artist_names))
+    show_figure("album_stats_comparison", fig)
 
-    fig = px.scatter(combined,
+@timed("figure")
+def build_album_stats_comparison_figure(album_stats, artist_names):
+    fig = px.scatter(album_stats,
                      x='Popularity',
                      y='Track',
                      size='Track',
                      color='Artist',
-                     color_discrete_map={
-                         artist1_name: COMPARISON_COLORS['artist1'],
-                         artist2_name: COMPARISON_COLORS['artist2']
-                     },
+                     color_discrete_map=comparison_color_map(artist_names),
+                     category_orders={'Artist': artist_names},
                      hover_name='Album',
-                     title=f"Album Comparison: {artist1_name} vs {artist2_name}",
+                     title=comparison_title("Album Comparison", artist_names),
                      labels={'Track': 'Number of Tracks', 'Popularity': 'Average Popularity'})
     
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+def plot_radar_chart(metrics, artist_names, cache_key=None):
+    fig = get_figure("radar_chart", cache_key, lambda: build_radar_chart_figure(metrics, artist_names))
+    show_figure("radar_chart", fig)
 
-def plot_radar_chart(artist1_metrics, artist2_metrics, artist1_name, artist2_name):
-    categories = list(artist1_metrics.keys())
+@timed("figure")
+def build_radar_chart_figure(metrics, artist_names):
+    # metrics is indexed by artist name, one column per radar axis on a 0-100 scale
+    categories = list(metrics.columns)
+    colors = comparison_color_map(artist_names)
     
     fig = go.Figure()
     
-    fig.add_trace(go.Scatterpolar(
-        r=[artist1_metrics[cat] for cat in categories],
-        theta=categories,
-        fill='toself',
-        name=artist1_name,
-        line_color=COMPARISON_COLORS['artist1'],
-        fillcolor='rgba(31, 119, 180, 0.5)', # Blue with 50% transparency
-        opacity=0.7
-    ))
-    
-    fig.add_trace(go.Scatterpolar(
-        r=[artist2_metrics[cat] for cat in categories],
-        theta=categories,
-        fill='toself',
-        name=artist2_name,
-        line_color=COMPARISON_COLORS['artist2'],
-        fillcolor='rgba(255, 127, 14, 0.5)',  # Orange with 50% transparency
-        opacity=0.7
-    ))
+    for name in artist_names:
+        fig.add_trace(go.Scatterpolar(
+            r=metrics.loc[name, categories].tolist(),
+            theta=categories,
+            fill='toself',
+            name=name,
+            line_color=colors[name],
+            fillcolor=hex_to_rgba(colors[name], 0.5),
+            opacity=0.7
+        ))
     
     fig.update_layout(
         polar=dict(
@@ -209,7 +225,140 @@ def plot_radar_chart(artist1_metrics, artist2_metrics, artist1_name, artist2_nam
                 range=[0, 100]
             )),
         showlegend=True,
-        title=f"Metrics Comparison: {artist1_name} vs {artist2_name}"
+        title=comparison_title("Metrics Comparison", artist_names)
     )
     
-    st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+    return fig
+
+def plot_history(load_series, labels, value_label, label="Artist", colors=None, container=st, key=None, cache_key=None):
+    # load_series() -> entity -> downsampled (timestamp, value) pairs from utils.history, only called
+    # when the figure is not cached; labels: entity -> legend name, colors: legend name -> color
+    fig = get_figure(("history", value_label, label), cache_key,
+                     lambda: build_history_figure(load_series(), labels, value_label, label, colors))
+    show_figure("history", fig, container=container, key=key)
+
+@timed("figure")
+def build_history_figure(series, labels, value_label, label, colors=None):
+    # One trace per series straight from the points; plotly express would build a DataFrame first
+    fig = go.Figure()
+    for entity, points in series.items():
+        if not points:
+            continue
+        times, values = zip(*points)
+        fig.add_trace(go.Scatter(
+            x=pd.to_datetime(times, unit="s"),
+            y=values,
+            name=labels[entity],
+            # Values hold until the next sample, hence the step lines
+            mode="lines+markers" if len(points) <= 30 else "lines",
+            line=dict(shape="hv", color=(colors or {}).get(labels[entity]))
+        ))
+
+    fig.update_layout(
+        title=f"{value_label} History",
+        yaxis_title=value_label,
+        legend_title_text=label,
+        hovermode="x unified"
+    )
+    return fig
+
+HOP_COLORS = ['#1DB954', '#3498DB', '#9B59B6', '#E67E22']
+
+def plot_artist_graph(graph, cache_key=None):
+    fig = get_figure("artist_graph", cache_key, lambda: build_artist_graph_figure(graph))
+    show_figure("artist_graph", fig)
+
+@timed("figure")
+def build_artist_graph_figure(graph):
+    # Seed in the middle, one ring per hop; marker size follows popularity
+    positions, distances = graph.radial_layout()
+
+    edge_x, edge_y = [], []
+    for position, (x, y) in positions.items():
+        for neighbor in graph.links(position).tolist():
+            if neighbor in positions:
+                edge_x += [x, positions[neighbor][0], None]
+                edge_y += [y, positions[neighbor][1], None]
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=edge_x, y=edge_y, mode="lines", line=dict(width=0.5, color="rgba(150, 150, 150, 0.3)"),
+                             hoverinfo="skip", showlegend=False))
+
+    for hops in sorted(set(distances[position] for position in positions)):
+        ring = [position for position in positions if distances[position] == hops]
+        artists = [graph.artists[position] for position in ring]
+        fig.add_trace(go.Scatter(
+            x=[positions[position][0] for position in ring],
+            y=[positions[position][1] for position in ring],
+            mode="markers+text" if hops <= 1 else "markers",
+            text=[artist.name for artist in artists],
+            textposition="top center",
+            customdata=[[artist.popularity, artist.followers, ", ".join(artist.genres[:3]) or "-"] for artist in artists],
+            hovertemplate="<b>%{text}</b><br>Popularity: %{customdata[0]}<br>Followers: %{customdata[1]:,}<br>%{customdata[2]}<extra></extra>",
+            marker=dict(size=[8 + artist.popularity / 4 for artist in artists], color=HOP_COLORS[min(hops, len(HOP_COLORS) - 1)],
+                        line=dict(width=1, color="white")),
+            name="Artist" if hops == 0 else f"{hops} hop{'s' if hops > 1 else ''}"
+        ))
+
+    fig.update_layout(
+        title="Related Artists",
+        height=650,
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False, scaleanchor="x"),
+        hovermode="closest"
+    )
+    return fig
+
+def plot_audio_feature_distributions(distributions, container=st, cache_key=None):
+    # distributions: one row per feature and bin, as computed by utils.aggregates
+    fig = get_figure("audio_feature_distributions", cache_key, lambda: build_audio_feature_distributions_figure(distributions))
+    show_figure("audio_feature_distributions", fig, container=container)
+
+@timed("figure")
+def build_audio_feature_distributions_figure(distributions, columns=3):
+    from plotly.subplots import make_subplots
+    features = list(distributions["Feature"].cat.categories)
+    rows = -(-len(features) // columns)
+    fig = make_subplots(rows=rows, cols=columns, subplot_titles=features, vertical_spacing=0.12)
+    for i, (feature, bins) in enumerate(distributions.groupby("Feature", observed=True, sort=False)):
+        fig.add_trace(go.Bar(
+            x=(bins["Start"] + bins["End"]) / 2,
+            y=bins["Tracks"],
+            width=bins["End"] - bins["Start"],
+            customdata=bins[["Start", "End"]],
+            hovertemplate=f"{feature} %{{customdata[0]:.3g}} to %{{customdata[1]:.3g}}<br>Tracks: %{{y}}<extra></extra>",
+            marker_color=COMPARISON_COLORS[f'artist{i % len(COMPARISON_COLORS) + 1}'],
+            showlegend=False
+        ), row=i // columns + 1, col=i % columns + 1)
+
+    fig.update_layout(title="Audio Feature Distributions", height=260 * rows, bargap=0.05)
+    return fig
+
+def plot_audio_features_per_year(features_per_year, container=st, cache_key=None):
+    if features_per_year.empty:
+        container.warning("No release date data available to display.")
+        return
+
+    fig = get_figure("audio_features_per_year", cache_key, lambda: build_audio_features_per_year_figure(features_per_year))
+    show_figure("audio_features_per_year", fig, container=container)
+
+@timed("figure")
+def build_audio_features_per_year_figure(features_per_year):
+    # One line per 0-1 feature, the average of the tracks released that year
+    fig = go.Figure()
+    for feature in features_per_year.columns.drop("Year"):
+        fig.add_trace(go.Scatter(
+            x=features_per_year["Year"],
+            y=features_per_year[feature],
+            name=feature,
+            mode="lines+markers" if len(features_per_year) <= 30 else "lines"
+        ))
+
+    fig.update_layout(
+        title="Audio Features per Release Year",
+        xaxis_title="Year",
+        yaxis=dict(title="Average", range=[0, 1]),
+        legend_title_text="Feature",
+        hovermode="x unified"
+    )
+    return fig
@@ -1,69 +1,132 @@
 import streamlit as st
 import pandas as pd
 from .helpers import format_number
-from .charts import plot_top_tracks_comparison, plot_album_stats_comparison, plot_radar_chart
+from .aggregates import tables_cache
+from .charts import COMPARISON_COLORS, plot_top_tracks_comparison, plot_album_stats_comparison, plot_radar_chart
 
-def render_artist_comparison(artist1, artist2, artist1_tracks, artist2_tracks, artist1_albums_stats, artist2_albums_stats, artist1_metrics, artist2_metrics):
+# One color slot per artist
+MAX_COMPARE_ARTISTS = len(COMPARISON_COLORS)
+CARDS_PER_ROW = 4
+
+def unique_names(names):
+    # Charts key everything by name, so repeated names get a suffix
+    unique = []
+    for name in names:
+        label = name
+        suffix = 2
+        while label in unique:
+            label = f"{name} ({suffix})"
+            suffix += 1
+        unique.append(label)
+    return unique
+
+def unique_artist_names(artists):
+    # Homonymous artists are told apart by their suffix
+    return unique_names([artist.name for artist in artists])
+
+def build_comparison_data(artists, top_track_tables, discography_tables):
+    names = unique_artist_names(artists)
+
+    # Combined frames stacked from the per-artist tables, no regrouping needed
+    tracks_df = pd.concat(
+        [tables.tracks.assign(Artist=name) for name, tables in zip(names, top_track_tables)],
+        ignore_index=True
+    ).reindex(columns=['Artist', 'Track', 'Album', 'Released Date', 'Popularity'])
+    album_stats = pd.concat(
+        [tables.album_stats.assign(Artist=name) for name, tables in zip(names, top_track_tables)],
+        ignore_index=True
+    ).reindex(columns=['Artist', 'Album', 'Track', 'Popularity'])
+
+    summary = pd.DataFrame({
+        'Popularity': [artist.popularity for artist in artists],
+        'Followers': [artist.followers for artist in artists],
+        'Genres': [len(artist.genres) for artist in artists],
+        'Releases': [tables.release_count for tables in discography_tables],
+        'Tracks': [tables.track_count for tables in discography_tables]
+    }, index=pd.Index(names, name='Artist'))
+
+    # Radar axes, all on a 0-100 scale
+    metrics = pd.DataFrame({
+        'Popularity': summary['Popularity'],
+        'Followers': summary['Followers'] / summary['Followers'].max() * 100,
+        'Genres': summary['Genres'] * 10,
+        'Releases': summary['Releases'] / summary['Releases'].max() * 100
+    }).fillna(0)
+
+    return names, tracks_df, album_stats, summary, metrics
+
+def comparison_version(artists, top_track_tables, discography_tables):
+    # Identifies one comparison, also used as the cache key of its figures
+    return (
+        tuple((artist.id, artist.name, artist.popularity, artist.followers, len(artist.genres)) for artist in artists),
+        tuple(tables.version for tables in top_track_tables),
+        tuple(tables.version for tables in discography_tables)
+    )
+
+def get_comparison_data(artists, top_track_tables, discography_tables):
+    key = ("comparison", comparison_version(artists, top_track_tables, discography_tables))
+    return tables_cache.get_or_create(key, lambda: build_comparison_data(artists, top_track_tables, discography_tables))
+
+def render_artist_comparison(artists, names, tracks_df, album_stats, summary, metrics, cache_key=None):
     st.write("## Artist Comparison")
-    
-    # Create two columns for the artists
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        render_artist_card(artist1, "Artist 1")
-    
-    with col2:
-        render_artist_card(artist2, "Artist 2")
-    
-    # Add some metrics comparison
+
+    # One card per artist, CARDS_PER_ROW per row
+    for start in range(0, len(artists), CARDS_PER_ROW):
+        columns = st.columns(CARDS_PER_ROW)
+        for offset, artist in enumerate(artists[start:start + CARDS_PER_ROW]):
+            with columns[offset]:
+                render_artist_card(artist, f"Artist {start + offset + 1}")
+
+    # Add some metrics comparison, deltas are relative to the first artist
     st.divider()
     st.subheader("Metrics Comparison")
-    
-    comp_col1, comp_col2, comp_col3 = st.columns(3)
-    
-    with comp_col1:
-        st.metric("Followers", 
-                 f"{format_number(artist1['followers']['total'])}", 
-                 f"{format_number(artist2['followers']['total'] - artist1['followers']['total'])}",
-                 delta_color="inverse")
-    
-    with comp_col2:
-        st.metric("Popularity", 
-                 f"{artist1['popularity']}/100", 
-                 f"{artist2['popularity'] - artist1['popularity']}")
-    
-    with comp_col3:
-        genres1 = len(artist1['genres']) if artist1['genres'] else 0
-        genres2 = len(artist2['genres']) if artist2['genres'] else 0
-        st.metric("Genres Count", 
-                 genres1, 
-                 genres2 - genres1,
-                 delta_color="inverse")
-    
+
+    reference = summary.iloc[0]
+    for start in range(0, len(names), CARDS_PER_ROW):
+        columns = st.columns(CARDS_PER_ROW)
+        for offset, name in enumerate(names[start:start + CARDS_PER_ROW]):
+            row = summary.loc[name]
+            is_reference = start + offset == 0
+            with columns[offset]:
+                st.write(f"**{name}**")
+                st.metric("Followers",
+                         format_number(int(row['Followers'])),
+                         None if is_reference else format_number(int(row['Followers'] - reference['Followers'])))
+                st.metric("Popularity",
+                         f"{int(row['Popularity'])}/100",
+                         None if is_reference else int(row['Popularity'] - reference['Popularity']))
+                st.metric("Genres Count",
+                         int(row['Genres']),
+                         None if is_reference else int(row['Genres'] - reference['Genres']))
+                st.metric("Releases",
+                         int(row['Releases']),
+                         None if is_reference else int(row['Releases'] - reference['Releases']))
+
     # Add comparative charts
     st.divider()
     st.subheader("Comparative Analysis")
-    
+
     # Top Tracks Comparison
-    plot_top_tracks_comparison(artist1_tracks, artist2_tracks, artist1['name'], artist2['name'])
-    
+    plot_top_tracks_comparison(tracks_df, names, cache_key)
+
     # Album Comparison
-    plot_album_stats_comparison(artist1_albums_stats, artist2_albums_stats, artist1['name'], artist2['name'])
-    
+    plot_album_stats_comparison(album_stats, names, cache_key)
+
     # Radar Chart for general metrics
-    plot_radar_chart(artist1_metrics, artist2_metrics, artist1['name'], artist2['name'])
+    plot_radar_chart(metrics, names, cache_key)
 
 def render_artist_card(artist, title):
     st.subheader(title)
-    
+
     from .helpers import render_square_image
-    render_square_image(artist['images'][0]['url'] if artist['images'] else None, size=200)
-    
-    st.write(f"**Name:** {artist['name']}")
-    st.write(f"**Followers:** {format_number(artist['followers']['total'])}")
-    st.write(f"**Popularity:** {artist['popularity']}/100")
-    
-    if artist['genres']:
-        st.write(f"**Genres:** {', '.join(artist['genres'])}")
+    from .images import image_source
+    render_square_image(image_source(artist.images, 200), size=200)
+
+    st.write(f"**Name:** {artist.name}")
+    st.write(f"**Followers:** {format_number(artist.followers)}")
+    st.write(f"**Popularity:** {artist.popularity}/100")
+
+    if artist.genres:
+        st.write(f"**Genres:** {', '.join(artist.genres)}")
     else:
-        st.write("**Genres:** No genres available")
\ No newline at end of file
+        st.write("**Genres:** No genres available")
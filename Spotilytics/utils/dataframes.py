@@ -0,0 +1,77 @@
+from itertools import chain
+import numpy as np
+import pandas as pd
+from .metrics import timed
+
+# Spotify only knows the year or the month of some releases
+DATE_SUFFIXES = {"year": "-01-01", "month": "-01", "day": ""}
+DATE_LENGTH_PRECISIONS = {4: "year", 7: "month", 10: "day"}
+
+def parse_release_dates(dates, precisions):
+    # Completes year- and month-only dates to their first day, then parses everything at once
+    dates = pd.Series(dates, dtype="string")
+    precisions = pd.Series(precisions, dtype="string")
+    precisions = precisions.fillna(dates.str.len().map(DATE_LENGTH_PRECISIONS)).fillna("day")
+    completed = dates.str.slice(0, 10) + precisions.map(DATE_SUFFIXES).fillna("")
+    return pd.to_datetime(completed, format="%Y-%m-%d", errors="coerce"), precisions
+
+def release_date_columns(dates, precisions):
+    parsed, precisions = parse_release_dates(dates, precisions)
+    return {
+        "Released Date": np.asarray(dates, dtype=object),
+        "Release Timestamp": parsed.to_numpy(),
+        "Release Year": parsed.dt.year.astype("Int16").array,
+        "Release Precision": pd.Categorical(precisions, categories=list(DATE_SUFFIXES))
+    }
+
+@timed("dataframe")
+def create_tracks_dataframe(tracks):
+    # Built column by column; only ten rows, but shaped like the discography frame
+    columns = {
+        "Track": [track.name for track in tracks],
+        "Album": pd.Categorical([track.album_name for track in tracks]),
+        **release_date_columns(
+            [track.release_date for track in tracks],
+            [track.release_date_precision for track in tracks]
+        ),
+        "Popularity": np.fromiter((track.popularity for track in tracks), dtype=np.int16, count=len(tracks))
+    }
+    return pd.DataFrame(columns, index=pd.RangeIndex(1, len(tracks) + 1))
+
+@timed("dataframe")
+def create_discography_dataframe(discography):
+    # Album columns are computed once per album and spread over the tracks by position
+    albums = list(discography.albums.values())
+    tracks = discography.tracks
+    album_positions = {album.id: position for position, album in enumerate(albums)}
+    positions = np.fromiter((album_positions[track.album_id] for track in tracks), dtype=np.intp, count=len(tracks))
+
+    name_codes, names = pd.factorize(pd.Index([album.name for album in albums], dtype="object"))
+    album_columns = release_date_columns(
+        [album.release_date for album in albums],
+        [album.release_date_precision for album in albums]
+    )
+
+    columns = {
+        "Track": [track.name for track in tracks],
+        "Album": pd.Categorical.from_codes(name_codes[positions], categories=names),
+        **{name: column[positions] for name, column in album_columns.items()}
+    }
+    return pd.DataFrame(columns, index=pd.RangeIndex(1, len(tracks) + 1))
+
+@timed("dataframe")
+def create_audio_features_dataframe(discography_df, track_ids, features, columns):
+    # discography_df has one row per id of track_ids and features one AudioFeatures or None per id,
+    # whose values() fill `columns`. A track listed twice (an album track on a compilation) counts once
+    listed_once = ~pd.Index(track_ids).duplicated()
+    analyzed = listed_once & np.fromiter((item is not None for item in features), dtype=bool, count=len(features))
+    kept = [item for item, keep in zip(features, analyzed) if keep]
+    values = np.fromiter(
+        chain.from_iterable(item.values() for item in kept), dtype=np.float32, count=len(kept) * len(columns)
+    ).reshape(len(kept), len(columns))
+
+    positions = np.flatnonzero(analyzed)
+    return pd.DataFrame({
+        **{name: discography_df[name].array.take(positions) for name in ("Track", "Album", "Release Year")},
+        **{column: values[:, i] for i, column in enumerate(columns)}
+    }, index=pd.RangeIndex(1, len(positions) + 1))
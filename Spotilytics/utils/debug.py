@@ -0,0 +1,80 @@
+import os
+import streamlit as st
+from .metrics import registry, cache_hit_ratios
+from .store import artist_store
+from .autocomplete import artist_index
+
+def debug_enabled():
+    # SPOTILYTICS_DEBUG=1 in the environment, or ?debug=1 in the page URL
+    return os.environ.get("SPOTILYTICS_DEBUG", "") not in ("", "0") or st.query_params.get("debug") == "1"
+
+def render_cache_stats(label, cache):
+    stats = cache.stats()
+    lookups = stats['hits'] + stats['misses']
+    hit_rate = stats['hits'] / lookups * 100 if lookups else 0
+    st.write(f"**{label}:** {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.0f}%), {stats['size']}/{stats['maxsize']} entries")
+
+def cache_layers_dataframe():
+    import pandas as pd
+    rows = []
+    for layer in ("memory", "persistent"):
+        for endpoint, (lookups, misses) in sorted(cache_hit_ratios(layer).items()):
+            rows.append({
+                "Layer": layer,
+                "Function": endpoint,
+                "Lookups": lookups,
+                "Hit rate": f"{(lookups - misses) / lookups * 100:.0f}%" if lookups else "-"
+            })
+    return pd.DataFrame(rows)
+
+def api_calls_dataframe():
+    import pandas as pd
+    calls = {}
+    for labels, value in registry.series("spotilytics_api_calls_total"):
+        calls.setdefault(labels["endpoint"], {"Endpoint": labels["endpoint"], "Calls": 0, "Errors": 0})
+        calls[labels["endpoint"]]["Calls"] += value
+        if labels["status"] != "ok":
+            calls[labels["endpoint"]]["Errors"] += value
+    return pd.DataFrame(sorted(calls.values(), key=lambda row: -row["Calls"]))
+
+def timings_dataframe():
+    import pandas as pd
+    rows = [
+        {
+            "Stage": labels["stage"],
+            "Name": labels["name"],
+            "Count": histogram.count,
+            "Mean (ms)": round(histogram.sum / histogram.count * 1000, 1),
+            "p95 (ms) ≤": histogram.quantile(0.95) * 1000
+        }
+        for labels, histogram in registry.histogram_series("spotilytics_duration_seconds")
+        if histogram.count
+    ]
+    return pd.DataFrame(sorted(rows, key=lambda row: (row["Stage"], row["Name"])))
+
+def render_debug_panel():
+    # pandas and plotly are only loaded here, the panel is off for regular visitors
+    from .aggregates import tables_cache
+    from .charts import figure_cache
+
+    with st.expander("Debug"):
+        last_rerun = st.session_state.get("last_rerun")
+        if last_rerun:
+            st.write(f"**Previous rerun:** {last_rerun['seconds'] * 1000:.0f} ms, {last_rerun['api_calls']} API calls")
+        st.write(f"**Spotify API calls:** {registry.total('spotilytics_api_calls_total')}")
+
+        render_cache_stats("Figures", figure_cache)
+        render_cache_stats("Tables", tables_cache)
+        render_cache_stats("Artists", artist_store)
+        stats = artist_index.stats
+        st.write(
+            f"**Search index:** {stats['local_hits']} local hits, {stats['remote_searches']} remote searches "
+            f"({artist_index.hit_rate() * 100:.0f}%), {len(artist_index)} artists"
+        )
+
+        for title, df in (("Caches", cache_layers_dataframe()), ("API", api_calls_dataframe()), ("Timings", timings_dataframe())):
+            if not df.empty:
+                st.caption(title)
+                st.dataframe(df, hide_index=True, use_container_width=True)
+
+        st.download_button("Export metrics", registry.export(), file_name="spotilytics_metrics.prom", mime="text/plain")
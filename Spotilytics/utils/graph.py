@@ -0,0 +1,214 @@
+import math
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+import numpy as np
+import streamlit as st
+from .cache import persistent_cache
+from .singleflight import single_flight
+from .metrics import cache_lookup, cache_miss, timed
+from .scheduler import EndpointAvailability, is_unavailable
+from .charts import plot_artist_graph
+from .helpers import format_number
+from .search import load_artist, load_related_artists, ALBUMS_TTL, STALE_TTL
+
+# Related-artist neighborhoods, crawled breadth-first and kept as a CSR adjacency index
+
+MAX_HOPS = 2
+MAX_GRAPH_ARTISTS = 500
+CRAWL_WORKERS = 8
+UNAVAILABLE_MESSAGE = "Related artists are not available: Spotify no longer serves them to apps created after November 2024."
+
+class RelatedArtistsUnavailable(Exception):
+    pass
+
+related_artists_access = EndpointAvailability()
+
+class ArtistGraph:
+    # Artist i follows "related" links to neighbors[offsets[i]:offsets[i + 1]].
+    # Artists found at the last hop are leaves: their own links were not crawled
+    __slots__ = ('artists', 'index', 'offsets', 'neighbors', 'seed_id', 'fetched_at')
+
+    def __init__(self, artists, adjacency, seed_id, fetched_at=None):
+        self.artists = artists  # Artist records, by position
+        self.index = {artist.id: i for i, artist in enumerate(artists)}
+        self.seed_id = seed_id
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        counts = np.fromiter((len(links) for links in adjacency), dtype=np.int32, count=len(adjacency))
+        self.offsets = np.zeros(len(adjacency) + 1, dtype=np.int32)
+        np.cumsum(counts, out=self.offsets[1:])
+        self.neighbors = np.fromiter(chain.from_iterable(adjacency), dtype=np.int32, count=int(self.offsets[-1]))
+
+    def __len__(self):
+        return len(self.artists)
+
+    @property
+    def edge_count(self):
+        return len(self.neighbors)
+
+    def links(self, position):
+        return self.neighbors[self.offsets[position]:self.offsets[position + 1]]
+
+    def distances(self, artist_id, max_hops=None):
+        # position -> hops from artist_id, breadth-first over the arrays
+        start = self.index[artist_id]
+        distances = {start: 0}
+        queue = deque([start])
+        while queue:
+            position = queue.popleft()
+            hops = distances[position]
+            if max_hops is not None and hops >= max_hops:
+                continue
+            for neighbor in self.links(position).tolist():
+                if neighbor not in distances:
+                    distances[neighbor] = hops + 1
+                    queue.append(neighbor)
+        return distances
+
+    def within(self, artist_id, hops=MAX_HOPS):
+        # (artist, hops) pairs, nearest first, artist_id itself excluded
+        distances = self.distances(artist_id, hops)
+        return [(self.artists[position], distance) for position, distance in sorted(distances.items(), key=lambda item: item[1]) if distance]
+
+    def most_popular_within(self, artist_id, hops=MAX_HOPS, limit=10):
+        return sorted(self.within(artist_id, hops), key=lambda item: (-item[0].popularity, item[1]))[:limit]
+
+    def genres_within(self, artist_id, hops=MAX_HOPS, limit=10):
+        # Most common genres of the neighborhood, as (genre, artists) pairs
+        return Counter(genre for artist, _ in self.within(artist_id, hops) for genre in artist.genres).most_common(limit)
+
+    def shortest_path(self, source_id, target_id):
+        # Artists from source to target following related links, or None without a path
+        if source_id not in self.index or target_id not in self.index:
+            return None
+        start, goal = self.index[source_id], self.index[target_id]
+        parents = {start: None}
+        queue = deque([start])
+        while queue and goal not in parents:
+            position = queue.popleft()
+            for neighbor in self.links(position).tolist():
+                if neighbor not in parents:
+                    parents[neighbor] = position
+                    queue.append(neighbor)
+        if goal not in parents:
+            return None
+        path = []
+        position = goal
+        while position is not None:
+            path.append(self.artists[position])
+            position = parents[position]
+        return path[::-1]
+
+    def radial_layout(self, limit=150):
+        # Positions of the seed and of up to `limit` other artists, one ring per hop.
+        # An artist sits near the artist it was found from, rings are ordered by that angle
+        distances = self.distances(self.seed_id)
+        start = self.index[self.seed_id]
+        shown = sorted(distances, key=lambda position: (distances[position], -self.artists[position].popularity))[:limit + 1]
+        shown_set = set(shown)
+
+        parents = {}
+        for position in shown:
+            for neighbor in self.links(position).tolist():
+                if neighbor in shown_set and distances[neighbor] == distances[position] + 1:
+                    parents.setdefault(neighbor, position)
+
+        angles = {start: 0.0}
+        positions = {start: (0.0, 0.0)}
+        for hops in range(1, max(distances[position] for position in shown) + 1):
+            ring = sorted((position for position in shown if distances[position] == hops), key=lambda position: angles[parents[position]])
+            for i, position in enumerate(ring):
+                angles[position] = 2 * math.pi * i / len(ring)
+                positions[position] = (hops * math.cos(angles[position]), hops * math.sin(angles[position]))
+        return positions, distances
+
+@timed("crawl")
+def crawl_related_artists(sp_client, seed_id, max_hops=MAX_HOPS, max_artists=MAX_GRAPH_ARTISTS, max_workers=CRAWL_WORKERS, fetch=None):
+    # Breadth-first: every artist of a hop is fetched concurrently, at most max_workers at a time.
+    # The shared client's scheduler keeps the crawl within the rate limit
+    fetch = fetch or (lambda artist_id: load_related_artists(sp_client, artist_id))
+    artists = [load_artist(sp_client, seed_id)]
+    index = {seed_id: 0}
+    adjacency = [[]]
+    frontier = [0]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _ in range(max_hops):
+            futures = [executor.submit(fetch, artists[position].id) for position in frontier]
+            next_frontier = []
+            # Results are read in submission order, so the same data gives the same graph
+            for position, future in zip(frontier, futures):
+                try:
+                    related = future.result()
+                except Exception as e:
+                    if not is_unavailable(e):
+                        raise
+                    if position == 0:
+                        raise RelatedArtistsUnavailable("Spotify does not serve related artists to this app") from e
+                    continue
+
+                for artist in related:
+                    neighbor = index.get(artist.id)
+                    if neighbor is None:
+                        if len(artists) >= max_artists:
+                            continue
+                        neighbor = index[artist.id] = len(artists)
+                        artists.append(artist)
+                        adjacency.append([])
+                        next_frontier.append(neighbor)
+                    adjacency[position].append(neighbor)
+            frontier = next_frontier
+
+    return ArtistGraph(artists, adjacency, seed_id)
+
+@persistent_cache("artist_graph", ttl=ALBUMS_TTL, stale_ttl=STALE_TTL)
+def load_artist_graph(_sp_client, artist_id, max_hops=MAX_HOPS, max_artists=MAX_GRAPH_ARTISTS):
+    return crawl_related_artists(_sp_client, artist_id, max_hops, max_artists)
+
+@cache_lookup("memory", "artist_graph")
+@st.cache_data(ttl=ALBUMS_TTL, show_spinner=False)
+@cache_miss("memory", "artist_graph")
+@single_flight("artist_graph")
+def get_artist_graph(_sp_client, artist_id, max_hops=MAX_HOPS, max_artists=MAX_GRAPH_ARTISTS):
+    return load_artist_graph(_sp_client, artist_id, max_hops, max_artists)
+
+def render_related_artists(sp_client, artist):
+    st.subheader("Related Artists")
+    if not related_artists_access.available():
+        st.info(UNAVAILABLE_MESSAGE)
+        return
+
+    # Crawled on demand only, a neighborhood costs a few dozen API calls
+    if st.session_state.graph_artist_id != artist.id:
+        if st.button("🕸️ Explore related artists"):
+            st.session_state.graph_artist_id = artist.id
+            st.rerun()
+        return
+
+    try:
+        with st.spinner("Exploring related artists..."):
+            graph = get_artist_graph(sp_client, artist.id)
+    except RelatedArtistsUnavailable:
+        related_artists_access.mark_unavailable()
+        st.info(UNAVAILABLE_MESSAGE)
+        return
+
+    st.caption(f"{len(graph) - 1} artists within {MAX_HOPS} hops, {graph.edge_count} related links")
+    plot_artist_graph(graph, cache_key=(artist.id, graph.fetched_at))
+
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        st.write(f"**Most popular within {MAX_HOPS} hops**")
+        st.dataframe([
+            {"Artist": related.name, "Hops": hops, "Popularity": related.popularity, "Followers": format_number(related.followers)}
+            for related, hops in graph.most_popular_within(artist.id)
+        ], hide_index=True, use_container_width=True)
+    with col2:
+        st.write("**Genres around this artist**")
+        st.dataframe([{"Genre": genre, "Artists": count} for genre, count in graph.genres_within(artist.id)],
+                     hide_index=True, use_container_width=True)
+
+    if st.button("Hide related artists"):
+        st.session_state.graph_artist_id = None
+        st.rerun()
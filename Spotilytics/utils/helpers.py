@@ -1,4 +1,5 @@
 import streamlit as st
+from .images import is_local, data_uri
 
 def truncate_text(text, max_length):
     if len(text) > max_length:
@@ -9,6 +10,9 @@ def format_number(number):
     return f"{number:,}".replace(",", ".")
 
 def render_square_image(image_url, size=200):
+    if is_local(image_url):
+        # Thumbnails from the disk cache are small enough to inline in the page
+        image_url = data_uri(image_url)
     if image_url:
         html = f"""
         <div style="width: {size}px; height: {size}px; 
@@ -0,0 +1,245 @@
+import os
+import sqlite3
+import threading
+import time
+from .cache import DEFAULT_CACHE_PATH
+from .metrics import registry
+
+# Followers and popularity over time, recorded each time Spotify returns them.
+# Samples are append-only: one is only written when the value changed, and it holds the
+# difference to the previous value, which SQLite stores in one or two bytes. A rollup
+# keeps the last value of each day, so charts over months or years read one row per day
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "history.sqlite")
+DEFAULT_POINTS = 200
+DAY = 86400
+
+class HistoryStore:
+    # Safe to share between threads and between processes on the same host, like SQLiteBackend
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS series (
+                    id INTEGER PRIMARY KEY,
+                    entity TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    first_seen INTEGER NOT NULL,
+                    last_seen INTEGER NOT NULL,
+                    last_value INTEGER NOT NULL,
+                    samples INTEGER NOT NULL,
+                    UNIQUE (entity, metric)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS samples (
+                    series_id INTEGER NOT NULL,
+                    t INTEGER NOT NULL,
+                    delta INTEGER NOT NULL,
+                    PRIMARY KEY (series_id, t)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollups (
+                    series_id INTEGER NOT NULL,
+                    day INTEGER NOT NULL,
+                    t INTEGER NOT NULL,
+                    value INTEGER NOT NULL,
+                    PRIMARY KEY (series_id, day)
+                ) WITHOUT ROWID
+            """)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Transactions are opened explicitly, see record
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, samples, t=None):
+        # samples: (entity, metric, value) tuples observed at time t, in seconds
+        t = int(time.time() if t is None else t)
+        conn = self._connect()
+        written = 0
+        with conn:
+            # Write lock before reading last_value: concurrent recorders, e.g. the threads of the
+            # related-artists crawl, would otherwise compute their deltas from the same stale value
+            conn.execute("BEGIN IMMEDIATE")
+            for entity, metric, value in samples:
+                value = int(value)
+                row = conn.execute(
+                    "SELECT id, last_seen, last_value FROM series WHERE entity = ? AND metric = ?", (entity, metric)
+                ).fetchone()
+                if row is None:
+                    series_id = conn.execute(
+                        "INSERT INTO series (entity, metric, first_seen, last_seen, last_value, samples) VALUES (?, ?, ?, ?, ?, 1)",
+                        (entity, metric, t, t, value)
+                    ).lastrowid
+                    conn.execute("INSERT INTO samples (series_id, t, delta) VALUES (?, ?, ?)", (series_id, t, value))
+                    self._roll_up(conn, series_id, t, value)
+                    written += 1
+                    continue
+
+                series_id, last_seen, last_value = row
+                if t < last_seen:
+                    continue  # Appends only, an older observation arriving late is dropped
+                if value != last_value:
+                    # Two changes within the same second add up into one sample
+                    conn.execute(
+                        "INSERT INTO samples (series_id, t, delta) VALUES (?, ?, ?) "
+                        "ON CONFLICT (series_id, t) DO UPDATE SET delta = delta + excluded.delta",
+                        (series_id, t, value - last_value)
+                    )
+                    conn.execute("UPDATE series SET samples = samples + 1 WHERE id = ?", (series_id,))
+                    self._roll_up(conn, series_id, t, value)
+                    written += 1
+                conn.execute("UPDATE series SET last_seen = ?, last_value = ? WHERE id = ?", (t, value, series_id))
+        registry.inc("spotilytics_history_samples_total", written)
+        return written
+
+    def _roll_up(self, conn, series_id, t, value):
+        conn.execute(
+            "INSERT INTO rollups (series_id, day, t, value) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (series_id, day) DO UPDATE SET t = excluded.t, value = excluded.value",
+            (series_id, t // DAY, t, value)
+        )
+
+    def info(self, entity, metric):
+        # (first_seen, last_seen, last_value, samples), or None for an unknown series
+        return self._connect().execute(
+            "SELECT first_seen, last_seen, last_value, samples FROM series WHERE entity = ? AND metric = ?", (entity, metric)
+        ).fetchone()
+
+    def version(self, entities, metric):
+        # Changes whenever one of the series gets a new observation; one info() per entity, in a single query
+        rows = self._connect().execute(
+            f"SELECT entity, first_seen, last_seen, last_value, samples FROM series "
+            f"WHERE metric = ? AND entity IN ({', '.join('?' * len(entities))})",
+            (metric, *entities)
+        ).fetchall()
+        infos = {row[0]: row[1:] for row in rows}
+        return tuple(infos.get(entity) for entity in entities)
+
+    def series(self, entity, metric, start=None, end=None, points=DEFAULT_POINTS):
+        # The value at `start`, then at most `points` (t, value) pairs up to `end`: the last
+        # value of each time bucket. Values hold until the next point
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT id, first_seen, last_seen, last_value FROM series WHERE entity = ? AND metric = ?", (entity, metric)
+        ).fetchone()
+        if row is None:
+            return []
+        series_id, first_seen, last_seen, last_value = row
+        start = int(first_seen if start is None else start)
+        end = int(last_seen if end is None else end)
+        width = max(1, -(-(end - start) // points))
+
+        # Value at the end of the day before `start`, plus the changes of that day up to `start`
+        day_base = conn.execute(
+            "SELECT value FROM rollups WHERE series_id = ? AND day < ? ORDER BY day DESC LIMIT 1", (series_id, start // DAY)
+        ).fetchone()
+        changes, before = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(delta), 0) FROM samples WHERE series_id = ? AND t >= ? AND t <= ?",
+            (series_id, start // DAY * DAY, start)
+        ).fetchone()
+        value = (day_base[0] if day_base else 0) + before
+        parameters = {"series": series_id, "start": start, "end": end, "width": width, "day": start // DAY, "value": value}
+
+        if width >= DAY:
+            # Buckets of a day or more: the daily rollup is enough
+            rows = conn.execute("""
+                SELECT (t - :start - 1) / :width AS bucket, MAX(t), value
+                FROM rollups
+                WHERE series_id = :series AND day >= :day AND t > :start AND t <= :end
+                GROUP BY bucket
+                ORDER BY bucket
+            """, parameters).fetchall()
+        else:
+            # Running sum of the deltas in SQL, over the requested range only
+            rows = conn.execute("""
+                SELECT (t - :start - 1) / :width AS bucket, MAX(t), value
+                FROM (
+                    SELECT t, :value + SUM(delta) OVER (ORDER BY t) AS value
+                    FROM samples
+                    WHERE series_id = :series AND t > :start AND t <= :end
+                )
+                GROUP BY bucket
+                ORDER BY bucket
+            """, parameters).fetchall()
+
+        result = [(start, value)] if day_base or changes else []
+        result.extend((t, value) for _, t, value in rows)
+        # The line runs up to the last time the value was seen, even if it did not change
+        if result and start <= last_seen <= end and result[-1][0] < last_seen:
+            result.append((last_seen, last_value))
+        return result
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM samples")
+            conn.execute("DELETE FROM rollups")
+            conn.execute("DELETE FROM series")
+
+    def stats(self):
+        conn = self._connect()
+        series, samples = conn.execute("SELECT COUNT(*), COALESCE(SUM(samples), 0) FROM series").fetchone()
+        return {"series": series, "samples": samples}
+
+_history = None
+_history_lock = threading.Lock()
+
+def create_history_from_env():
+    if os.getenv("SPOTILYTICS_HISTORY", "1") == "0":
+        return None
+    return HistoryStore(os.getenv("SPOTILYTICS_HISTORY_PATH", DEFAULT_HISTORY_PATH))
+
+def get_history():
+    # None when SPOTILYTICS_HISTORY=0
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = create_history_from_env() or False
+    return _history or None
+
+def set_history(history):
+    global _history
+    with _history_lock:
+        _history = history or False
+
+def artist_entity(artist_id):
+    return f"artist:{artist_id}"
+
+def track_entity(track_id):
+    return f"track:{track_id}"
+
+def record_samples(samples):
+    # Called by the loaders with freshly fetched data; a failed write never fails the fetch
+    history = get_history()
+    if history is None:
+        return
+    try:
+        history.record(samples)
+    except sqlite3.Error:
+        registry.inc("spotilytics_history_errors_total")
+
+def record_artists(artists):
+    record_samples(
+        (artist_entity(artist.id), metric, getattr(artist, metric))
+        for artist in artists
+        for metric in ("followers", "popularity")
+    )
+
+def record_top_tracks(top_tracks):
+    record_samples((track_entity(track.id), "popularity", track.popularity) for track in top_tracks)
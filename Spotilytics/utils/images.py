@@ -0,0 +1,197 @@
+import base64
+import functools
+import hashlib
+import io
+import os
+import threading
+import urllib.request
+from collections import OrderedDict
+from .cache import DEFAULT_CACHE_PATH, LRUCache, MISSING
+from .metrics import registry
+
+# Artist and album images: the smallest Spotify rendition that fills the box and,
+# with SPOTILYTICS_THUMBNAILS=1 and Pillow installed, resized copies kept on disk
+
+DEFAULT_THUMBNAIL_DIR = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "thumbnails")
+DEFAULT_THUMBNAIL_MAX_BYTES = 64 * 1024 * 1024
+FETCH_TIMEOUT = 5
+
+def pick_image(images, size):
+    # images are (url, width, height) tuples, largest first like Spotify returns them
+    if not images:
+        return None
+    sized = [image for image in images if image[1] and image[2]]
+    adequate = [image for image in sized if min(image[1], image[2]) >= size]
+    if adequate:
+        return min(adequate, key=lambda image: image[1] * image[2])[0]
+    # Nothing big enough: the largest one, or the first when sizes are unknown
+    return max(sized, key=lambda image: image[1] * image[2])[0] if sized else images[0][0]
+
+def pillow_available():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def fetch_image(url, timeout=FETCH_TIMEOUT):
+    # urllib also reads file:// URLs, so local fixtures work like Spotify's CDN
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+def make_thumbnail(data, size, quality=85):
+    # Center-cropped square JPEG, like object-fit: cover does in the browser
+    from PIL import Image, ImageOps
+    with Image.open(io.BytesIO(data)) as image:
+        thumbnail = ImageOps.fit(image.convert("RGB"), (size, size), Image.LANCZOS)
+    output = io.BytesIO()
+    thumbnail.save(output, "JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+class ThumbnailCache:
+    # Thumbnails on disk, the least recently used ones removed past max_bytes
+    def __init__(self, directory, max_bytes=DEFAULT_THUMBNAIL_MAX_BYTES, quality=85, fetch=fetch_image):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.fetch = fetch
+        self._files = None  # name -> bytes, least recently used first, read from disk on first use
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Images that could not be fetched or decoded are not retried on every rerun
+        self._failed = LRUCache(maxsize=1024)
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def _load(self):
+        if self._files is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".jpg"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        self._files = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._bytes = sum(self._files.values())
+
+    def path_for(self, url, size):
+        name = hashlib.sha1(f"{url}|{size}".encode("utf-8")).hexdigest() + ".jpg"
+        return os.path.join(self.directory, name)
+
+    def get(self, url, size):
+        # Local path of the thumbnail, or None when it cannot be made
+        path = self.path_for(url, size)
+        name = os.path.basename(path)
+        with self._lock:
+            self._load()
+            if name in self._files and os.path.exists(path):
+                self._files.move_to_end(name)
+                self.hits += 1
+                os.utime(path)  # mtime keeps the LRU order across restarts
+                return path
+            self.misses += 1
+        if self._failed.get((url, size)) is not MISSING:
+            return None
+
+        try:
+            data = make_thumbnail(self.fetch(url), size, self.quality)
+        except Exception:
+            self.failures += 1
+            self._failed.set((url, size), True)
+            return None
+
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+        with self._lock:
+            self._bytes += len(data) - self._files.pop(name, 0)
+            self._files[name] = len(data)
+            self._evict()
+        return path
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._load()
+            for name in self._files:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+            self._files.clear()
+            self._bytes = 0
+            self._failed.clear()
+
+    def stats(self):
+        with self._lock:
+            files = len(self._files or ())
+        return {"hits": self.hits, "misses": self.misses, "failures": self.failures, "files": files, "bytes": self._bytes}
+
+_thumbnails = None
+_thumbnails_lock = threading.Lock()
+
+def create_thumbnail_cache_from_env():
+    if os.getenv("SPOTILYTICS_THUMBNAILS", "") in ("", "0") or not pillow_available():
+        return None
+    max_mb = os.getenv("SPOTILYTICS_THUMBNAIL_MAX_MB")
+    return ThumbnailCache(
+        os.getenv("SPOTILYTICS_THUMBNAIL_DIR", DEFAULT_THUMBNAIL_DIR),
+        max_bytes=int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_THUMBNAIL_MAX_BYTES
+    )
+
+def get_thumbnail_cache():
+    # None when thumbnails are off or Pillow is missing
+    global _thumbnails
+    if _thumbnails is None:
+        with _thumbnails_lock:
+            if _thumbnails is None:
+                _thumbnails = create_thumbnail_cache_from_env() or False
+    return _thumbnails or None
+
+def set_thumbnail_cache(thumbnails):
+    global _thumbnails
+    with _thumbnails_lock:
+        _thumbnails = thumbnails or False
+
+def image_source(images, size):
+    # Local thumbnail path when available, otherwise the URL of the smallest adequate rendition
+    url = pick_image(images, size)
+    thumbnails = get_thumbnail_cache()
+    if url and thumbnails is not None:
+        return thumbnails.get(url, size) or url
+    return url
+
+def is_local(source):
+    return bool(source) and not source.startswith(("http://", "https://", "data:")) and os.path.isfile(source)
+
+@functools.lru_cache(maxsize=128)
+def data_uri(path):
+    # Thumbnail paths are content hashes, the file behind a path never changes
+    with open(path, "rb") as file:
+        return "data:image/jpeg;base64," + base64.b64encode(file.read()).decode("ascii")
+
+def thumbnail_collector():
+    thumbnails = get_thumbnail_cache()
+    if thumbnails is None:
+        return []
+    stats = thumbnails.stats()
+    return [
+        ("spotilytics_thumbnail_lookups", {"result": "hit"}, stats["hits"]),
+        ("spotilytics_thumbnail_lookups", {"result": "miss"}, stats["misses"]),
+        ("spotilytics_thumbnail_failures", {}, stats["failures"]),
+        ("spotilytics_thumbnail_files", {}, stats["files"]),
+        ("spotilytics_thumbnail_bytes", {}, stats["bytes"])
+    ]
+
+registry.add_collector(thumbnail_collector)
@@ -0,0 +1,229 @@
+import bisect
+import functools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Process-wide counters and latency histograms, exported in the Prometheus text format
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# SPOTILYTICS_METRICS_FILE is rewritten at most this often
+EXPORT_INTERVAL = 10
+
+# Ids and other variable path segments, so API calls are counted per endpoint
+ID_SEGMENT = re.compile(r"/[0-9A-Za-z]{22}(?=/|$)")
+API_ORIGIN = re.compile(r"^https?://[^/]+/v1")
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.collectors = []  # callables returning [(name, labels, value)] read at export time
+
+    @staticmethod
+    def _key(metric, labels):
+        return metric, tuple(sorted(labels.items()))
+
+    # `metric` rather than `name`, which is a label
+    def inc(self, metric, value=1, **labels):
+        key = self._key(metric, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, metric, value, **labels):
+        key = self._key(metric, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def total(self, name):
+        with self._lock:
+            return sum(value for (counter_name, _), value in self.counters.items() if counter_name == name)
+
+    def series(self, name):
+        # [(labels as a dict, value)] of one counter
+        with self._lock:
+            return [(dict(labels), value) for (counter_name, labels), value in self.counters.items() if counter_name == name]
+
+    def histogram_series(self, name):
+        with self._lock:
+            return [(dict(labels), histogram) for (histogram_name, labels), histogram in self.histograms.items() if histogram_name == name]
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def export(self):
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.counts), h.count, h.sum) for key, h in histograms]
+
+        # Samples grouped by metric name: the text format wants each family in one block under one TYPE,
+        # and collectors can report the same family, e.g. every LRU cache its hits and misses
+        families = {}
+        def family(name, kind):
+            return families.setdefault(name, (kind, []))[1]
+
+        for (name, labels), value in counters:
+            family(name, "counter").append(f"{name}{format_labels(labels)} {value}")
+
+        for (name, labels), counts, count, total in histograms:
+            samples = family(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += bucket_count
+                samples.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            samples.append(f"{name}_sum{format_labels(labels)} {total}")
+            samples.append(f"{name}_count{format_labels(labels)} {count}")
+
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                family(name, "gauge").append(f"{name}{format_labels(tuple(sorted(labels.items())))} {value}")
+
+        lines = []
+        for name, (kind, samples) in families.items():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+registry = Registry()
+
+@contextmanager
+def timer(stage, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe("spotilytics_duration_seconds", time.perf_counter() - started, stage=stage, name=name)
+
+def timed(stage, name=None):
+    # Latency histogram of every call of the decorated function
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage, label):
+                return func(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+def cache_lookup(layer, endpoint):
+    # Outermost decorator of a cached function: counts every call
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            registry.inc("spotilytics_cache_lookups_total", layer=layer, endpoint=endpoint)
+            with timer("cached_call", endpoint):
+                return func(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+def cache_miss(layer, endpoint):
+    # Innermost side of the same cache: only reached when the cache had nothing
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            registry.inc("spotilytics_cache_misses_total", layer=layer, endpoint=endpoint)
+            return func(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+def lru_collector(name, cache):
+    # Exports the hits, misses and size of an LRUCache
+    def collect():
+        stats = cache.stats()
+        return [(f"spotilytics_lru_{field}", {"cache": name}, stats[field]) for field in ("hits", "misses", "size")]
+    return collect
+
+def record_api_call(method, url, seconds, status):
+    # spotipy passes paths relative to the API prefix, except for `next` links
+    endpoint = ID_SEGMENT.sub("/{id}", API_ORIGIN.sub("", url.split("?", 1)[0])).strip("/")
+    registry.inc("spotilytics_api_calls_total", method=method, endpoint=endpoint, status=status)
+    registry.observe("spotilytics_api_seconds", seconds, endpoint=endpoint)
+
+def cache_hit_ratios(layer):
+    # {endpoint: (lookups, misses)} of one cache layer
+    ratios = {}
+    for labels, value in registry.series("spotilytics_cache_lookups_total"):
+        if labels["layer"] == layer:
+            ratios.setdefault(labels["endpoint"], [0, 0])[0] += value
+    for labels, value in registry.series("spotilytics_cache_misses_total"):
+        if labels["layer"] == layer:
+            ratios.setdefault(labels["endpoint"], [0, 0])[1] += value
+    return ratios
+
+def start_rerun():
+    return time.perf_counter(), registry.total("spotilytics_api_calls_total")
+
+def finish_rerun(started):
+    # Totals of one script run. API calls are counted process-wide, so concurrent sessions add to each other
+    start_time, api_calls = started
+    seconds = time.perf_counter() - start_time
+    registry.observe("spotilytics_duration_seconds", seconds, stage="rerun", name="app")
+    return {"seconds": seconds, "api_calls": registry.total("spotilytics_api_calls_total") - api_calls}
+
+_last_export = 0.0
+_export_lock = threading.Lock()
+
+def export_to_file(path=None, force=False):
+    # Rewrites SPOTILYTICS_METRICS_FILE, e.g. for a node_exporter textfile collector
+    global _last_export
+    path = path or os.environ.get("SPOTILYTICS_METRICS_FILE")
+    if not path:
+        return
+    with _export_lock:
+        now = time.time()
+        if not force and now - _last_export < EXPORT_INTERVAL:
+            return
+        _last_export = now
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        file.write(registry.export())
+    os.replace(temporary, path)
@@ -0,0 +1,183 @@
+import math
+import operator
+import time
+
+# Slim records cached instead of raw Spotify JSON: only the fields the app reads
+
+def images_from_json(images):
+    # (url, width, height) tuples, largest first like Spotify returns them
+    return tuple((image['url'], image.get('width'), image.get('height')) for image in images or ())
+
+class Artist:
+    # __weakref__ lets the artist store keep evicted records reachable while they are still in use
+    __slots__ = ('id', 'name', 'genres', 'followers', 'popularity', 'images', '__weakref__')
+
+    def __init__(self, id, name, genres, followers, popularity, images):
+        self.id = id
+        self.name = name
+        self.genres = genres
+        self.followers = followers
+        self.popularity = popularity
+        self.images = images
+
+    @classmethod
+    def from_json(cls, artist):
+        return cls(
+            artist['id'],
+            artist['name'],
+            tuple(artist.get('genres') or ()),
+            (artist.get('followers') or {}).get('total') or 0,
+            artist.get('popularity') or 0,
+            images_from_json(artist.get('images'))
+        )
+
+    @property
+    def image_url(self):
+        return self.images[0][0] if self.images else None
+
+    def __repr__(self):
+        return f"Artist({self.id!r}, {self.name!r})"
+
+class Album:
+    __slots__ = ('id', 'name', 'release_date', 'release_date_precision', 'album_type', 'total_tracks')
+
+    def __init__(self, id, name, release_date, release_date_precision, album_type, total_tracks):
+        self.id = id
+        self.name = name
+        self.release_date = release_date
+        self.release_date_precision = release_date_precision
+        self.album_type = album_type
+        self.total_tracks = total_tracks
+
+    @classmethod
+    def from_json(cls, album):
+        return cls(
+            album['id'],
+            album['name'],
+            album.get('release_date'),
+            album.get('release_date_precision', 'day'),
+            album.get('album_group') or album.get('album_type'),
+            album.get('total_tracks')
+        )
+
+    def __repr__(self):
+        return f"Album({self.id!r}, {self.name!r})"
+
+class Track:
+    # album_id points into Discography.albums, so album data is stored once
+    __slots__ = ('id', 'name', 'album_id')
+
+    def __init__(self, id, name, album_id):
+        self.id = id
+        self.name = name
+        self.album_id = album_id
+
+    @classmethod
+    def from_json(cls, track, album_id):
+        return cls(track['id'], track['name'], album_id)
+
+    def __repr__(self):
+        return f"Track({self.id!r}, {self.name!r})"
+
+class TopTrack:
+    # Top tracks come with their own album, denormalized since there are only ten
+    __slots__ = ('id', 'name', 'popularity', 'album_id', 'album_name', 'release_date', 'release_date_precision')
+
+    def __init__(self, id, name, popularity, album_id, album_name, release_date, release_date_precision):
+        self.id = id
+        self.name = name
+        self.popularity = popularity
+        self.album_id = album_id
+        self.album_name = album_name
+        self.release_date = release_date
+        self.release_date_precision = release_date_precision
+
+    @classmethod
+    def from_json(cls, track):
+        album = track['album']
+        return cls(
+            track['id'],
+            track['name'],
+            track.get('popularity') or 0,
+            album['id'],
+            album['name'],
+            album.get('release_date'),
+            album.get('release_date_precision', 'day')
+        )
+
+    def __repr__(self):
+        return f"TopTrack({self.id!r}, {self.name!r})"
+
+class AudioFeatures:
+    # The measures of a track charted by the app; Spotify has none for some tracks
+    __slots__ = ('danceability', 'energy', 'valence', 'acousticness', 'instrumentalness', 'speechiness', 'liveness',
+                 'tempo', 'loudness')
+
+    def __init__(self, danceability, energy, valence, acousticness, instrumentalness, speechiness, liveness, tempo, loudness):
+        self.danceability = danceability
+        self.energy = energy
+        self.valence = valence
+        self.acousticness = acousticness
+        self.instrumentalness = instrumentalness
+        self.speechiness = speechiness
+        self.liveness = liveness
+        self.tempo = tempo
+        self.loudness = loudness
+
+    @classmethod
+    def from_json(cls, features):
+        # A missing or null measure is NaN, so the aggregates leave it out rather than count a 0
+        return cls(*(float(features[field]) if features.get(field) is not None else math.nan for field in cls.__slots__))
+
+    def values(self):
+        return _audio_feature_values(self)
+
+    def __reduce__(self):
+        # Pickled as constructor arguments: half the size of the default slots state and twice as
+        # fast to load, which adds up with one cache entry per track
+        return AudioFeatures, self.values()
+
+    def __repr__(self):
+        return f"AudioFeatures(energy={self.energy!r}, tempo={self.tempo!r})"
+
+_audio_feature_values = operator.attrgetter(*AudioFeatures.__slots__)
+
+class Discography:
+    __slots__ = ('artist_id', 'albums', 'tracks', 'fetched_at')
+
+    def __init__(self, artist_id, albums=None, tracks=None, fetched_at=None):
+        self.artist_id = artist_id
+        self.albums = albums if albums is not None else {}  # id -> Album, in listing order
+        self.tracks = tracks if tracks is not None else []
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+
+    @classmethod
+    def from_full_albums(cls, artist_id, full_albums):
+        # Full album objects as returned by sp.albums(), tracks already paginated
+        discography = cls(artist_id)
+        for album in full_albums:
+            discography.albums[album['id']] = Album.from_json(album)
+            discography.tracks.extend(Track.from_json(track, album['id']) for track in album['tracks']['items'])
+        return discography
+
+    def extend(self, other):
+        self.albums.update(other.albums)
+        self.tracks.extend(other.tracks)
+        self.fetched_at = max(self.fetched_at, other.fetched_at)
+
+    def updated(self, added, removed_ids=()):
+        # New copy with the newer releases of `added` first, the cached value is left untouched
+        removed_ids = set(removed_ids)
+        albums = dict(added.albums)
+        albums.update((album_id, album) for album_id, album in self.albums.items() if album_id not in removed_ids)
+        tracks = added.tracks + [track for track in self.tracks if track.album_id not in removed_ids]
+        return Discography(self.artist_id, albums, tracks)
+
+    def album_of(self, track):
+        return self.albums[track.album_id]
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def __repr__(self):
+        return f"Discography({self.artist_id!r}, {len(self.albums)} albums, {len(self.tracks)} tracks)"
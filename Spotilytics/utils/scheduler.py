@@ -0,0 +1,208 @@
+import random
+import threading
+import time
+import requests
+from .metrics import registry
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_EXCEPTIONS = (
+    ConnectionError,
+    TimeoutError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout
+)
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_in):
+        super().__init__(f"Spotify API temporarily unavailable, retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+class TokenBucket:
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        # Takes a token if one is available, otherwise returns how long to wait
+        with self._lock:
+            now = self._clock()
+            if now < self._paused_until:
+                return self._paused_until - now
+
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        while wait > 0:
+            self._sleep(wait)
+            wait = self._reserve()
+
+    def pause(self, seconds):
+        # Holds back every caller, e.g. while honouring a Retry-After header
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+            self._tokens = 0
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._failures < self.failure_threshold:
+                return "closed"
+            return "open" if self._clock() < self._opened_until else "half-open"
+
+    def before_call(self):
+        with self._lock:
+            if self._failures < self.failure_threshold:
+                return
+
+            now = self._clock()
+            if now < self._opened_until:
+                raise CircuitOpenError(self._opened_until - now)
+            # Half-open: let this call through as a probe, keep the others out meanwhile
+            self._opened_until = now + self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_until = 0.0
+
+    def record_failure(self, open_for=None):
+        with self._lock:
+            self._failures += 1
+            if open_for is not None:
+                self._failures = max(self._failures, self.failure_threshold)
+            if self._failures >= self.failure_threshold:
+                self._opened_until = self._clock() + max(open_for or 0.0, self.reset_timeout)
+
+# Spotify answers these for endpoints it closed to apps created after November 2024
+UNAVAILABLE_STATUSES = (403, 404)
+
+def is_unavailable(error):
+    return getattr(error, "http_status", None) in UNAVAILABLE_STATUSES
+
+class EndpointAvailability:
+    # An endpoint the app lost access to is left alone for retry_after seconds;
+    # access is granted per Spotify app, so it is checked again now and then
+    def __init__(self, retry_after=3600, clock=time.monotonic):
+        self.retry_after = retry_after
+        self._clock = clock
+        self._unavailable_since = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        with self._lock:
+            return self._unavailable_since is None or self._clock() - self._unavailable_since > self.retry_after
+
+    def mark_unavailable(self):
+        with self._lock:
+            self._unavailable_since = self._clock()
+
+def retry_after_seconds(error):
+    headers = getattr(error, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def is_retryable(error):
+    if isinstance(error, RETRY_EXCEPTIONS):
+        return True
+    return getattr(error, "http_status", None) in RETRY_STATUSES
+
+class RequestScheduler:
+    def __init__(
+        self,
+        bucket=None,
+        breaker=None,
+        max_retries=4,
+        backoff_base=0.5,
+        backoff_max=20.0,
+        sleep=time.sleep
+    ):
+        self.bucket = bucket or TokenBucket(rate=10, capacity=20)
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+        self._stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "rate_limited": 0, "rejected": 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _backoff(self, attempt):
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._count("rejected")
+                raise
+
+            self.bucket.acquire()
+            self._count("calls")
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+
+                delay = retry_after_seconds(e)
+                if getattr(e, "http_status", None) == 429:
+                    self._count("rate_limited")
+                    if delay is not None:
+                        # Every session waits out the server-imposed pause, not just this one
+                        self.bucket.pause(delay)
+
+                if delay is not None and delay > self.backoff_max:
+                    # Too long to wait within a page load: fail fast until it passes
+                    self.breaker.record_failure(open_for=delay)
+                    raise
+                if getattr(e, "http_status", None) != 429:
+                    # Rate limiting is throttled by the bucket pause, only server and connection
+                    # errors say the API is down. A burst of 429s must not open the breaker
+                    self.breaker.record_failure()
+
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self._count("retries")
+                self._sleep(delay if delay is not None else self._backoff(attempt))
+                continue
+
+            self.breaker.record_success()
+            return result
+
+# Shared by every Spotify client in the process
+spotify_scheduler = RequestScheduler()
+registry.add_collector(lambda: [
+    ("spotilytics_scheduler_events", {"event": event}, value) for event, value in spotify_scheduler.stats.items()
+])
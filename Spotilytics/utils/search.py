@@ -1,57 +1,269 @@
+import time
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from .cache import MISSING, LRUCache, get_backend, persistent_cache
+from .singleflight import single_flight, single_flight_stream
+from .metrics import registry, lru_collector, cache_lookup, cache_miss
+from .autocomplete import artist_index, search_policy
+from .store import artist_store
+from .history import record_artists, record_top_tracks
+from .models import Artist, TopTrack, Discography
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def search_artists(_sp_client, query): 
+# Upper bound for simultaneous requests when fanning out over albums
+MAX_CONCURRENT_REQUESTS = 8
+# Maximum number of ids accepted by Spotify's "Get Several Albums" endpoint
+ALBUMS_BATCH_SIZE = 20
+# Album groups of a discography, in the order Spotify lists them
+ALBUM_GROUPS = ('album', 'single', 'compilation')
+
+# Lifetimes of the persistent cache entries
+SEARCH_TTL = 3600  # 1 hour for searches and top tracks
+ALBUMS_TTL = 86400  # 24 hours for albums and discographies
+# Expired artist data keeps being served for this long while it is refreshed in the background
+STALE_TTL = 7 * 86400
+# The in-process layer re-reads artist data from the persistent cache this often,
+# so that values refreshed in the background show up without waiting a full TTL
+REVALIDATE_INTERVAL = 300
+
+# load_* functions only go through the persistent cache, so they also work outside Streamlit;
+# the get_* functions add the in-process and single-flight layers used by the app
+
+@persistent_cache("search_artists", ttl=SEARCH_TTL)
+def load_search_artists(_sp_client, query):
     results = _sp_client.search(q='artist:' + query, type='artist', limit=10)
-    return results['artists']['items']
+    artists = [Artist.from_json(artist) for artist in results['artists']['items']]
+    record_artists(artists)
+    return artists
+
+@cache_lookup("memory", "search_artists")
+@st.cache_data(ttl=SEARCH_TTL, show_spinner=False)
+@cache_miss("memory", "search_artists")
+@single_flight("search_artists")
+def search_artists(_sp_client, query): 
+    return load_search_artists(_sp_client, query)
+
+@persistent_cache("artist", ttl=SEARCH_TTL, stale_ttl=STALE_TTL)
+def load_artist(_sp_client, artist_id):
+    artist = Artist.from_json(_sp_client.artist(artist_id))
+    record_artists([artist])
+    artist_index.add([artist])
+    return artist
+
+@cache_lookup("memory", "artist")
+@st.cache_data(ttl=REVALIDATE_INTERVAL, show_spinner=False)
+@cache_miss("memory", "artist")
+@single_flight("artist")
+def get_artist(_sp_client, artist_id):
+    return load_artist(_sp_client, artist_id)
 
-@st.cache_data(ttl=3600, show_spinner=False)
+@persistent_cache("artist_top_tracks", ttl=SEARCH_TTL, stale_ttl=STALE_TTL)
+def load_artist_top_tracks(_sp_client, artist_id):
+    top_tracks = [TopTrack.from_json(track) for track in _sp_client.artist_top_tracks(artist_id)['tracks']]
+    record_top_tracks(top_tracks)
+    return top_tracks
+
+@persistent_cache("related_artists", ttl=SEARCH_TTL, stale_ttl=STALE_TTL)
+def load_related_artists(_sp_client, artist_id):
+    # Deprecated by Spotify: apps created after November 2024 get a 404 here
+    artists = [Artist.from_json(artist) for artist in _sp_client.artist_related_artists(artist_id)['artists']]
+    record_artists(artists)
+    artist_index.add(artists)
+    return artists
+
+@cache_lookup("memory", "artist_top_tracks")
+@st.cache_data(ttl=REVALIDATE_INTERVAL, show_spinner=False)
+@cache_miss("memory", "artist_top_tracks")
+@single_flight("artist_top_tracks")
 def get_artist_top_tracks(_sp_client, artist_id):
-    return _sp_client.artist_top_tracks(artist_id)['tracks']
+    return load_artist_top_tracks(_sp_client, artist_id)
 
-@st.cache_data(ttl=86400, show_spinner=False) # 24 hours cache for artist info
-def get_artist_albums(_sp_client, artist_id):
-    albums = _sp_client.artist_albums(
+def fetch_all_pages(sp_client, page):
+    # Follows the paging object's `next` links and returns every item
+    items = list(page['items'])
+    while page['next']:
+        page = sp_client.next(page)
+        items.extend(page['items'])
+    return items
+
+def fetch_artist_albums(sp_client, artist_id):
+    albums = sp_client.artist_albums(
         artist_id, 
-        album_type='album,single,compilation',
+        include_groups=','.join(ALBUM_GROUPS),
         limit=50  
     )
-    return albums['items']
+    return fetch_all_pages(sp_client, albums)
 
-@st.cache_data(ttl=86400, show_spinner=False)  # 24 hours cache for album tracks
-def get_album_tracks(_sp_client, album_id):
-    tracks = _sp_client.album_tracks(album_id)
-    return tracks['items']
+def fetch_new_album_ids(sp_client, artist_id, known_groups):
+    # Compares the artist's listing with known_groups (album id -> album group) using as few pages as possible.
+    # Returns ({new album id: group}, removed album ids), or None when the listing has to be fetched again in full
+    page = sp_client.artist_albums(artist_id, include_groups=','.join(ALBUM_GROUPS), limit=50)
+    first_groups = {album['id']: album.get('album_group') for album in page['items']}
+    if page['next'] is None:
+        # The whole listing fits in one page
+        new_groups = {album_id: group for album_id, group in first_groups.items() if album_id not in known_groups}
+        return new_groups, set(known_groups) - set(first_groups)
 
-@st.cache_data(ttl=86400, show_spinner="Fetching complete discography...")
-def get_complete_discography(_sp_client, artist_id):
-    all_tracks = []
-    albums = get_artist_albums(_sp_client, artist_id)
-    
+    # Page 1 alone cannot rule out a release added and another removed further down, so every group is
+    # checked. Each is listed newest first, so paging stops at the first release already known
+    new_groups = {}
+    for group in ALBUM_GROUPS:
+        page = sp_client.artist_albums(artist_id, include_groups=group, limit=50)
+        group_new_ids = []
+        reached_known = False
+        while True:
+            for album in page['items']:
+                if album['id'] in known_groups:
+                    reached_known = True
+                    break
+                group_new_ids.append(album['id'])
+            if reached_known or not page['next']:
+                break
+            page = sp_client.next(page)
+
+        known_count = sum(1 for known_group in known_groups.values() if known_group == group)
+        if page['total'] != known_count + len(group_new_ids):
+            # Something was removed or reordered
+            return None
+        new_groups.update(dict.fromkeys(group_new_ids, group))
+    return new_groups, set()
+
+def fetch_albums_batch(sp_client, album_ids):
+    # Full album objects with the first page of tracks embedded; Spotify answers null for ids it cannot resolve
+    albums = list(filter(None, sp_client.albums(album_ids)['albums']))
     for album in albums:
-        tracks = get_album_tracks(_sp_client, album['id'])
-        for track in tracks:
-            track['album_info'] = {
-                'name': album['name'],
-                'release_date': album['release_date'],
-                'id': album['id'],
-                'images': album['images']
-            }
-            all_tracks.append(track)
-    
-    return all_tracks
+        # Only albums longer than the embedded page need extra requests
+        album['tracks']['items'] = fetch_all_pages(sp_client, album['tracks'])
+    return albums
+
+def iter_full_album_batches(sp_client, album_ids, max_workers=MAX_CONCURRENT_REQUESTS):
+    # Yields full albums ALBUMS_BATCH_SIZE at a time, in the same order as album_ids
+    batches = [album_ids[i:i + ALBUMS_BATCH_SIZE] for i in range(0, len(album_ids), ALBUMS_BATCH_SIZE)]
+    if max_workers <= 1 or len(batches) <= 1:
+        for batch in batches:
+            yield fetch_albums_batch(sp_client, batch)
+        return
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        yield from executor.map(lambda batch: fetch_albums_batch(sp_client, batch), batches)
+
+def iter_discography_batches(sp_client, artist_id, max_workers=MAX_CONCURRENT_REQUESTS, album_groups=None):
+    # Yields one partial Discography per batch of albums
+    if album_groups is None:
+        album_groups = {album['id']: album.get('album_group') for album in fetch_artist_albums(sp_client, artist_id)}
+    for albums in iter_full_album_batches(sp_client, list(album_groups), max_workers):
+        for album in albums:
+            # Full albums only carry album_type, the listing's group is what incremental updates compare against
+            album['album_group'] = album_groups[album['id']] or album.get('album_type')
+        yield Discography.from_full_albums(artist_id, albums)
+
+def fetch_complete_discography(sp_client, artist_id, album_groups=None):
+    discography = Discography(artist_id)
+    for batch in iter_discography_batches(sp_client, artist_id, album_groups=album_groups):
+        discography.extend(batch)
+    return discography
+
+def update_complete_discography(previous, _sp_client, artist_id):
+    # Back catalogs rarely change: list only what is newer than the cached discography and fetch just that
+    changes = fetch_new_album_ids(
+        _sp_client, artist_id, {album_id: album.album_type for album_id, album in previous.albums.items()}
+    )
+    if changes is None:
+        return fetch_complete_discography(_sp_client, artist_id)
+
+    new_groups, removed_ids = changes
+    if not new_groups and not removed_ids:
+        return previous
+    added = fetch_complete_discography(_sp_client, artist_id, album_groups=new_groups)
+    return previous.updated(added, removed_ids)
+
+@persistent_cache("complete_discography", ttl=ALBUMS_TTL, stale_ttl=STALE_TTL, update=update_complete_discography)
+def load_complete_discography(_sp_client, artist_id):
+    return fetch_complete_discography(_sp_client, artist_id)
+
+@cache_lookup("memory", "complete_discography")
+@st.cache_data(ttl=REVALIDATE_INTERVAL, show_spinner="Fetching complete discography...")
+@cache_miss("memory", "complete_discography")
+@single_flight("complete_discography")
+def get_complete_discography(_sp_client, artist_id):
+    return load_complete_discography(_sp_client, artist_id)
+
+# Discographies read back from the persistent cache, per artist and stored version
+discography_cache = LRUCache(maxsize=64)
+registry.add_collector(lru_collector("discographies", discography_cache))
+
+def peek_complete_discography(sp_client, artist_id):
+    # The persistent copy of a discography, or None when it would have to be fetched.
+    # Reruns only read its version; an expired entry goes through peek, which schedules the refresh
+    version = load_complete_discography.version(sp_client, artist_id)
+    if version is None:
+        return None
+    fresh = version >= time.time()
+    cached = discography_cache.get((artist_id, version)) if fresh else MISSING
+    if cached is MISSING:
+        cached = load_complete_discography.peek(sp_client, artist_id)
+        if cached is MISSING:
+            return None
+        if fresh:
+            discography_cache.set((artist_id, version), cached)
+    return cached
+
+@single_flight_stream("complete_discography")
+def fetch_discography_stream(_sp_client, artist_id):
+    # Shares its flights with get_complete_discography: of the sessions opening the same artist,
+    # one streams the batches and the others get the whole discography when it is stored
+    discography = Discography(artist_id)
+    for batch in iter_discography_batches(_sp_client, artist_id):
+        discography.extend(batch)
+        yield batch
+    load_complete_discography.store(discography, _sp_client, artist_id)
+    return discography
+
+def stream_complete_discography(sp_client, artist_id):
+    # Yields partial discographies as album batches arrive; a cached one comes out whole
+    cached = peek_complete_discography(sp_client, artist_id)
+    if cached is not None:
+        yield cached
+        return
+    yield from fetch_discography_stream(sp_client, artist_id)
+
+# Persistent cache endpoints whose values are an artist or a list of artists
+INDEXED_ENDPOINTS = ("artist", "related_artists", "search_artists")
+
+@st.cache_resource(show_spinner=False)
+def seed_artist_index():
+    # Once per process: the loaders add what they fetch from then on, this adds what earlier
+    # processes and warm_cache.py left in the persistent cache
+    backend = get_backend()
+    for endpoint in INDEXED_ENDPOINTS:
+        for value in backend.values(endpoint):
+            artists = value if isinstance(value, list) else [value]
+            artist_index.add([artist for artist in artists if isinstance(artist, Artist)])
+    return len(artist_index)
 
 def update_search(sp_client, session_state, search_term):
     if search_term:
         # Clear selected artist when doing a new search
-        session_state.selected_artist = None
+        session_state.selected_artist_id = None
         
         # Only search if the term has changed
         if search_term != session_state.last_search:
-            results = search_artists(sp_client, search_term)
-            session_state.artist_results = results
+            # Answer from the local index, and only ask Spotify when it has too few matches
+            seed_artist_index()
+            results = artist_index.lookup(search_term, search_policy.limit)
+            local_hit = not search_policy.needs_remote(search_term, results)
+            if not local_hit:
+                # Cached copies are swapped for the shared records before anything keeps them
+                remote_results = artist_store.add_many(search_artists(sp_client, search_term))
+                artist_index.add(remote_results)
+                search_policy.remote_done(search_term, remote_results)
+                remote_ids = {artist.id for artist in remote_results}
+                results = (remote_results + [artist for artist in results if artist.id not in remote_ids])[:search_policy.limit]
+            artist_index.record(local_hit)
+
+            # Sessions keep ids only, the records live once in the artist store
+            session_state.artist_result_ids = [artist.id for artist in artist_store.add_many(results)]
             session_state.last_search = search_term
     else:
-        session_state.artist_results = []
-        session_state.selected_artist = None
+        session_state.artist_result_ids = []
+        session_state.selected_artist_id = None
         session_state.last_search = ""
\ No newline at end of file
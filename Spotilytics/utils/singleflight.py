@@ -0,0 +1,127 @@
+import functools
+import threading
+from collections import Counter
+from .cache import make_key, cache_arguments
+from .metrics import registry
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False  # A streaming leader stopped before the end, there is no result
+
+class SingleFlight:
+    # Concurrent callers with the same key share one execution of the function
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # Counted per endpoint, i.e. the part of the key before the first ":"
+        self.executed = Counter()
+        self.coalesced = Counter()
+
+    def _join(self, key):
+        # (call, whether this caller leads it)
+        endpoint = key.partition(":")[0]
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced[endpoint] += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            self.executed[endpoint] += 1
+            return call, True
+
+    def _finish(self, key, call):
+        with self._lock:
+            del self._calls[key]
+        call.done.set()
+
+    @staticmethod
+    def _wait(call):
+        # False when the call was abandoned and has to be made again
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return not call.abandoned
+
+    def do(self, key, func, *args, **kwargs):
+        call, leader = self._join(key)
+        while not leader:
+            if self._wait(call):
+                return call.result
+            call, leader = self._join(key)
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+        return call.result
+
+    def stream(self, key, func, *args, **kwargs):
+        # For a generator function returning the complete result: the leader yields the items as
+        # they come, callers sharing its flight yield the complete result once, when it is done
+        call, leader = self._join(key)
+        while not leader:
+            if self._wait(call):
+                yield call.result
+                return
+            call, leader = self._join(key)
+
+        try:
+            call.result = yield from func(*args, **kwargs)
+        except GeneratorExit:
+            # Closed before the end, e.g. the session rerun: whoever was waiting makes the call again
+            call.abandoned = True
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executed": sum(self.executed.values()),
+                "coalesced": sum(self.coalesced.values()),
+                "in_flight": len(self._calls),
+                "coalesced_by_endpoint": dict(self.coalesced)
+            }
+
+# Shared by every session of the process
+spotify_flights = SingleFlight()
+registry.add_collector(lambda: [
+    ("spotilytics_single_flight_calls", {"endpoint": endpoint, "outcome": outcome}, value)
+    for outcome, counter in (("executed", spotify_flights.executed), ("coalesced", spotify_flights.coalesced))
+    for endpoint, value in list(counter.items())
+])
+
+def single_flight(endpoint, group=spotify_flights):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(endpoint, cache_arguments(func, args, kwargs))
+            return group.do(key, func, *args, **kwargs)
+
+        return wrapper
+    return decorator
+
+def single_flight_stream(endpoint, group=spotify_flights):
+    # single_flight for generator functions, see SingleFlight.stream. With the same endpoint and
+    # parameters as a single_flight function, both share their flights
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(endpoint, cache_arguments(func, args, kwargs))
+            return group.stream(key, func, *args, **kwargs)
+
+        return wrapper
+    return decorator
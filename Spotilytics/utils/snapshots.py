@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import threading
+import zipfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .cache import DEFAULT_CACHE_PATH
+from .metrics import registry, timed
+
+# Derived tables saved as Arrow IPC files, one per artist and table. Reloading memory-maps
+# the file instead of rebuilding the DataFrames. Only the numeric and timestamp columns stay
+# views on the mapped pages; strings and nullable columns are copied into pandas
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "snapshots")
+DEFAULT_SNAPSHOT_MAX_BYTES = 256 * 1024 * 1024
+VERSION_KEY = b"spotilytics.version"
+
+_prune_lock = threading.Lock()
+
+def snapshots_enabled():
+    return os.getenv("SPOTILYTICS_SNAPSHOTS", "1") != "0"
+
+def snapshot_dir():
+    return os.getenv("SPOTILYTICS_SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR)
+
+def snapshot_max_bytes():
+    max_mb = os.getenv("SPOTILYTICS_SNAPSHOT_MAX_MB")
+    return int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_SNAPSHOT_MAX_BYTES
+
+def snapshot_path(artist_id, kind, name):
+    return os.path.join(snapshot_dir(), f"{artist_id}.{kind}.{name}.arrow")
+
+def encode_version(version):
+    return json.dumps(list(version)).encode("utf-8")
+
+def write_table(path, df, version):
+    table = pa.Table.from_pandas(df)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), VERSION_KEY: encode_version(version)})
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(temporary, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temporary, path)
+
+def read_table(path, version):
+    # None when the file is missing or was written for another version of the data
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    if (table.schema.metadata or {}).get(VERSION_KEY) != encode_version(version):
+        return None
+    # One block per column, so that columns without nulls can wrap the mapped buffers rather than
+    # being copied into a consolidated block; the table is not used afterwards
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+@timed("snapshot", "save")
+def save_snapshot(artist_id, kind, version, tables):
+    # tables: name -> DataFrame. A failed write only costs the next process a rebuild
+    if not snapshots_enabled():
+        return False
+    try:
+        os.makedirs(snapshot_dir(), exist_ok=True)
+        for name, df in tables.items():
+            write_table(snapshot_path(artist_id, kind, name), df, version)
+    except (OSError, pa.ArrowException):
+        registry.inc("spotilytics_snapshot_operations_total", operation="save", result="error")
+        return False
+    registry.inc("spotilytics_snapshot_operations_total", operation="save", result="ok")
+    prune_snapshots()
+    return True
+
+@timed("snapshot", "load")
+def load_snapshot(artist_id, kind, version, names):
+    # name -> DataFrame, or None unless every table is there for this version
+    if not snapshots_enabled():
+        return None
+    tables = {}
+    try:
+        for name in names:
+            path = snapshot_path(artist_id, kind, name)
+            df = read_table(path, version)
+            if df is None:
+                break
+            tables[name] = df
+            os.utime(path)  # mtime keeps the least recently used snapshots first in line for pruning
+    except (OSError, pa.ArrowException):
+        pass
+    result = "hit" if len(tables) == len(names) else "miss"
+    registry.inc("spotilytics_snapshot_operations_total", operation="load", result=result)
+    return tables if result == "hit" else None
+
+def prune_snapshots(max_bytes=None):
+    # Removes the least recently used snapshot files past max_bytes
+    max_bytes = snapshot_max_bytes() if max_bytes is None else max_bytes
+    with _prune_lock:
+        try:
+            entries = [
+                (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                for entry in os.scandir(snapshot_dir())
+                if entry.is_file() and entry.name.endswith(".arrow")
+            ]
+        except FileNotFoundError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def parquet_bytes(df):
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(df), buffer, compression="zstd")
+    return buffer.getvalue()
+
+@timed("snapshot", "export")
+def export_parquet_zip(tables):
+    # One Parquet file per table, zipped for a single download
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, df in tables.items():
+            archive.writestr(f"{name}.parquet", parquet_bytes(df))
+    return buffer.getvalue()
@@ -0,0 +1,75 @@
+import threading
+import weakref
+from collections import OrderedDict
+from .metrics import registry
+
+class ArtistStore:
+    # One shared Artist record per id for the whole process; sessions keep only ids.
+    # Records are treated as immutable: a changed artist replaces the record, it is never edited
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._artists = OrderedDict()  # id -> Artist, least recently used first
+        # Evicted records stay reachable while something else, e.g. the search index, still holds them
+        self._evicted = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._artists)
+
+    def __contains__(self, artist_id):
+        with self._lock:
+            return artist_id in self._artists or artist_id in self._evicted
+
+    def add(self, artist):
+        # Returns the shared record, so duplicates from cache copies can be dropped
+        with self._lock:
+            current = self._artists.get(artist.id)
+            if current is None:
+                current = self._evicted.pop(artist.id, None)
+            if current is None or not same_artist(current, artist):
+                current = artist
+            self._store(current)
+            return current
+
+    def add_many(self, artists):
+        return [self.add(artist) for artist in artists]
+
+    def get(self, artist_id):
+        with self._lock:
+            artist = self._artists.get(artist_id)
+            if artist is None:
+                artist = self._evicted.pop(artist_id, None)
+            if artist is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(artist)
+            return artist
+
+    def _store(self, artist):
+        self._artists[artist.id] = artist
+        self._artists.move_to_end(artist.id)
+        while len(self._artists) > self.maxsize:
+            artist_id, evicted = self._artists.popitem(last=False)
+            self._evicted[artist_id] = evicted
+
+    def clear(self):
+        with self._lock:
+            self._artists.clear()
+            self._evicted.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._artists), "maxsize": self.maxsize}
+
+def same_artist(a, b):
+    return all(getattr(a, field) == getattr(b, field) for field in type(a).__slots__ if field != '__weakref__')
+
+# Shared by every session of the process
+artist_store = ArtistStore()
+registry.add_collector(lambda: [
+    ("spotilytics_artist_store_size", {}, len(artist_store)),
+    ("spotilytics_artist_store_hits", {}, artist_store.hits),
+    ("spotilytics_artist_store_misses", {}, artist_store.misses)
+])
@@ -0,0 +1,64 @@
+import streamlit as st
+from .charts import plot_history, comparison_color_map
+from .history import DEFAULT_POINTS, artist_entity, track_entity
+from .comparison import unique_names, unique_artist_names
+
+# Followers and popularity history of the artist page and of the comparison
+
+ARTIST_METRICS = {"Followers": "followers", "Popularity": "popularity"}
+TOP_TRACKS_METRIC = "Top tracks popularity"
+
+def load_history_series(history, entities, metric, infos, points=DEFAULT_POINTS):
+    # One downsampled series per entity, over a common time range so the buckets line up
+    known = [info for info in infos if info is not None]
+    start = min(info[0] for info in known)
+    end = max(info[1] for info in known)
+    return {entity: history.series(entity, metric, start, end, points) for entity in entities}
+
+def render_history(history, entities, names, metric, value_label, container, cache_key, label="Artist", colors=None):
+    # Only the versions of the series are read on a rerun, the series themselves when the figure is built
+    infos = history.version(entities, metric)
+    if not any(infos):
+        container.info("No history recorded yet.")
+        return
+    plot_history(
+        lambda: load_history_series(history, entities, metric, infos),
+        dict(zip(entities, unique_names(names))),
+        value_label,
+        label=label,
+        colors=colors,
+        container=container,
+        cache_key=(cache_key, infos)
+    )
+
+def render_artist_history(history, artist, top_tracks):
+    st.subheader("History")
+    # Tabs rather than a selector widget: every figure is cached per history version
+    tabs = st.tabs([*ARTIST_METRICS, TOP_TRACKS_METRIC])
+
+    for tab, (value_label, metric) in zip(tabs, ARTIST_METRICS.items()):
+        render_history(history, [artist_entity(artist.id)], [artist.name], metric, value_label, tab, artist.id)
+
+    # Tracks sharing a title are told apart in the legend
+    render_history(
+        history,
+        [track_entity(track.id) for track in top_tracks],
+        [track.name for track in top_tracks],
+        "popularity",
+        "Popularity",
+        tabs[-1],
+        artist.id,
+        label="Track"
+    )
+    st.caption("Recorded each time Spotify returns the artist, so the history starts with the first visit.")
+
+def render_comparison_history(history, artists):
+    st.subheader("History")
+    tabs = st.tabs(list(ARTIST_METRICS))
+
+    # Same names and colors as the other comparison charts
+    names = unique_artist_names(artists)
+    entities = [artist_entity(artist.id) for artist in artists]
+    for tab, (value_label, metric) in zip(tabs, ARTIST_METRICS.items()):
+        render_history(history, entities, names, metric, value_label, tab, tuple(artist.id for artist in artists),
+                       colors=comparison_color_map(names))
@@ -1,13 +1,13 @@
 import streamlit as st
-import pandas as pd
 from .helpers import truncate_text, format_number
+from .images import image_source
 
 def render_artist_selection(artists):
     if artists:
         st.write("**Matching artists:**")
         for i, artist in enumerate(artists):
-            artist_name = truncate_text(artist['name'], 20)
-            genres_text = truncate_text(', '.join(artist['genres'][:2]) if artist['genres'] else 'No genres', 25)
+            artist_name = truncate_text(artist.name, 20)
+            genres_text = truncate_text(', '.join(artist.genres[:2]) if artist.genres else 'No genres', 25)
 
             if st.button(
                 f"{artist_name} ({genres_text})", 
@@ -17,66 +17,38 @@ def render_artist_selection(artists):
                 return artist
     return None
 
-def create_tracks_dataframe(tracks):
-    data = []
-    for track in tracks:
-        data.append({
-            "Track": track["name"],
-            "Album": track["album"]["name"],
-            "Released Date": track["album"]["release_date"],
-            "Popularity": track["popularity"] 
-        })
-
-    df_tracks = pd.DataFrame(data)
-    df_tracks.index = df_tracks.index + 1
-    return df_tracks
-
-def create_discography_dataframe(tracks):
-    data = []
-    for track in tracks:
-        data.append({
-            "Track": track["name"],
-            "Album": track['album_info']['name'],
-            "Released Date": track['album_info']['release_date']
-        })
-
-    df_tracks = pd.DataFrame(data)
-    df_tracks.index = df_tracks.index + 1
-    return df_tracks
-
 def create_display_dataframe(df_tracks):
     return df_tracks[["Track", "Album", "Released Date"]]
 
 def render_artist_basic_info(artist):
     col1, col2 = st.columns([1, 3])
     with col1:
-        if artist['images']:
-            st.image(artist['images'][0]['url'], width=250)
+        image = image_source(artist.images, 250)
+        if image:
+            # A local thumbnail path is served by Streamlit's media endpoint
+            st.image(image, width=250)
         else:
             st.image("https://via.placeholder.com/250x250/1DB954/FFFFFF?text=No+Image", width=250)
     
     with col2:
-        st.write(f"## {artist['name']}")
-        st.write(f"**Followers:** {format_number(artist['followers']['total'])}")
-        st.write(f"**Popularity:** {artist['popularity']}")
-        if artist['genres']:
-            st.write(f"**Genres:** {', '.join(artist['genres'])}")
+        st.write(f"## {artist.name}")
+        st.write(f"**Followers:** {format_number(artist.followers)}")
+        st.write(f"**Popularity:** {artist.popularity}")
+        if artist.genres:
+            st.write(f"**Genres:** {', '.join(artist.genres)}")
         else:
             st.write("**Genres:** No genres available")
 
-def render_artist_profile(artist, tracks):
+def render_artist_profile(artist, df_tracks):
     render_artist_basic_info(artist)
 
     # Render top tracks
     st.divider()
     st.subheader("Top Tracks")
  
-    df_tracks_complete = create_tracks_dataframe(tracks)
-    df_display = create_display_dataframe(df_tracks_complete)
+    df_display = create_display_dataframe(df_tracks)
     
     st.dataframe(df_display)
-    
-    return df_tracks_complete
 
 def render_welcome_message():
     st.write("## Welcome to Spotilytics!")
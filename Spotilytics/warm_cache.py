@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import streamlit.logger
+
+# The loaders are defined with st.cache_data, which warns on import when there is no Streamlit runtime
+streamlit.logger.set_log_level("error")
+
+from utils.auth import init_spotify_client
+from utils.autocomplete import normalize
+from utils.cache import DEFAULT_CACHE_PATH
+from utils.search import load_search_artists, load_artist, load_artist_top_tracks, load_complete_discography
+
+# Prefetches artists into the persistent cache so the app finds them warm, e.g. from a nightly job:
+#   python warm_cache.py 4Z8W4fKeB5YxbusRsdQVPb "Daft Punk" --file artists.txt
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "warm_state.json")
+DEFAULT_CONCURRENCY = 4
+
+ARTIST_ID = re.compile(r"^(?:spotify:artist:|https?://open\.spotify\.com/artist/)?([0-9A-Za-z]{22})(?:\?.*)?$")
+
+def read_artists(arguments, path):
+    # Command line entries first, then one entry per line of the file; blank lines and # comments are skipped
+    entries = list(arguments)
+    if path:
+        with open(path, encoding="utf-8") as file:
+            entries.extend(line.strip() for line in file)
+    entries = [entry for entry in entries if entry and not entry.startswith("#")]
+    return list(dict.fromkeys(entries))
+
+def load_state(path):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {"done": {}, "failed": {}}
+
+def save_state(path, state):
+    # Written to a temporary file first, so an interrupted run never leaves a truncated state
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump(state, file, indent=2)
+    os.replace(temporary, path)
+
+def resolve_artist(sp, entry, refresh):
+    match = ARTIST_ID.match(entry)
+    if match:
+        artist_id = match.group(1)
+        return load_artist.refresh(sp, artist_id) if refresh else load_artist.warm(sp, artist_id)[0]
+
+    # Names go through the same search as the app; an exact match wins over the most relevant result
+    results = load_search_artists(sp, entry)
+    if not results:
+        raise LookupError(f"no artist found for {entry!r}")
+    artist = next((artist for artist in results if normalize(artist.name) == normalize(entry)), results[0])
+    load_artist.store(artist, sp, artist.id)
+    return artist
+
+def warm_artist(sp, entry, refresh=False):
+    started = time.perf_counter()
+    artist = resolve_artist(sp, entry, refresh)
+    if refresh:
+        top_tracks = load_artist_top_tracks.refresh(sp, artist.id)
+        discography = load_complete_discography.refresh(sp, artist.id)
+    else:
+        top_tracks = load_artist_top_tracks.warm(sp, artist.id)[0]
+        discography = load_complete_discography.warm(sp, artist.id)[0]
+    return artist, len(top_tracks), discography, time.perf_counter() - started
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prefetch Spotify artists into the Spotilytics persistent cache.")
+    parser.add_argument("artists", nargs="*", help="artist ids, Spotify URIs/URLs or names")
+    parser.add_argument("-f", "--file", help="file with one artist id or name per line")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"artists loaded at the same time (default {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH,
+                        help="progress file used to resume an interrupted run")
+    parser.add_argument("--restart", action="store_true", help="ignore the progress of a previous run")
+    parser.add_argument("--refresh", action="store_true", help="fetch again even when the cache is still fresh")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    entries = read_artists(args.artists, args.file)
+    if not entries:
+        print("No artists given.", file=sys.stderr)
+        return 2
+
+    state = {"done": {}, "failed": {}} if args.restart else load_state(args.state)
+    pending = [entry for entry in entries if entry not in state["done"]]
+    skipped = len(entries) - len(pending)
+    if skipped:
+        print(f"Resuming: {skipped} of {len(entries)} artists already warmed.", file=sys.stderr)
+
+    sp = init_spotify_client()
+    completed = skipped
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        futures = {executor.submit(warm_artist, sp, entry, args.refresh): entry for entry in pending}
+        try:
+            for future in as_completed(futures):
+                entry = futures[future]
+                completed += 1
+                try:
+                    artist, top_tracks, discography, elapsed = future.result()
+                except Exception as e:
+                    state["failed"][entry] = str(e)
+                    print(f"[{completed}/{len(entries)}] {entry}: failed ({e})", file=sys.stderr)
+                else:
+                    state["done"][entry] = artist.id
+                    state["failed"].pop(entry, None)
+                    print(f"[{completed}/{len(entries)}] {artist.name}: {top_tracks} top tracks, "
+                          f"{len(discography.albums)} releases, {len(discography.tracks)} tracks ({elapsed:.1f}s)",
+                          file=sys.stderr)
+                save_state(args.state, state)
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            print("Interrupted, run again to resume.", file=sys.stderr)
+            return 130
+
+    failed = [entry for entry in entries if entry in state["failed"]]
+    if failed:
+        print(f"{len(failed)} artists failed, run again to retry them.", file=sys.stderr)
+        return 1
+
+    # Every artist is warm, so the next run starts from scratch
+    if os.path.exists(args.state):
+        os.remove(args.state)
+    print(f"Warmed {len(entries)} artists.", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())